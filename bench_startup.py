@@ -0,0 +1,102 @@
+# bench_startup.py
+"""Import-time and startup benchmark for the rbd package
+
+Each scenario runs in a fresh interpreter. The script exits with status 1
+if a median exceeds its budget or a heavy dependency is imported where it
+should be deferred, so it can guard against startup regressions in CI or
+before deploying cron scripts.
+
+Usage:
+    python bench_startup.py [--runs 5] [--store data/petstore_rbd.json] [--slack 1.0]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.join(HERE, "web", "petstore")
+
+# Modules that must not be loaded by a scenario
+HEAVY_MODULES = ["numpy", "llama_cpp"]
+
+# (name, code, budget in seconds beyond bare interpreter startup, forbidden modules)
+SCENARIOS = [
+    ("import rbd", "import rbd", 0.05, HEAVY_MODULES + ["asyncio"]),
+    ("import rbd.query", "import rbd.query; assert rbd.query._default_query_manager is None", 0.15,
+     HEAVY_MODULES),
+    ("open store + counts",
+     "from rbd.query import get_default_query_manager; get_default_query_manager().get_record_types()",
+     1.0, ["llama_cpp"]),
+]
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "modules": [m for m in {modules!r} if m in sys.modules]}}))
+"""
+
+
+def run_child(code, modules, cwd):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [PACKAGE_DIR, env.get("PYTHONPATH")]))
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", CHILD.format(code=code, modules=modules)],
+                            cwd=cwd, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "child failed")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["wall"] = wall
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="runs per scenario (median is reported)")
+    parser.add_argument("--store", default="data/petstore_rbd.json",
+                        help="store opened by the startup scenario, relative to the working directory")
+    parser.add_argument("--slack", type=float, default=1.0, help="multiply every budget (slow machines)")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    baseline = statistics.median(run_child("pass", [], cwd)["wall"] for _ in range(args.runs))
+    print(f"interpreter startup: {baseline * 1000:.1f} ms")
+
+    failures = []
+    for name, code, budget, forbidden in SCENARIOS:
+        if "get_default_query_manager" in code and not os.path.exists(args.store):
+            print(f"{name}: skipped ({args.store} not found)")
+            continue
+        code = code.replace("get_default_query_manager()",
+                            f"(setattr(__import__('rbd.query').query, 'DEFAULT_DB_PATH', {args.store!r}) "
+                            f"or get_default_query_manager())")
+        try:
+            reports = [run_child(code, forbidden, cwd) for _ in range(args.runs)]
+        except RuntimeError as e:
+            failures.append(f"{name}: {e}")
+            print(f"{name}: FAILED ({e})")
+            continue
+        in_process = statistics.median(r["seconds"] for r in reports)
+        wall = statistics.median(r["wall"] for r in reports) - baseline
+        loaded = sorted({m for r in reports for m in r["modules"]})
+        ok = wall <= budget * args.slack and not loaded
+        print(f"{name}: {wall * 1000:.1f} ms over startup ({in_process * 1000:.1f} ms in-process, "
+              f"budget {budget * args.slack * 1000:.0f} ms)"
+              + (f", loaded {', '.join(loaded)}" if loaded else "") + ("" if ok else "  <-- FAIL"))
+        if not ok:
+            failures.append(name)
+
+    if failures:
+        print(f"\n{len(failures)} scenario(s) over budget: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,14 @@
 # debug_db.py
 """Debug script to see what's actually in the database"""
 
-from rbd.database import ReferenceBaseDB
+from rbd.query import get_default_query_manager
 import json
 
 def debug_database():
     print("🔍 Debugging database contents...")
     
-    # Load the database
-    db = ReferenceBaseDB("data/petstore_rbd.json")
+    # Load the database (the shared default instance)
+    db = get_default_query_manager().db
     
     print(f"📊 Total records: {len(db.store)}")
     
@@ -1,28 +1,60 @@
 # main.py
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
 from datetime import datetime
-from rbd.database import ReferenceBaseDB
+import json
+import os
+import threading
 from rbd.query import QueryManager
+from rbd.embedding_cache import EmbeddingCache
+from rbd.model_loader import get_model_id, model_status, warm_up_model
+from rbd.entities import collection_for_model
 from petstore import Pet, create_sample_pet
 
-app = FastAPI(title="Reference Base Database (RBD)", version="0.1.0")
+# Load and warm up the embedding model at startup (set RBD_EAGER_MODEL=0 to load on first use)
+EAGER_MODEL = os.environ.get("RBD_EAGER_MODEL", "1") != "0"
 
-# In-memory (or file-based) RBD instance
-db = ReferenceBaseDB("data/rbd_store.json")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if EAGER_MODEL:
+        # In the background, so liveness checks answer while /health/ready reports loading
+        threading.Thread(target=warm_up_model, name="rbd-model-warm-up", daemon=True).start()
+    yield
 
-# Query manager for unified data access
-query_manager = QueryManager("data/rbd_store.json")
+app = FastAPI(title="Reference Base Database (RBD)", version="0.1.0", lifespan=lifespan)
+
+# Query manager for unified data access; the single RBD instance of this process.
+# Shared mode with a write-ahead log lets several uvicorn workers use the same files.
+query_manager = QueryManager(
+    "data/rbd_store.json",
+    log_mode=True,
+    shared=True,
+    dedup="keep",
+    ann_index="ivf",
+    auto_compact=True,
+    lazy=True,
+    warm_up_records=1000,
+    indexed_fields=("data.id", "data.customer_id", "data.status", "data.type"),
+    embedding_cache=EmbeddingCache(get_model_id(), capacity=10000, path="data/embedding_cache.sqlite")
+)
 
 class AddRequest(BaseModel):
     data: str
     text_hint: str = None
     prev: str = None
+    collection: str = None
+
+class AddBatchRequest(BaseModel):
+    records: List[AddRequest]
 
 class QueryRequest(BaseModel):
     text: str
     threshold: float = 0.6
     limit: int = 5
+    nprobe: Optional[int] = None  # ANN lists to scan; higher = better recall, slower
 
 @app.get("/")
 def home():
@@ -30,52 +62,128 @@ def home():
         "message": "Welcome to the Reference Base Database (RBD)",
         "endpoints": {
             "add": "POST /add",
+            "add_batch": "POST /add/batch",
             "query": "POST /query",
-            "chain": "GET /chain/{ref_hash}"
+            "chain": "GET /chain/{ref_hash}?limit=&offset=",
+            "latest": "GET /chain/{ref_hash}/latest",
+            "find": "GET /find?{field}={value}",
+            "collections": "GET /collections",
+            "collection": "GET /records/{collection}",
+            "embedding_cache": "GET /stats/embedding-cache",
+            "ready": "GET /health/ready"
         }
     }
 
 @app.post("/add")
 def add_data(request: AddRequest):
     try:
-        ref_hash = query_manager.add_record(request.data, text_hint=request.text_hint, prev=request.prev)
-        return {"ref": ref_hash, "message": "Data added successfully"}
+        ref_hash = query_manager.add_record(
+            request.data,
+            text_hint=request.text_hint,
+            prev=request.prev,
+            collection=request.collection
+        )
+        return {
+            "ref": ref_hash,
+            "duplicates": query_manager.get_near_duplicates(ref_hash),
+            "message": "Data added successfully"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/add/batch")
+def add_data_batch(request: AddBatchRequest):
+    try:
+        refs = query_manager.add_records([record.dict() for record in request.records])
+        duplicates = {ref: query_manager.get_near_duplicates(ref) for ref in refs}
+        return {
+            "refs": refs,
+            "duplicates": {ref: dups for ref, dups in duplicates.items() if dups},
+            "message": f"{len(refs)} records added successfully"
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/query")
 def query_similar(request: QueryRequest):
     try:
-        results = query_manager.query_similar(request.text, threshold=request.threshold)
-        # Apply limit if specified
-        if request.limit > 0:
-            results = results[:request.limit]
+        results = query_manager.query_similar(
+            request.text,
+            threshold=request.threshold,
+            nprobe=request.nprobe,
+            limit=max(request.limit, 0)
+        )
         return {"results": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/chain/{ref_hash}")
-def get_chain(ref_hash: str):
+def get_chain(ref_hash: str, limit: int = Query(0, ge=0), offset: int = Query(0, ge=0)):
+    info = query_manager.get_chain_info(ref_hash)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Reference not found")
     try:
-        chain = query_manager.get_chain(ref_hash)
-        if not chain:
-            raise HTTPException(status_code=404, detail="Reference not found")
-        return {"chain": chain}
+        chain = query_manager.get_chain(ref_hash, limit=limit, offset=offset)
+        return {
+            "chain": chain,
+            "length": info["length"],
+            "offset": offset,
+            "root": info["root"],
+            "head": info["head"],
+            "next": info["next"]
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/chain/{ref_hash}/latest")
+def get_latest_in_chain(ref_hash: str):
+    record = query_manager.get_latest_in_chain(ref_hash)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Reference not found")
+    return record
     
 @app.post("/pets")
 def add_pet(pet_data: dict):
     # Validate with Pydantic
     pet = Pet(**pet_data)
     # Add to RBD
-    ref = db.add(pet.dict(), text_hint=f"{pet.breed} {pet.type}")
+    ref = query_manager.add_record(pet.dict(), text_hint=f"{pet.breed} {pet.type}", collection=collection_for_model(pet))
     return {"ref": ref}    
 
+def stream_ndjson(records):
+    """Stream records as newline-delimited JSON"""
+    return StreamingResponse(
+        (json.dumps(record, default=str) + "\n" for record in records),
+        media_type="application/x-ndjson"
+    )
+
+def get_records_page(limit: int, after: Optional[str], record_type: Optional[str] = None,
+                     since: Optional[int] = None, until: Optional[int] = None):
+    """Fetch a keyset-paginated page of records"""
+    try:
+        return query_manager.get_records_page(limit, after, record_type, since=since, until=until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/records")
-def get_all_records():
-    """Get all records from the database"""
-    records = query_manager.get_all_records()
+def get_all_records(
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = None,
+    format: str = "json"
+):
+    """Get all records from the database, optionally paginated, time-filtered or streamed"""
+    if format == "ndjson":
+        return stream_ndjson(query_manager.iter_records(since=since, until=until))
+    
+    if limit is not None:
+        return get_records_page(limit, after, since=since, until=until)
+    
+    if since is None and until is None:
+        records = query_manager.get_all_records()
+    else:
+        records = query_manager.get_records_between(since, until)
     
     return {
         "total": len(records),
@@ -83,12 +191,96 @@ def get_all_records():
     }
 
 @app.get("/records/type/{record_type}")
-def get_records_by_type(record_type: str):
-    """Get all records of a specific type"""
+def get_records_by_type(
+    record_type: str,
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = None,
+    format: str = "json"
+):
+    """Get all records of a specific type, optionally paginated or streamed"""
+    if format == "ndjson":
+        return stream_ndjson(query_manager.iter_records(record_type))
+    
+    if limit is not None:
+        return {"type": record_type, **get_records_page(limit, after, record_type)}
+    
     records = query_manager.get_records_by_type(record_type)
     
     return {
         "type": record_type,
         "total": len(records),
         "records": records
-    }
\ No newline at end of file
+    }
+
+@app.get("/collections")
+def get_collections():
+    """Get the number of records in each collection"""
+    return query_manager.get_collection_counts()
+
+@app.get("/records/{collection}")
+def get_records_by_collection(
+    collection: str,
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = None,
+    format: str = "json"
+):
+    """Get the records of one collection (pets, products, customers, sales, services)"""
+    if format == "ndjson":
+        return stream_ndjson(query_manager.iter_records(collection=collection))
+    
+    if limit is not None:
+        try:
+            page = query_manager.get_records_page(limit, after, collection=collection)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"collection": collection, **page}
+    
+    records = query_manager.get_records_by_collection(collection)
+    
+    return {
+        "collection": collection,
+        "total": len(records),
+        "records": records
+    }
+
+def query_values(value: str) -> list:
+    """A query-string value, plus the number, boolean or null it spells (e.g. "10.0" -> 10.0)"""
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return [value]
+    if parsed is None or isinstance(parsed, (bool, int, float)):
+        return [value, parsed]
+    return [value]
+
+@app.get("/find")
+def find_records(request: Request, limit: int = Query(0, ge=0), collection: Optional[str] = None):
+    """Find JSON records by payload fields; repeat a field to match any of several values"""
+    criteria = {}
+    for field, value in request.query_params.multi_items():
+        if field not in ("limit", "collection"):
+            # Query strings are text; also match payload fields stored as numbers or booleans
+            criteria.setdefault(field, []).extend(query_values(value))
+    if not criteria:
+        raise HTTPException(status_code=400, detail="At least one field filter is required")
+    
+    records = query_manager.find(limit, collection, **criteria)
+    return {
+        "criteria": criteria,
+        "total": len(records),
+        "records": records
+    }
+
+@app.get("/stats/embedding-cache")
+def get_embedding_cache_stats():
+    """Get embedding cache hit/miss counters"""
+    return query_manager.embedding_cache_stats()
+
+@app.get("/health/ready")
+def readiness():
+    """Embedding model state and load/warm-up timings; 503 until the model can serve"""
+    status = model_status()
+    if not EAGER_MODEL:
+        # Loaded by the first request that needs it
+        status["ready"] = status["state"] != "failed"
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
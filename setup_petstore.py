@@ -15,24 +15,30 @@ def load_sample_data():
     # Get the complete sample dataset
     dataset = export_sample_dataset()
     
-    # Load each entity type
-    total_added = 0
+    # Build one batch covering every entity type
+    batch = []
     for entity_type, entities in dataset.items():
-        print(f"📦 Adding {len(entities)} {entity_type}...")
+        print(f"📦 Queuing {len(entities)} {entity_type}...")
         for entity in entities:
-            try:
-                # Use the entity's name or description as text hint
-                name = entity.get('name') or entity.get('id') or entity_type
-                text_hint = f"Sample {entity_type}: {name}"
-                
-                ref = query_manager.add_record(entity, text_hint=text_hint)
-                total_added += 1
-                print(f"  ✅ Added: {entity_type} {entity['id']} ({ref})")
-                
-            except Exception as e:
-                print(f"  ❌ Failed to add {entity_type} {entity.get('id', 'unknown')}: {e}")
-                import traceback
-                traceback.print_exc()
+            # Use the entity's name or description as text hint
+            name = entity.get('name') or entity.get('id') or entity_type
+            batch.append({
+                "data": entity,
+                "text_hint": f"Sample {entity_type}: {name}",
+                "collection": entity_type
+            })
+    
+    # Embed and persist the whole batch at once
+    total_added = 0
+    try:
+        refs = query_manager.add_records(batch)
+        total_added = len(refs)
+        for item, ref in zip(batch, refs):
+            print(f"  ✅ Added: {item['data']['id']} ({ref})")
+    except Exception as e:
+        print(f"  ❌ Failed to add sample data: {e}")
+        import traceback
+        traceback.print_exc()
     
     print(f"🎉 Successfully added {total_added} records to the database!")
     print(f"💾 Database saved at: data/petstore_rbd.json")
@@ -47,6 +53,10 @@ def load_sample_data():
     
     for record_type, count in type_counts.items():
         print(f"   {record_type}: {count}")
+    
+    # Group by collection
+    for collection, count in query_manager.get_collection_counts().items():
+        print(f"   {collection}: {count}")
 
 if __name__ == "__main__":
     load_sample_data()
\ No newline at end of file
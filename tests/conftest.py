@@ -0,0 +1,70 @@
+# tests/conftest.py
+"""Shared fixtures: rbd import path, a stand-in embedding model and store factories"""
+
+import hashlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web", "petstore"))
+
+from rbd import model_loader  # noqa: E402
+from rbd.database import ReferenceBaseDB  # noqa: E402
+
+
+class FakeModel:
+    """
+    Deterministic bag-of-words embedder standing in for the GGUF model.
+
+    Every word contributes a fixed pseudo-random vector, so texts sharing
+    words are similar and identical texts embed identically.
+    """
+
+    dim = 16
+
+    def __init__(self):
+        self.calls = 0
+
+    def _embed(self, text: str):
+        vec = [0.0] * self.dim
+        for word in text.lower().split():
+            digest = hashlib.md5(word.encode()).digest()
+            for i in range(self.dim):
+                vec[i] += (digest[i] - 128) / 128.0
+        return vec
+
+    def create_embedding(self, texts):
+        self.calls += 1
+        texts = texts if isinstance(texts, list) else [texts]
+        return {"data": [{"index": i, "embedding": self._embed(text)} for i, text in enumerate(texts)]}
+
+
+@pytest.fixture(autouse=True)
+def fake_model(monkeypatch):
+    """Serve embeddings from FakeModel instead of loading llama.cpp."""
+    model = FakeModel()
+    monkeypatch.setattr(model_loader, "_model", model)
+    return model
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    """Snapshot path of a fresh store in a temporary directory."""
+    return str(tmp_path / "store.json")
+
+
+@pytest.fixture
+def open_db(store_path):
+    """Open ReferenceBaseDB instances on ``store_path``, closed after the test."""
+    opened = []
+
+    def _open(path=None, **options):
+        options.setdefault("embedding_cache", False)
+        db = ReferenceBaseDB(path or store_path, **options)
+        opened.append(db)
+        return db
+
+    yield _open
+    for db in opened:
+        db.close()
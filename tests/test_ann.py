@@ -0,0 +1,113 @@
+# tests/test_ann.py
+"""Approximate nearest-neighbour indexes: background training and exactness"""
+
+import threading
+
+import pytest
+
+from rbd.ann import ANNIndex, IVFIndex, QuantizedIndex
+from rbd.quantization import VectorCodec
+
+
+def _ivf(store_path, **options):
+    options = {"min_train": 64, "nlist": 8, **options}
+    return IVFIndex(store_path + ".ann.npz", **options)
+
+
+def _notes(count, start=0):
+    return [{"data": f"note {i} about a {['cat', 'dog', 'bird', 'fish'][i % 4]} named pet{i}"}
+            for i in range(start, start + count)]
+
+
+def _exact(db, text, threshold):
+    ann, db.ann = db.ann, None
+    try:
+        return db.query_similar(text, threshold=threshold)
+    finally:
+        db.ann = ann
+
+
+def test_ivf_matches_exact_search_once_trained(open_db, store_path):
+    db = open_db(ann_index=_ivf(store_path, nprobe=8))
+    db.add_many(_notes(100))
+    db.ann.join()
+    assert db.ann.is_trained
+    assert db.ann.count == len(db.vectors)
+
+    # Probing every list makes the index exact; rows added after training
+    # are assigned incrementally
+    db.add_many(_notes(20, start=100))
+    assert db.ann.count == len(db.vectors) == 120
+    for text in ("note 7 about a dog", "a bird named pet113"):
+        assert db.query_similar(text, threshold=0.3) == _exact(db, text, 0.3)
+
+
+def test_training_does_not_block_adds_or_queries(open_db, store_path, monkeypatch):
+    release = threading.Event()
+    started = threading.Event()
+    real_build = IVFIndex._build
+
+    def slow_build(self, vectors):
+        started.set()
+        release.wait(10)
+        return real_build(self, vectors)
+
+    monkeypatch.setattr(IVFIndex, "_build", slow_build)
+    db = open_db(ann_index=_ivf(store_path))
+    db.add_many(_notes(100))
+    assert started.wait(5)
+
+    # The build is stuck; writes and exact-scan queries go on meanwhile
+    db.add_many(_notes(10, start=100))
+    assert not db.ann.is_trained
+    assert db.query_similar("note 104 about a cat named pet104", threshold=0.99)[0]["data"] == \
+        "note 104 about a cat named pet104"
+
+    release.set()
+    db.ann.join()
+    # The build covered a snapshot of 100 rows; the rest were caught up on install
+    assert db.ann.is_trained
+    assert db.ann.count == len(db.vectors) == 110
+
+
+def test_trained_index_is_persisted(open_db, store_path, monkeypatch):
+    db = open_db(ann_index=_ivf(store_path))
+    db.add_many(_notes(100))
+    db.ann.join()
+    db.save()
+    db.close()
+
+    builds = []
+    monkeypatch.setattr(IVFIndex, "_build", lambda self, vectors: builds.append(vectors))
+    reopened = open_db(ann_index=_ivf(store_path))
+    assert reopened.ann.is_trained and reopened.ann.count == 100
+    assert builds == []
+    assert reopened.query_similar("note 5 about a dog named pet5", threshold=0.99)[0]["data"] == \
+        "note 5 about a dog named pet5"
+
+
+def test_pq_trains_in_the_background_and_is_persisted(open_db, store_path, monkeypatch):
+    def pq():
+        return QuantizedIndex(store_path + ".ann.npz", codec="pq", min_train=64, m=4, ksub=16, rerank=200)
+
+    db = open_db(ann_index=pq())
+    db.add_many(_notes(100))
+    db.ann.join()
+    assert db.ann.codec.is_trained and db.ann.count == 100
+    text = "note 42 about a bird named pet42"
+    assert db.query_similar(text, threshold=0.3) == _exact(db, text, 0.3)
+    db.save()
+    db.close()
+
+    builds = []
+    monkeypatch.setattr(QuantizedIndex, "_build", lambda self, vectors: builds.append(vectors))
+    reopened = open_db(ann_index=pq())
+    assert reopened.ann.codec.is_trained and reopened.ann.count == 100
+    assert builds == []
+    assert reopened.query_similar(text, threshold=0.99)[0]["data"] == text
+
+
+def test_index_interfaces_are_abstract():
+    for interface in (ANNIndex, VectorCodec):
+        with pytest.raises(TypeError):
+            interface()
@@ -0,0 +1,127 @@
+# tests/test_api.py
+"""HTTP endpoints of the RBD app (main.py), served from a store in a temporary directory"""
+
+import importlib
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    """The main module, with its store and caches under ``tmp_path``."""
+    from rbd import database
+
+    clock = iter(range(1700000000, 1700010000))
+    monkeypatch.setattr(database.time, "time", lambda: next(clock))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    monkeypatch.setenv("RBD_EAGER_MODEL", "0")
+    monkeypatch.syspath_prepend(ROOT)
+    sys.modules.pop("main", None)
+    module = importlib.import_module("main")
+    yield module
+    module.query_manager.db.close()
+    sys.modules.pop("main", None)
+
+
+@pytest.fixture
+def client(main):
+    from fastapi.testclient import TestClient
+
+    return TestClient(main.app)
+
+
+def _ns(records):
+    return [record["data"]["n"] for record in records]
+
+
+def _walk(client, url, limit):
+    """Follow next_cursor from the first page to the last."""
+    pages, params = [], {"limit": limit}
+    while True:
+        page = client.get(url, params=params).json()
+        pages.append(page["records"])
+        if page["next_cursor"] is None:
+            return pages
+        params["after"] = page["next_cursor"]
+
+
+def test_records_pages_follow_the_cursor(main, client):
+    main.query_manager.add_record({"n": 0})
+    # One batch, one timestamp: the ref breaks the tie
+    main.query_manager.add_records([{"data": {"n": n}} for n in range(1, 5)])
+    main.query_manager.add_record({"n": 5})
+    main.query_manager.add_record("a note")
+
+    newest_first = [record["data"]["n"] for record in main.query_manager.get_records_by_type("j")]
+    pages = _walk(client, "/records/type/j", 2)
+    assert [n for page in pages for n in _ns(page)] == newest_first
+    assert [len(page) for page in pages] == [2, 2, 2, 0]
+    assert [len(page) for page in _walk(client, "/records", 4)] == [4, 3]
+
+    response = client.get("/records", params={"limit": 2, "after": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_ndjson_streams_every_record(main, client):
+    main.query_manager.add_records([{"data": {"n": n}} for n in range(3)])
+    main.query_manager.add_record({"n": 3})
+
+    response = client.get("/records", params={"format": "ndjson"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert records == main.query_manager.get_all_records()
+    assert _ns(records)[0] == 3
+
+
+def test_records_time_bounds_apply_to_pages_and_streams(main, client):
+    refs = [main.query_manager.add_record({"n": i}) for i in range(6)]
+    ts = [main.query_manager.get_record_by_ref(ref)["timestamp"] for ref in refs]
+    bounds = {"since": ts[1], "until": ts[4]}
+
+    assert _ns(client.get("/records", params=bounds).json()["records"]) == [4, 3, 2]
+    page = client.get("/records", params={**bounds, "limit": 2}).json()
+    assert _ns(page["records"]) == [4, 3]
+    page = client.get("/records", params={**bounds, "limit": 2, "after": page["next_cursor"]}).json()
+    assert _ns(page["records"]) == [2]
+    lines = client.get("/records", params={**bounds, "format": "ndjson"}).text.splitlines()
+    assert _ns([json.loads(line) for line in lines]) == [4, 3, 2]
+
+
+def test_find_matches_numeric_and_boolean_fields(main, client):
+    main.query_manager.add_record({"id": "pet-1", "price": 10.0, "vaccinated": True, "n": 1})
+    main.query_manager.add_record({"id": "pet-2", "price": 12, "vaccinated": False, "n": 2})
+    main.query_manager.add_record({"id": "10", "price": "10", "vaccinated": "true", "n": 3})
+
+    def find(params):
+        return _ns(client.get("/find", params=params).json()["records"])
+
+    assert find({"price": "10.0"}) == [1]
+    assert find({"price": "10"}) == [3, 1]
+    assert find([("price", "10.0"), ("price", "12")]) == [2, 1]
+    assert find({"vaccinated": "false"}) == [2]
+    # Indexed field, strings stay strings
+    assert find({"id": "pet-2"}) == [2]
+    assert find({"id": "10"}) == [3]
+
+
+def test_readiness_follows_the_model_state(main, client, monkeypatch):
+    from rbd import model_loader
+
+    def ready(state):
+        monkeypatch.setitem(model_loader._status, "state", state)
+        response = client.get("/health/ready")
+        assert response.json()["state"] == state
+        return response.status_code
+
+    monkeypatch.setattr(main, "EAGER_MODEL", True)
+    states = ("not_loaded", "loading", "warming_up", "ready", "failed")
+    assert [ready(state) for state in states] == [503, 503, 503, 200, 503]
+    # Loaded on first use: ready unless loading already failed
+    monkeypatch.setattr(main, "EAGER_MODEL", False)
+    assert [ready(state) for state in ("not_loaded", "ready", "failed")] == [200, 200, 503]
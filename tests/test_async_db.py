@@ -0,0 +1,92 @@
+# tests/test_async_db.py
+"""AsyncReferenceBaseDB: results match the sync API, blocking work stays off the event loop"""
+
+import asyncio
+import threading
+
+from rbd.async_db import AsyncReferenceBaseDB
+
+
+def _run(store_path, scenario, **options):
+    """Open an async database on ``store_path``, await ``scenario(db)`` and close it."""
+    async def main():
+        db = AsyncReferenceBaseDB(store_path, embedding_cache=False, **options)
+        try:
+            return await scenario(db)
+        finally:
+            await db.close()
+
+    return asyncio.run(main())
+
+
+def test_results_match_the_wrapped_database(store_path):
+    async def scenario(db):
+        root = await db.add({"id": "pet-1"})
+        refs = await db.add_many([{"data": "black cat"}, {"data": "white dog"}])
+        child = await db.add({"id": "pet-1", "v": 2}, prev=root)
+        return {
+            "refs": [root, *refs, child],
+            "record": await db.get_record(refs[1]),
+            "matches": await db.query_similar("white dog", threshold=0.99),
+            "chain": await db.get_chain(child),
+            "all": await db.get_all_records(),
+            "streamed": [record async for record in db.iter_records(page_size=2)],
+            "sync_all": db.db.get_all_records()
+        }
+
+    result = _run(store_path, scenario)
+    assert result["record"]["data"] == "white dog"
+    assert [match["ref"] for match in result["matches"]] == [result["refs"][2]]
+    assert result["chain"] == [{"id": "pet-1", "v": 2}, {"id": "pet-1"}]
+    assert result["all"] == result["streamed"] == result["sync_all"]
+    assert len(result["all"]) == 4
+
+
+def test_blocking_work_runs_on_the_executors(store_path, fake_model, monkeypatch):
+    threads = {}
+    create_embedding = fake_model.create_embedding
+
+    def tracked(texts):
+        threads.setdefault("embed", set()).add(threading.current_thread().name)
+        return create_embedding(texts)
+
+    monkeypatch.setattr(fake_model, "create_embedding", tracked)
+
+    async def scenario(db):
+        commit = db.db._commit
+
+        def tracked_commit(*args, **kwargs):
+            threads.setdefault("commit", set()).add(threading.current_thread().name)
+            return commit(*args, **kwargs)
+
+        db.db._commit = tracked_commit
+        threads["loop"] = threading.current_thread().name
+        await db.add_many([{"data": "black cat"}, {"data": "white dog"}])
+        await db.query_similar("cat")
+
+    _run(store_path, scenario)
+    assert all(name.startswith("rbd-embed") for name in threads["embed"])
+    assert all(name.startswith("rbd-io") for name in threads["commit"])
+    assert threads["loop"] not in threads["embed"] | threads["commit"]
+
+
+def test_reads_proceed_while_an_embedding_is_slow(store_path, fake_model, monkeypatch):
+    release = threading.Event()
+    create_embedding = fake_model.create_embedding
+
+    def slow(texts):
+        release.wait(5)
+        return create_embedding(texts)
+
+    async def scenario(db):
+        ref = await db.add({"id": "pet-1"})
+        monkeypatch.setattr(fake_model, "create_embedding", slow)
+        pending = asyncio.ensure_future(db.add("a slow note"))
+        # The embedding pool is busy; the I/O pool still answers
+        record = await asyncio.wait_for(db.get_record(ref), 5)
+        assert not pending.done()
+        release.set()
+        await pending
+        return record
+
+    assert _run(store_path, scenario)["data"] == {"id": "pet-1"}
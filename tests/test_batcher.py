@@ -0,0 +1,65 @@
+# tests/test_batcher.py
+"""EmbeddingBatcher: coalescing requests and bounding model calls"""
+
+import threading
+
+import pytest
+
+from rbd.batcher import EmbeddingBatcher
+
+
+class RecordingEmbed:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("model failed")
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+@pytest.fixture
+def batcher_factory():
+    batchers = []
+
+    def _make(**options):
+        batcher = EmbeddingBatcher(**options)
+        batchers.append(batcher)
+        return batcher
+
+    yield _make
+    for batcher in batchers:
+        batcher.close()
+
+
+def test_model_calls_respect_max_batch_size(batcher_factory):
+    embed = RecordingEmbed()
+    batcher = batcher_factory(embed=embed, max_batch_size=4)
+    texts = [f"text {i}" * (i + 1) for i in range(10)]
+    vectors = batcher.embed(texts)
+
+    assert [len(call) for call in embed.calls] == [4, 4, 2]
+    assert [vec[0] for vec in vectors] == [float(len(text)) for text in texts]
+    assert batcher.stats()["batches"] == 3
+
+
+def test_concurrent_requests_share_calls_and_dedupe(batcher_factory):
+    embed = RecordingEmbed()
+    batcher = batcher_factory(embed=embed, max_batch_size=100, max_wait=0.2)
+    futures = [batcher.submit(["same", f"other {i}"]) for i in range(5)]
+    results = [future.result() for future in futures]
+
+    assert len(embed.calls) == 1 and sorted(embed.calls[0]) == sorted({"same"} | {f"other {i}" for i in range(5)})
+    assert all(result[0][0] == 4.0 for result in results)
+
+
+def test_model_failure_reaches_every_caller(batcher_factory):
+    batcher = batcher_factory(embed=RecordingEmbed(fail=True), max_batch_size=2, max_wait=0.1)
+    futures = [batcher.submit([f"text {i}", f"more {i}"]) for i in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model failed"):
+            future.result()
@@ -0,0 +1,41 @@
+# tests/test_bulk.py
+"""add_many: input order, one embedding call and one commit per batch"""
+
+from rbd.wal import WriteAheadLog
+
+
+def test_refs_follow_input_order(open_db):
+    db = open_db()
+    items = [{"data": {"id": f"pet-{i}"}} for i in range(3)] + [{"data": "plain text"}]
+    refs = db.add_many(items)
+
+    data_of = {record["ref"]: record["data"] for record in db.get_all_records()}
+    assert [data_of[ref] for ref in refs] == [item["data"] for item in items]
+
+
+def test_texts_are_embedded_in_one_call(open_db, store_path, fake_model):
+    db = open_db()
+    refs = db.add_many([{"data": "a small brown dog"}, {"data": {"id": "pet-1"}},
+                        {"data": {"id": "pet-2"}, "text_hint": "a large grey cat"}])
+    assert fake_model.calls == 1
+
+    # Each vector was attached to its own record: fingerprints match single adds
+    single = open_db(path=store_path + ".single")
+    for ref, text in ((refs[0], "a small brown dog"), (refs[2], "a large grey cat")):
+        single_ref = single.add(text)
+        vf_hash, = [vf_hash for vf_hash, vf_refs in single.fingerprints.items() if single_ref in vf_refs]
+        assert db.fingerprints[vf_hash] == [ref]
+    assert len(db.fingerprints) == 2
+
+
+def test_batch_is_committed_once(open_db, monkeypatch):
+    appended = []
+    real_append_many = WriteAheadLog.append_many
+    monkeypatch.setattr(WriteAheadLog, "append_many",
+                        lambda self, frames: (appended.append(len(frames)), real_append_many(self, frames))[1])
+    db = open_db(log_mode=True)
+    db.add_many([{"data": {"id": f"pet-{i}"}} for i in range(5)])
+    assert appended == [5]
+    db.close()
+
+    assert len(open_db(log_mode=True).get_all_records()) == 5
@@ -0,0 +1,69 @@
+# tests/test_chain.py
+"""prev-linked chains: offset/limit walks, skip pointers and chain heads"""
+
+import itertools
+
+import pytest
+
+from rbd import database
+
+
+@pytest.fixture
+def chain(open_db, monkeypatch):
+    """A store holding one 20-record chain; returns (db, refs oldest first)."""
+    clock = itertools.count(100)
+    monkeypatch.setattr(database.time, "time", lambda: next(clock))
+    db = open_db()
+    refs = [db.add({"v": 0})]
+    for v in range(1, 20):
+        refs.append(db.add({"v": v}, prev=refs[-1]))
+    return db, refs
+
+
+def test_offset_and_limit_select_a_window(chain):
+    db, refs = chain
+    assert [item["v"] for item in db.get_chain(refs[-1])] == list(range(19, -1, -1))
+    assert [item["v"] for item in db.get_chain(refs[-1], limit=3, offset=5)] == [14, 13, 12]
+    assert [item["v"] for item in db.get_chain(refs[10], offset=8)] == [2, 1, 0]
+    assert db.get_chain(refs[-1], offset=20) == []
+
+
+def test_offset_jumps_without_visiting_skipped_records(chain, monkeypatch):
+    db, refs = chain
+    visited = []
+    view = db._view
+    monkeypatch.setattr(db, "_view", lambda ref_hash: visited.append(ref_hash) or view(ref_hash))
+
+    db.get_chain(refs[-1], limit=2, offset=17)
+    assert visited == [refs[2], refs[1]]
+
+
+def test_skip_pointers_match_a_linear_walk(chain):
+    db, refs = chain
+    # 2**4 <= 19 < 2**5
+    assert len(db.chains.up) == 5
+    for start in (19, 13, 6):
+        for steps in range(start + 1):
+            assert db.chains.ancestor(refs[start], steps) == refs[start - steps]
+    assert db.chains.ancestor(refs[5], 6) is None
+
+
+def test_latest_is_the_newest_record_of_the_chain(chain):
+    db, refs = chain
+    info = db.get_chain_info(refs[4])
+    assert (info["length"], info["root"], info["head"]) == (5, refs[0], refs[-1])
+    assert info["next"] == [refs[5]]
+
+    # Shallower than the old head, but added later
+    fork = db.add({"v": "fork"}, prev=refs[7])
+    assert db.get_chain_info(refs[0])["head"] == fork
+    assert db.get_chain_info(refs[7])["next"] == [refs[8], fork]
+    assert db.get_chain_info("sha3:missing") is None
+
+
+def test_index_is_rebuilt_on_load(chain, open_db):
+    db, refs = chain
+    db.save()
+    reopened = open_db()
+    assert [item["v"] for item in reopened.get_chain(refs[-1], limit=2, offset=10)] == [9, 8]
+    assert reopened.get_chain_info(refs[3])["head"] == refs[-1]
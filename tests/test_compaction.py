@@ -0,0 +1,113 @@
+# tests/test_compaction.py
+"""Compaction: crash safety at every step and writes racing a compaction"""
+
+import os
+import time
+
+import pytest
+
+from rbd import database, snapshot
+from rbd.wal import WriteAheadLog
+
+
+class Crash(Exception):
+    """Stands in for the process dying at a given point."""
+
+
+def _fill(db, count=6, start=0):
+    refs = db.add_many([{"data": {"id": f"pet-{i}", "n": i}} for i in range(start, start + count)])
+    refs += db.add_many([{"data": f"note about pet {i}"} for i in range(start, start + count)])
+    return refs
+
+
+def _assert_intact(db, refs):
+    assert sorted(db.store) == sorted(refs)
+    assert len(db.timeline) == len(refs)
+    assert len(db.get_all_records()) == len(refs)
+    assert db.query_similar("note about pet 1", threshold=0.99)[0]["data"] == "note about pet 1"
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_crash_between_snapshot_and_log_truncate(open_db, store_path, monkeypatch, lazy):
+    db = open_db(log_mode=True, lazy=lazy)
+    refs = _fill(db)
+    db.compact()
+    refs += _fill(db, start=6)
+
+    def crash(self, offset):
+        raise Crash()
+
+    with monkeypatch.context() as patch, pytest.raises(Crash):
+        patch.setattr(WriteAheadLog, "discard_prefix", crash)
+        db.compact()
+
+    # The new snapshot and the whole old log are both on disk; replaying
+    # frames already in the snapshot must not duplicate anything
+    assert WriteAheadLog(store_path + ".log").size() > 0
+    reopened = open_db(log_mode=True, lazy=lazy)
+    _assert_intact(reopened, refs)
+    reopened.compact()
+    reopened.close()
+    _assert_intact(open_db(log_mode=True, lazy=lazy), refs)
+
+
+def test_crash_before_snapshot_rename(open_db, store_path, monkeypatch):
+    db = open_db(log_mode=True)
+    refs = _fill(db)
+    db.compact()
+    refs += _fill(db, start=6)
+    before = open(store_path, "rb").read()
+
+    real_replace = os.replace
+
+    def crash(src, dst):
+        if dst == store_path:
+            raise Crash()
+        real_replace(src, dst)
+
+    with monkeypatch.context() as patch, pytest.raises(Crash):
+        patch.setattr(snapshot.os, "replace", crash)
+        db.compact()
+
+    assert open(store_path, "rb").read() == before
+    _assert_intact(open_db(log_mode=True), refs)
+
+
+def test_writes_during_compaction_are_kept(open_db, monkeypatch):
+    db = open_db(log_mode=True)
+    refs = _fill(db)
+    real_write = database.write_snapshot
+
+    def write_while_adding(*args, **kwargs):
+        # Runs after the state was captured and the log cut, with no lock held
+        refs.append(db.add({"id": "pet-late"}))
+        return real_write(*args, **kwargs)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(database, "write_snapshot", write_while_adding)
+        db.compact()
+
+    assert [frame["record"]["data"] for frame in WriteAheadLog(db.log.path).replay()] == ['j:j:{"id": "pet-late"}']
+    db.close()
+    _assert_intact(open_db(log_mode=True), refs)
+
+
+def test_compactor_runs_in_background(open_db):
+    db = open_db(log_mode=True, auto_compact={"min_log_bytes": 1, "ratio": 0.0, "check_interval": 0.01})
+    refs = _fill(db)
+    deadline = time.monotonic() + 5
+    # The second batch may land after the first compaction; wait for the log to drain
+    stats = db.compaction_stats()
+    while (stats["compactions"] == 0 or stats["log_bytes"]) and time.monotonic() < deadline:
+        time.sleep(0.01)
+        stats = db.compaction_stats()
+
+    assert stats["compactions"] >= 1
+    assert stats["log_bytes"] == 0
+    db.close()
+    _assert_intact(open_db(log_mode=True), refs)
+
+
+def test_compact_requires_log_mode(open_db):
+    with pytest.raises(ValueError):
+        open_db().compact()
@@ -0,0 +1,109 @@
+# tests/test_dedup.py
+"""Near-duplicate detection: dedup modes and the persisted SimHash keys"""
+
+import os
+
+import pytest
+
+from rbd.database import ReferenceBaseDB
+from rbd.lsh import DuplicateRecordError, SimHashIndex
+
+
+def _notes(count):
+    return [{"data": f"note {i} about a pet called name{i}"} for i in range(count)]
+
+
+def test_dedup_modes(open_db):
+    db = open_db(dedup="reject")
+    # The stand-in model ignores case, so these embed identically
+    ref = db.add("a small brown dog")
+    with pytest.raises(DuplicateRecordError) as raised:
+        db.add("A small brown dog")
+    assert raised.value.refs == [ref]
+
+    merging = open_db(path=db.filepath + ".merge", dedup="merge")
+    first = merging.add("a small brown dog")
+    assert merging.add("A small brown dog") == first
+    assert merging.add("a large grey cat") != first
+
+
+def test_reject_catches_duplicates_within_a_batch(open_db):
+    db = open_db(dedup="reject")
+    with pytest.raises(DuplicateRecordError) as raised:
+        db.add_many([{"data": "a small brown dog"}, {"data": "a large grey cat"}, {"data": "A small brown dog"}])
+    assert list(raised.value.duplicates) == [2]
+    # Nothing from the rejected batch was stored
+    assert len(db.store) == 0
+
+    refs = db.add_many([{"data": "a small brown dog"}, {"data": "a large grey cat"}])
+    assert len(refs) == 2 and len(db.store) == 2
+
+
+def test_merge_keeps_records_that_set_prev(open_db):
+    db = open_db(dedup="merge")
+    root = db.add("a small brown dog")
+    assert db.add_many([{"data": "A small brown dog"}, {"data": "a small BROWN dog"}]) == [root, root]
+
+    # A chain update is stored even though its text is a near-duplicate
+    update = db.add("A small brown dog", prev=root)
+    assert update != root
+    assert db.get_chain(update) == ["A small brown dog", "a small brown dog"]
+
+
+def test_keys_are_not_rehashed_on_open(open_db, store_path, monkeypatch):
+    db = open_db(log_mode=True, dedup="keep")
+    refs = db.add_many(_notes(50))
+    db.save()
+    duplicate = db.add("Note 7 about a pet called name7")
+    db.add("a note that was never saved")
+    db.close()
+    assert os.path.exists(store_path + ".lsh.keys")
+
+    hashed = []
+    real_keys = SimHashIndex._keys
+    monkeypatch.setattr(SimHashIndex, "_keys", lambda self, matrix: (hashed.append(len(matrix)),
+                                                                    real_keys(self, matrix))[1])
+    reopened = open_db(log_mode=True, dedup="keep")
+    # A sample to check the file against the vectors, and the unsaved row
+    assert sum(hashed) <= 10 + 1
+    assert reopened.lsh.count == 51
+    assert reopened.near_duplicates(refs[7]) == [duplicate]
+
+
+def test_stale_keys_are_rehashed(open_db, store_path):
+    db = open_db(dedup="keep")
+    refs = db.add_many(_notes(20))
+    duplicate = db.add("Note 3 about a pet called name3")
+    db.close()
+    # Keys that no longer match the vectors, e.g. from an older sidecar
+    size = os.path.getsize(store_path + ".lsh.keys")
+    with open(store_path + ".lsh.keys", "r+b") as f:
+        f.seek(size // 2)
+        f.write(b"\xff" * (size - size // 2))
+
+    reopened = open_db(dedup="keep")
+    assert reopened.lsh.count == 20
+    assert (reopened.lsh._key_rows[:20] == reopened.lsh._keys(reopened.vectors.matrix())).all()
+    assert reopened.near_duplicates(refs[3]) == [duplicate]
+    assert reopened.near_duplicates(refs[15]) == []
+
+
+def test_adds_do_not_rescan_for_missing_vectors(open_db, store_path, monkeypatch):
+    db = open_db(log_mode=True, dedup="keep")
+    db.add_many(_notes(5))
+    db.add({"id": "pet-9"}, text_hint="hint that was never stored")
+    db.save()
+    db.close()
+    os.remove(store_path + ".vectors.f32")
+
+    db = open_db(log_mode=True, dedup="keep")
+    db.add("the first add backfills")
+    assert db._missing_vectors == set()
+    assert len(db.vectors) == 6
+
+    decoded = []
+    real_decode = ReferenceBaseDB._decode_data
+    monkeypatch.setattr(db, "_decode_data", lambda s: (decoded.append(s), real_decode(db, s))[1])
+    for i in range(3):
+        db.add(f"later add {i}")
+    assert all("pet-9" not in s for s in decoded)
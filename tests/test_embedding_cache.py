@@ -0,0 +1,65 @@
+# tests/test_embedding_cache.py
+"""Embedding cache tiers, counters and use by the database"""
+
+import numpy as np
+
+from rbd.embedding_cache import EmbeddingCache
+
+
+def test_counters_track_memory_hits_and_misses():
+    cache = EmbeddingCache("m")
+    assert cache.get_many(["a", "b"]) == [None, None]
+    cache.put_many(["a"], [[1.0, 2.0]])
+
+    hit, miss = cache.get_many(["a", "b"])
+    np.testing.assert_array_equal(hit, [1.0, 2.0])
+    assert miss is None
+    assert cache.stats() == {"memory_hits": 1, "disk_hits": 0, "misses": 3, "memory_size": 1}
+
+
+def test_lru_evicts_the_least_recently_used_vector():
+    cache = EmbeddingCache("m", capacity=2)
+    cache.put_many(["a", "b"], [[1.0], [2.0]])
+    cache.get("a")
+    cache.put("c", [3.0])
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_sqlite_tier_survives_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache("m", path=path)
+    cache.put("a", [0.5, -0.5])
+    cache.close()
+
+    cache = EmbeddingCache("m", path=path)
+    np.testing.assert_array_equal(cache.get("a"), [0.5, -0.5])
+    # Promoted to memory by the disk hit
+    cache.get("a")
+    assert cache.stats() == {"memory_hits": 1, "disk_hits": 1, "misses": 0, "memory_size": 1}
+    cache.close()
+
+
+def test_vectors_are_keyed_by_model(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache("m1", path=path)
+    cache.put("a", [1.0])
+    cache.close()
+
+    cache = EmbeddingCache("m2", path=path)
+    assert cache.get("a") is None
+    cache.close()
+
+
+def test_database_embeds_repeated_texts_once(open_db, fake_model):
+    cache = EmbeddingCache("fake")
+    db = open_db(embedding_cache=cache)
+    db.add_many([{"data": "black cat"}, {"data": "black cat"}, {"data": "white dog"}])
+    assert fake_model.calls == 1
+
+    db.query_similar("white dog")
+    assert fake_model.calls == 1
+    # Both copies of "black cat" missed; the query hit memory
+    stats = cache.stats()
+    assert (stats["misses"], stats["memory_hits"]) == (3, 1)
@@ -0,0 +1,48 @@
+# tests/test_encoding.py
+"""Payload encodings: every type of record data reads back as it was written"""
+
+import numpy as np
+import pytest
+
+PAYLOADS = [
+    [19.99, 16777217, 3],
+    [0.1, 0.2, 1e300],
+    [16777217, -3, 2 ** 62],
+    [],
+    "plain text",
+    2.5,
+    {"id": "pet-1", "price": 19.99},
+]
+
+
+@pytest.mark.parametrize("log_mode", [False, True])
+@pytest.mark.parametrize("data", PAYLOADS, ids=repr)
+def test_payload_round_trip(open_db, data, log_mode):
+    db = open_db(log_mode=log_mode)
+    ref = db.add(data, text_hint="payload")
+    db.close()
+
+    value = open_db(log_mode=log_mode).get_record(ref)["data"]
+    assert value == data
+    if isinstance(data, list):
+        assert [type(x) for x in value] == [type(x) for x in data]
+
+
+@pytest.mark.parametrize("dtype", ["<f4", "<f8", "<i4", ">f8"])
+def test_arrays_keep_their_dtype(open_db, dtype):
+    db = open_db()
+    array = np.array([19.99, 16777217, 3], dtype=dtype)
+    encoded = db._encode_data(array)
+    assert encoded.startswith("v:b:" if dtype == "<f4" else "v:a:")
+
+    decoded = db._decode_data(encoded)
+    assert decoded.dtype == array.dtype.newbyteorder("<")
+    assert np.array_equal(decoded, array)
+
+
+def test_legacy_vector_encodings_are_read(open_db):
+    from rbd.vectors import pack_vector
+
+    db = open_db()
+    assert db._decode_data("v:f:1.500000,2.000000") == [1.5, 2.0]
+    assert db._decode_data(f"v:b:{pack_vector([1.5, 2.0])}").tolist() == [1.5, 2.0]
@@ -0,0 +1,66 @@
+# tests/test_find.py
+"""find(): criteria, collections and newest-first limits"""
+
+import pytest
+
+
+@pytest.fixture
+def pets(open_db, monkeypatch):
+    from rbd import database
+
+    clock = iter(range(1700000000, 1700010000))
+    monkeypatch.setattr(database.time, "time", lambda: next(clock))
+    db = open_db(indexed_fields=["data.kind"])
+    for i in range(150):
+        # One record per second, so newest first is the reverse of insertion
+        db.add({"id": f"pet:{i}", "kind": "cat" if i % 3 else "dog", "n": i}, collection="pets")
+        if i % 10 == 0:
+            db.add({"id": f"cust:{i}", "kind": "cat", "n": i}, collection="customers")
+    return db
+
+
+def _ns(records):
+    return [record["data"]["n"] for record in records]
+
+
+def test_indexed_criteria_with_limit_are_newest_first(pets):
+    assert _ns(pets.find({"data.kind": "dog"}, limit=3)) == [147, 144, 141]
+    assert pets.find({"data.kind": "dog"}, limit=3) == pets.find({"data.kind": "dog"})[:3]
+
+
+def test_unindexed_filter_widens_the_selection(pets):
+    # The only matches are the oldest candidates, past the first selected batch
+    records = pets.find({"data.kind": "cat", "data.n": [1, 2]}, limit=2)
+    assert _ns(records) == [2, 1]
+
+
+def test_unindexed_criteria_walk_the_timeline(pets):
+    assert _ns(pets.find({"data.n": [5, 7, 121]}, limit=2)) == [121, 7]
+    assert _ns(pets.find({"data.n": 10}, collection="customers")) == [10]
+
+
+def test_collection_filter(pets):
+    records = pets.find({"data.kind": "cat"}, limit=4, collection="customers")
+    assert _ns(records) == [140, 130, 120, 110]
+    assert all(record["collection"] == "customers" for record in records)
+    assert len(pets.find({"data.kind": "cat"}, collection="pets")) == 100
+
+
+def test_collection_ref_sets_follow_adds_and_reloads(pets):
+    refs = pets.timeline.in_collection("customers")
+    assert len(refs) == 15
+    ref = pets.add({"id": "cust:new", "kind": "cat", "n": 999}, collection="customers")
+    assert ref in pets.timeline.in_collection("customers")
+    assert _ns(pets.find({"data.kind": "cat"}, limit=1, collection="customers")) == [999]
+
+    pets.save()
+    pets.load()
+    assert len(pets.timeline.in_collection("customers")) == 16
+    assert pets.timeline.in_collection("nothing") == set()
+
+
+def test_collection_ref_sets_of_a_lazy_load(pets, open_db):
+    pets.save()
+    lazy = open_db(lazy=True, indexed_fields=["data.kind"])
+    assert lazy.timeline.in_collection("customers") == pets.timeline.in_collection("customers")
+    assert _ns(lazy.find({"data.kind": "cat"}, limit=2, collection="customers")) == [140, 130]
@@ -0,0 +1,81 @@
+# tests/test_group_commit.py
+"""Group commit: durability on return, shared fsyncs and error propagation"""
+
+import os
+import threading
+
+import pytest
+
+from rbd import wal
+from rbd.wal import GroupCommitter, WriteAheadLog
+
+
+def test_add_is_on_disk_when_it_returns(open_db, store_path):
+    db = open_db(log_mode=True, commit_window=0.01)
+    ref = db.add({"id": "order-1", "total": 3})
+
+    # Read the file directly: nothing may still be queued in memory
+    frames = list(WriteAheadLog(store_path + ".log").replay())
+    assert [frame["ref"] for frame in frames] == [ref]
+
+
+def test_concurrent_writers_share_fsyncs(open_db, store_path, monkeypatch):
+    syncs = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(wal.os, "fsync", lambda fd: (syncs.append(fd), real_fsync(fd)))
+    db = open_db(log_mode=True, commit_window=0.05)
+
+    refs = []
+    lock = threading.Lock()
+    start = threading.Barrier(8)
+
+    def writer(i):
+        start.wait()
+        for j in range(5):
+            ref = db.add({"id": f"order-{i}-{j}"})
+            with lock:
+                refs.append(ref)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(refs) == 40
+    assert sorted(frame["ref"] for frame in WriteAheadLog(store_path + ".log").replay()) == sorted(refs)
+    assert len(syncs) < len(refs)
+    db.close()
+    assert sorted(open_db(log_mode=True).store) == sorted(refs)
+
+
+def test_flush_failure_reaches_every_writer_in_the_group():
+    def flush(frames):
+        raise OSError("disk full")
+
+    committer = GroupCommitter(flush, max_latency=0.05)
+    futures = [committer.submit([{"ref": str(i)}]) for i in range(3)]
+    for future in futures:
+        with pytest.raises(OSError, match="disk full"):
+            future.result(timeout=5)
+    committer.close()
+
+
+def test_close_flushes_queued_frames():
+    flushed = []
+    committer = GroupCommitter(flushed.extend, max_latency=10.0)
+    future = committer.submit([{"ref": "a"}, {"ref": "b"}])
+    committer.close()
+
+    assert future.done() and future.exception() is None
+    assert [frame["ref"] for frame in flushed] == ["a", "b"]
+    with pytest.raises(RuntimeError):
+        committer.submit([{"ref": "c"}])
+
+
+def test_group_commit_without_log_rewrites_snapshot(open_db):
+    db = open_db(commit_window=0.01)
+    refs = db.add_many([{"data": {"id": f"pet-{i}"}} for i in range(3)])
+    db.close()
+
+    assert sorted(open_db().store) == sorted(refs)
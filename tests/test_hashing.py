@@ -0,0 +1,99 @@
+# tests/test_hashing.py
+"""Ref hash backends: stable refs per backend, header recording and mismatches"""
+
+import hashlib
+import json
+
+import pytest
+
+from rbd import database
+from rbd.snapshot import read_header
+
+FIXED_TIME = 1700000000.0
+
+
+@pytest.fixture
+def fixed_time(monkeypatch):
+    """Stamp every record with the same time, so equal payloads get equal refs."""
+    monkeypatch.setattr(database.time, "time", lambda: FIXED_TIME)
+
+
+def _sha3_ref(record):
+    return "sha3:" + hashlib.sha3_256(json.dumps(record, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _blake2b_ref(record):
+    fields = {key: value for key, value in record.items() if key != "data"}
+    content = json.dumps(fields, sort_keys=True, separators=(",", ":")) + "\n" + record["data"]
+    return "blake2b:" + hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+
+
+@pytest.mark.parametrize("log_mode", [False, True])
+def test_sha3_refs_match_the_original_scheme(open_db, log_mode):
+    db = open_db(log_mode=log_mode, hash_algorithm="sha3")
+    for data in ({"id": "order-1", "items": [1, "é"]}, "plain text", 3.5):
+        ref = db.add(data)
+        assert ref == _sha3_ref(db.store[ref])
+
+
+@pytest.mark.parametrize("log_mode", [False, True])
+def test_blake2b_refs_hash_the_payload_beside_the_other_fields(open_db, monkeypatch, log_mode):
+    db = open_db(log_mode=log_mode)
+    assert db.hash_algorithm == database.DEFAULT_HASH == "blake2b"
+    encoded = []
+    real_encode = database._encode_json
+    monkeypatch.setattr(database, "_encode_json", lambda value: (encoded.append(value), real_encode(value))[1])
+    ref = db.add({"id": "order-1", "note": 'a "quoted" word\nü'}, collection="orders")
+    assert ref == _blake2b_ref(db.store[ref])
+    # The payload is serialized once, by the payload encoder only
+    assert encoded == [{"id": "order-1", "note": 'a "quoted" word\nü'}]
+
+
+@pytest.mark.parametrize("algorithm", sorted(database.HASH_BACKENDS))
+def test_refs_are_stable_across_reopen(open_db, store_path, fixed_time, algorithm):
+    db = open_db(log_mode=True, hash_algorithm=algorithm)
+    ref = db.add({"id": "pet-1"}, text_hint="a small dog")
+    vf_hash = db._fingerprint_of[ref]
+    db.save()
+    db.close()
+
+    assert read_header(store_path)["hash"] == algorithm
+    reopened = open_db(log_mode=True)
+    assert reopened.hash_algorithm == algorithm
+    # Re-adding the same record finds the same ref and fingerprint
+    assert reopened.add({"id": "pet-1"}, text_hint="a small dog") == ref
+    assert reopened._fingerprint_of[ref] == vf_hash
+    assert len(reopened.store) == 1
+
+
+def test_legacy_snapshot_is_detected_as_sha3(open_db, store_path, fixed_time):
+    record = {"data": 'j:j:{"id": "pet-1"}', "prev": None, "ts": int(FIXED_TIME), "type": "j"}
+    ref = _sha3_ref(record)
+    with open(store_path, "w") as f:
+        json.dump({"store": {ref: record}, "fingerprints": {}}, f, indent=2)
+
+    db = open_db()
+    assert db.hash_algorithm == "sha3"
+    assert db.add({"id": "pet-1"}) == ref
+    assert read_header(store_path)["hash"] == "sha3"
+
+
+def test_log_only_store_is_detected_from_its_refs(open_db):
+    db = open_db(log_mode=True, hash_algorithm="sha3")
+    ref = db.add({"id": "pet-1"})
+    db.close()
+
+    reopened = open_db(log_mode=True)
+    assert reopened.hash_algorithm == "sha3"
+    assert ref in reopened.store
+
+
+def test_mismatched_algorithm_is_rejected(open_db):
+    open_db(log_mode=True).add({"id": "pet-1"})
+    with pytest.raises(ValueError, match="uses blake2b refs"):
+        open_db(log_mode=True, hash_algorithm="sha3")
+
+
+def test_unknown_algorithm_is_rejected(open_db):
+    with pytest.raises(ValueError, match="Unknown hash algorithm"):
+        open_db(hash_algorithm="md5")
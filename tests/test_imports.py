@@ -0,0 +1,39 @@
+# tests/test_imports.py
+"""Importing rbd and reading a store in a fresh interpreter loads no heavy dependencies"""
+
+import json
+import os
+import subprocess
+import sys
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web", "petstore")
+
+HEAVY_MODULES = ["numpy", "llama_cpp", "torch"]
+
+
+def _loaded_after(code, cwd):
+    """Run ``code`` in a new interpreter and return the heavy modules it left in sys.modules."""
+    script = f"import json, sys\n{code}\nprint(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, "-c", script], cwd=cwd, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=PACKAGE_DIR), timeout=60)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_importing_the_package_is_light(tmp_path):
+    code = "import rbd, rbd.query, rbd.entities\nassert rbd.query._default_query_manager is None"
+    assert _loaded_after(code, str(tmp_path)) == []
+    # The default store is opened on first use, not on import
+    assert os.listdir(tmp_path) == []
+
+
+def test_reading_records_does_not_load_numpy(open_db, store_path, tmp_path):
+    db = open_db()
+    db.add_many([{"data": {"id": "pet-1"}}, {"data": "a black cat"}])
+    db.save()
+    db.close()
+
+    code = (f"from rbd import ReferenceBaseDB\n"
+            f"db = ReferenceBaseDB({store_path!r})\n"
+            f"assert len(db.get_all_records()) == 2 and db.get_record_types() == {{'j': 1, 't': 1}}")
+    assert _loaded_after(code, str(tmp_path)) == []
@@ -0,0 +1,148 @@
+# tests/test_lazy.py
+"""Lazy loads: the offset index and indexes built after opening"""
+
+import json
+import threading
+
+from rbd import indexes
+
+
+def _chain(db, length, start=None):
+    refs = []
+    prev = start
+    for i in range(length):
+        prev = db.add({"id": f"step-{i}", "kind": "step"}, prev=prev)
+        refs.append(prev)
+    return refs
+
+
+def test_deferred_indexes_are_built_without_blocking(open_db, monkeypatch):
+    db = open_db(log_mode=True, lazy=True, indexed_fields=["data.kind"])
+    refs = _chain(db, 5)
+    db.save()
+    db.close()
+
+    release = threading.Event()
+    started = threading.Event()
+    real_rebuild = indexes.ChainIndex.rebuild
+
+    def slow_rebuild(self, store):
+        started.set()
+        release.wait(10)
+        real_rebuild(self, store)
+
+    monkeypatch.setattr(indexes.ChainIndex, "rebuild", slow_rebuild)
+    lazy = open_db(log_mode=True, lazy=True, indexed_fields=["data.kind"])
+    assert lazy._deferred_indexes == {"chains", "fields"}
+    warm = threading.Thread(target=lazy.warm_up)
+    warm.start()
+    assert started.wait(5)
+
+    # The build holds no lock: reads and writes go on meanwhile
+    assert lazy.get_record(refs[0])["data"]["id"] == "step-0"
+    later = _chain(lazy, 2, start=refs[-1])
+    assert len(lazy.get_all_records()) == 7
+
+    release.set()
+    warm.join(10)
+    assert not warm.is_alive()
+    assert lazy._deferred_indexes == set()
+    # Records added during the build were indexed before the swap
+    info = lazy.get_chain_info(later[-1])
+    assert info["length"] == 7 and info["root"] == refs[0]
+    assert lazy.get_chain_info(refs[-1])["next"] == [later[0]]
+    assert len(lazy.find({"data.kind": "step"})) == 7
+
+
+def test_deferred_build_after_reload_is_dropped(open_db, monkeypatch):
+    db = open_db(log_mode=True, lazy=True)
+    refs = _chain(db, 3)
+    db.save()
+    db.close()
+
+    lazy = open_db(log_mode=True, lazy=True)
+    real_rebuild = indexes.ChainIndex.rebuild
+    reloads = []
+
+    def rebuild_then_reload(self, store):
+        real_rebuild(self, store)
+        if not reloads:
+            reloads.append(True)
+            lazy.load()
+
+    monkeypatch.setattr(indexes.ChainIndex, "rebuild", rebuild_then_reload)
+    assert lazy.get_chain_info(refs[-1])["length"] == 3
+    assert reloads and lazy._deferred_indexes == set()
+
+
+def test_offset_index_is_mapped_binary(open_db, store_path):
+    from rbd.snapshot import INDEX_HEADER, INDEX_VERSION, read_index
+
+    db = open_db(lazy=True, dedup="keep")
+    _chain(db, 3)
+    db.add("a small brown dog", collection="pets")
+    db.save()
+    db.close()
+
+    with open(store_path + ".idx", "rb") as f:
+        header = json.loads(f.readline())
+    assert header[INDEX_HEADER] == INDEX_VERSION
+    index = read_index(store_path)
+    assert index["columns"]["refs"].astype("U").tolist() == [ref for _, ref in db.timeline.timeline]
+    assert index["collections"] == ["pets"]
+
+
+def test_lazy_round_trip(open_db, monkeypatch):
+    from rbd import database
+
+    clock = iter(range(1700000000, 1700001000))
+    monkeypatch.setattr(database.time, "time", lambda: next(clock))
+    db = open_db(lazy=True, dedup="keep")
+    refs = db.add_many([{"data": {"id": f"pet-{i}"}} for i in range(10)])
+    first = db.add("a small brown dog", collection="pets")
+    duplicate = db.add("A small brown dog", collection="pets")
+    db.save()
+    db.close()
+
+    lazy = open_db(lazy=True, dedup="keep")
+    assert lazy.timeline.timeline == db.timeline.timeline
+    assert lazy.timeline.by_type == db.timeline.by_type
+    assert lazy.timeline.in_collection("pets") == {first, duplicate}
+    assert lazy.near_duplicates(first) == [duplicate]
+    assert lazy.get_record(refs[4])["data"] == {"id": "pet-4"}
+
+    # Records added after the load live beside the mapped index
+    later = lazy.add("a SMALL brown dog")
+    assert later in lazy.store and len(lazy.store) == 13
+    assert set(lazy.near_duplicates(first)) == {duplicate, later}
+    assert "missing" not in lazy.store
+    lazy.save()
+    assert lazy.store.line(later) is not None
+    assert lazy.near_duplicates(later)[0] in (first, duplicate)
+
+
+def test_legacy_json_index_falls_back_to_a_full_load(open_db, store_path):
+    db = open_db(lazy=True)
+    refs = _chain(db, 3)
+    db.close()
+    with open(store_path + ".idx", "w") as f:
+        json.dump({"snapshot_id": "old", "refs": refs}, f)
+
+    lazy = open_db(lazy=True)
+    assert not lazy._deferred_indexes
+    assert lazy.get_chain_info(refs[-1])["length"] == 3
+
+
+def test_non_ascii_refs_and_prev_survive_a_lazy_reopen(open_db):
+    db = open_db(log_mode=True, lazy=True, indexed_fields=["data.kind"])
+    root = db.add({"id": "ünïcode-root", "kind": "café"}, prev="ünïcode-prev")
+    child = db.add({"id": "日本-child", "kind": "café"}, prev=root)
+    db.save()
+    db.close()
+
+    lazy = open_db(log_mode=True, lazy=True, indexed_fields=["data.kind"])
+    assert lazy.store.header(root)[2] == "ünïcode-prev"
+    assert lazy.get_chain_info(child)["length"] == 2
+    assert lazy.get_chain(child, offset=1) == [{"id": "ünïcode-root", "kind": "café"}]
+    lazy.warm_up()
+    assert {record["data"]["id"] for record in lazy.find({"data.kind": "café"})} == {"ünïcode-root", "日本-child"}
@@ -0,0 +1,81 @@
+# tests/test_model_loader.py
+"""Embedding model lifecycle: load once, warm up, and report readiness"""
+
+import threading
+
+import pytest
+
+from rbd import model_loader
+
+from conftest import FakeModel
+
+
+@pytest.fixture
+def unloaded(monkeypatch):
+    """No global model yet and a fresh status; returns the FakeModel load_model will hand out."""
+    model = FakeModel()
+    monkeypatch.setattr(model_loader, "_model", None)
+    monkeypatch.setattr(model_loader, "_status", dict(model_loader._status, state="not_loaded", load_seconds=None,
+                                                      warmup_seconds=None, loaded_at=None, error=None))
+    monkeypatch.setattr(model_loader, "load_model", lambda **kwargs: model)
+    return model
+
+
+def test_warm_up_walks_through_every_state(unloaded, monkeypatch):
+    seen = []
+    load = model_loader.load_model
+
+    def tracked_load(**kwargs):
+        seen.append(model_loader.model_status()["state"])
+        return load(**kwargs)
+
+    def tracked_embed(texts):
+        seen.append(model_loader.model_status()["state"])
+        return FakeModel.create_embedding(unloaded, texts)
+
+    monkeypatch.setattr(model_loader, "load_model", tracked_load)
+    monkeypatch.setattr(unloaded, "create_embedding", tracked_embed)
+    assert model_loader.model_status()["state"] == "not_loaded"
+
+    status = model_loader.warm_up_model()
+    assert seen == ["loading", "warming_up"]
+    assert (status["state"], status["ready"], status["error"]) == ("ready", True, None)
+    assert status["load_seconds"] >= 0 and status["warmup_seconds"] >= 0 and status["loaded_at"]
+    assert status["model"] == model_loader.get_model_id()
+
+
+def test_failed_load_is_reported_not_raised(unloaded, monkeypatch):
+    def missing(**kwargs):
+        raise FileNotFoundError("Embedding model not found: nowhere.gguf")
+
+    monkeypatch.setattr(model_loader, "load_model", missing)
+    status = model_loader.warm_up_model()
+    assert (status["state"], status["ready"]) == ("failed", False)
+    assert "nowhere.gguf" in status["error"]
+
+    # Callers that need the model still get the error
+    with pytest.raises(FileNotFoundError):
+        model_loader.get_embedding_model()
+
+
+def test_concurrent_first_calls_load_once(unloaded, monkeypatch):
+    loads = []
+    release = threading.Event()
+
+    def slow_load(**kwargs):
+        loads.append(1)
+        release.wait(5)
+        return unloaded
+
+    monkeypatch.setattr(model_loader, "load_model", slow_load)
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(model_loader.get_embedding_model())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert loads == [1]
+    assert models == [unloaded] * 4
+    assert model_loader.model_status()["state"] == "loaded"
@@ -0,0 +1,39 @@
+# tests/test_query.py
+"""query_similar: the result limit is applied before records are decoded"""
+
+
+def _notes(db, count):
+    # Each note shares less of its text with "dog" than the one before
+    return db.add_many([{"data": "dog " + "cat " * i} for i in range(count)])
+
+
+def test_limit_returns_the_best_matches(open_db):
+    db = open_db()
+    refs = _notes(db, 20)
+
+    everything = db.query_similar("dog", threshold=-1.0)
+    assert len(everything) == 20 and everything[0]["ref"] == refs[0]
+    similarities = [result["similarity"] for result in everything]
+    assert similarities == sorted(similarities, reverse=True)
+    assert db.query_similar("dog", threshold=-1.0, limit=3) == everything[:3]
+    assert db.query_similar("dog", threshold=0.99, limit=3) == everything[:1]
+
+
+def test_limit_counts_records_sharing_a_fingerprint(open_db):
+    db = open_db()
+    same = db.add_many([{"data": {"id": f"pet-{i}"}, "text_hint": "a small dog"} for i in range(3)])
+    _notes(db, 3)
+
+    results = db.query_similar("a small dog", threshold=-1.0, limit=2)
+    assert [result["ref"] for result in results] == same[:2]
+
+
+def test_only_returned_records_are_decoded(open_db, monkeypatch):
+    _notes(open_db(), 20)
+    db = open_db()
+    decoded = []
+    real_decode = db._decode_data
+    monkeypatch.setattr(db, "_decode_data", lambda s: (decoded.append(s), real_decode(s))[1])
+
+    assert len(db.query_similar("dog", threshold=-1.0, limit=3)) == 3
+    assert len(decoded) == 3
@@ -0,0 +1,111 @@
+# tests/test_shared.py
+"""Cross-process file locking and catch-up in shared mode"""
+
+import fcntl
+import multiprocessing
+import os
+
+import pytest
+
+from rbd.locking import FileLock
+
+
+def test_exclusive_lock_excludes_other_descriptors(tmp_path):
+    path = str(tmp_path / "s.lock")
+    lock = FileLock(path)
+    fd = os.open(path, os.O_RDWR)
+    try:
+        with lock.exclusive():
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        with lock.shared():
+            # Readers share the lock; a writer has to wait
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    finally:
+        os.close(fd)
+        lock.close()
+
+
+def _writer(path, worker, count, log_mode):
+    from rbd.database import ReferenceBaseDB
+    # The parent's batcher thread does not survive the fork
+    db = ReferenceBaseDB(path, log_mode=log_mode, shared=True, embedding_cache=False, embedding_batcher=False)
+    for i in range(count):
+        db.add({"id": f"order-{worker}-{i}", "worker": worker})
+    db.close()
+
+
+@pytest.mark.parametrize("log_mode", [True, False])
+def test_concurrent_processes_lose_no_writes(open_db, store_path, log_mode):
+    # fork keeps the stand-in model installed by the fake_model fixture
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_writer, args=(store_path, worker, 15, log_mode)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    db = open_db(log_mode=log_mode, shared=True)
+    assert len(db.store) == 60
+    assert db.find({"worker": 2}) and len(db.find({"worker": 2})) == 15
+
+
+def test_reader_catches_up_with_another_process(open_db, store_path):
+    reader = open_db(log_mode=True, shared=True)
+    assert reader.get_record_types() == {}
+
+    context = multiprocessing.get_context("fork")
+    process = context.Process(target=_writer, args=(store_path, 0, 5, True))
+    process.start()
+    process.join(60)
+    assert process.exitcode == 0
+
+    # Only the new log frames are applied
+    assert reader.get_record_types() == {"j": 5}
+    assert {record["data"]["id"] for record in reader.get_all_records()} == {f"order-0-{i}" for i in range(5)}
+
+
+def test_reader_reloads_after_another_process_compacts(open_db, store_path):
+    reader = open_db(log_mode=True, shared=True)
+    writer = open_db(log_mode=True, shared=True)
+    refs = writer.add_many([{"data": {"id": f"pet-{i}"}} for i in range(4)])
+    assert len(reader.get_all_records()) == 4
+
+    writer.compact()
+    refs.append(writer.add({"id": "pet-4"}))
+
+    assert sorted(record["ref"] for record in reader.get_all_records()) == sorted(refs)
+
+
+def _dies_mid_append(path):
+    from rbd.database import ReferenceBaseDB
+    db = ReferenceBaseDB(path, log_mode=True, shared=True, embedding_cache=False, embedding_batcher=False)
+    db.add({"id": "order-before"})
+    with db.file_lock.exclusive(), open(path + ".log", "ab") as f:
+        f.write(b'{"ref":"blake2b:0123456789abcdef","record":{"da')
+    # No close, no cleanup: the process is killed mid-write
+    os._exit(0)
+
+
+def test_torn_frame_from_a_dead_writer_does_not_hide_later_writes(open_db, store_path):
+    reader = open_db(log_mode=True, shared=True)
+    writer = open_db(log_mode=True, shared=True)
+    process = multiprocessing.get_context("fork").Process(target=_dies_mid_append, args=(store_path,))
+    process.start()
+    process.join(60)
+    assert process.exitcode == 0
+
+    # A process that was already open appends after the torn frame
+    refs = writer.add_many([{"data": {"id": f"order-after-{i}"}} for i in range(3)])
+    expected = {"order-before"} | {f"order-after-{i}" for i in range(3)}
+    # Live processes catch up past it
+    assert {record["data"]["id"] for record in reader.get_all_records()} == expected
+    assert writer.add({"id": "order-last"}) not in refs
+    assert len(reader.get_all_records()) == 5
+    # And replay from scratch keeps every frame
+    assert {record["data"]["id"] for record in open_db(log_mode=True, shared=True).get_all_records()} == \
+        expected | {"order-last"}
@@ -0,0 +1,46 @@
+# tests/test_timeline.py
+"""Timestamp and type index behind time-range and per-type record lookups"""
+
+import pytest
+
+from rbd import database
+
+
+@pytest.fixture
+def db(open_db, monkeypatch):
+    """A store with one record per second from ts=100: JSON at even, text at odd timestamps."""
+    now = [0]
+    monkeypatch.setattr(database.time, "time", lambda: now[0])
+    db = open_db()
+    for n in range(6):
+        now[0] = 100 + n
+        db.add({"n": n} if n % 2 == 0 else f"note {n}")
+    return db
+
+
+def _timestamps(records):
+    return [record["timestamp"] for record in records]
+
+
+def test_since_is_exclusive_and_until_inclusive(db):
+    assert _timestamps(db.get_records_between(since=101, until=104)) == [104, 103, 102]
+    assert _timestamps(db.get_records_between(since=103, reverse=False)) == [104, 105]
+    assert _timestamps(db.get_records_between(until=101)) == [101, 100]
+    assert db.get_records_between(since=105) == []
+
+
+def test_bounds_combine_with_record_type(db):
+    records = db.get_records_between(since=100, until=105, record_type="j")
+    assert [record["data"] for record in records] == [{"n": 4}, {"n": 2}]
+
+
+def test_listings_are_ordered_by_timestamp(db):
+    assert _timestamps(db.get_all_records()) == [105, 104, 103, 102, 101, 100]
+    assert _timestamps(db.get_records_by_type("t", reverse=False)) == [101, 103, 105]
+    assert db.timeline.type_counts() == {"j": 3, "t": 3}
+
+
+def test_index_is_rebuilt_on_load(db, open_db):
+    db.save()
+    reopened = open_db()
+    assert _timestamps(reopened.get_records_between(since=102, until=104)) == [104, 103]
@@ -0,0 +1,111 @@
+# tests/test_vectors.py
+"""Persisted embeddings: the vector sidecar and backfilling missing vectors"""
+
+import os
+
+from rbd.database import ReferenceBaseDB
+
+
+def test_vectors_survive_reopen(open_db, fake_model):
+    db = open_db()
+    refs = db.add_many([{"data": f"a note about pet {i}"} for i in range(5)])
+    db.close()
+
+    calls = fake_model.calls
+    db = open_db()
+    hits = db._search(db.vectors.take([0])[0], 0.99, None, 0)
+    assert hits[0]["ref"] == refs[0]
+    assert fake_model.calls == calls
+
+
+def test_missing_vectors_are_backfilled_once(open_db, store_path, fake_model, monkeypatch):
+    db = open_db(log_mode=True)
+    db.add_many([{"data": f"a note about pet {i}"} for i in range(5)])
+    legacy = db.add({"id": "pet-9"}, text_hint="hint that was never stored")
+    db.save()
+    db.close()
+    os.remove(store_path + ".vectors.f32")
+
+    db = open_db(log_mode=True)
+    assert len(db.vectors) == 0
+    assert db.query_similar("a note about pet 3", threshold=0.99)[0]["data"] == "a note about pet 3"
+    assert len(db.vectors) == 5
+    assert db._missing_vectors == set()
+
+    # Later queries and adds neither rescan the fingerprints nor re-decode
+    # the record whose text hint is lost
+    decoded = []
+    real_decode = ReferenceBaseDB._decode_data
+    monkeypatch.setattr(db, "_decode_data", lambda s: (decoded.append(s), real_decode(db, s))[1])
+    calls = fake_model.calls
+    db.query_similar("a note about pet 1", threshold=0.99)
+    db.add("another note")
+    assert fake_model.calls == calls + 2
+    assert all("pet-9" not in s for s in decoded)
+    assert legacy in db.store
+
+    # The backfilled vectors were logged and are not embedded again
+    db.close()
+    calls = fake_model.calls
+    reopened = open_db(log_mode=True)
+    assert len(reopened.vectors) == 6
+    reopened.query_similar("another note", threshold=0.99)
+    assert fake_model.calls == calls + 1
+
+
+def test_saves_append_to_the_sidecar(open_db, store_path):
+    db = open_db()
+    db.add("first note about a cat")
+    sidecar = store_path + ".vectors.f32"
+    inode = os.stat(sidecar).st_ino
+    first = open(sidecar, "rb").read()
+
+    db.add("second note about a dog")
+    db.add("third note about a bird")
+    # Earlier rows are never rewritten
+    assert os.stat(sidecar).st_ino == inode
+    data = open(sidecar, "rb").read()
+    assert data.startswith(first)
+    assert len(data) == len(first) + 2 * 4 * db.vectors.dim
+    db.close()
+
+    reopened = open_db()
+    assert len(reopened.vectors) == 3
+    assert reopened.query_similar("third note about a bird", threshold=0.99)[0]["data"] == "third note about a bird"
+
+
+def test_torn_append_is_ignored(open_db, store_path):
+    db = open_db()
+    db.add_many([{"data": f"note {i}"} for i in range(3)])
+    db.close()
+    with open(store_path + ".vectors.f32", "ab") as f:
+        # A row appended before a crash that prevented the snapshot write
+        f.write(b"\0" * 10)
+
+    db = open_db()
+    assert len(db.vectors) == 3
+    db.add("note 3")
+    db.close()
+    assert len(open_db().vectors) == 4
+    assert os.path.getsize(store_path + ".vectors.f32") % 4 == 0
+
+
+def test_legacy_npy_sidecar_is_migrated(open_db, store_path):
+    import numpy as np
+
+    db = open_db()
+    db.add_many([{"data": f"note {i}"} for i in range(3)])
+    matrix = np.array(db.vectors.matrix())
+    db.close()
+    os.remove(store_path + ".vectors.f32")
+    np.save(store_path + ".vectors.npy", matrix)
+
+    db = open_db()
+    assert len(db.vectors) == 3
+    db.add("note 3")
+    assert not os.path.exists(store_path + ".vectors.npy")
+    db.close()
+
+    reopened = open_db()
+    assert np.allclose(reopened.vectors.matrix()[:3], matrix)
+    assert len(reopened.vectors) == 4
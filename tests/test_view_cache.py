@@ -0,0 +1,55 @@
+# tests/test_view_cache.py
+"""The view cache: bounded LRU of formatted records, bypassed by passes over many records"""
+
+from rbd.database import DEFAULT_VIEW_CACHE_SIZE
+
+
+def test_cache_is_bounded_lru(open_db):
+    db = open_db(view_cache=3)
+    refs = db.add_many([{"data": {"id": f"pet-{i}"}} for i in range(5)])
+    db._views.clear()
+
+    for ref in refs[:3]:
+        db.get_record(ref)
+    db.get_record(refs[0])
+    db.get_record(refs[3])
+    # refs[1] was the least recently used
+    assert list(db._views) == [refs[2], refs[0], refs[3]]
+
+
+def test_capacity_options(open_db):
+    assert open_db().view_cache == DEFAULT_VIEW_CACHE_SIZE
+    db = open_db(view_cache=False)
+    ref = db.add({"id": "pet-1"})
+    assert db.get_record(ref)["data"] == {"id": "pet-1"}
+    assert len(db._views) == 0
+
+
+def test_streaming_and_index_builds_bypass_the_cache(open_db):
+    db = open_db(view_cache=100, indexed_fields=["data.kind"])
+    refs = db.add_many([{"data": {"id": f"pet-{i}", "kind": "cat"}} for i in range(20)])
+    db._views.clear()
+    db.get_record(refs[0])
+
+    assert len(list(db.iter_records())) == 20
+    assert list(db._views) == [refs[0]]
+
+    # Reloading rebuilds the field index from every record
+    db.load()
+    assert len(db._views) == 0
+    assert len(db.find({"data.kind": "cat"})) == 20
+
+
+def test_writes_and_replay_do_not_fill_the_cache(open_db):
+    db = open_db(log_mode=True, view_cache=100, indexed_fields=["data.kind"])
+    hot = db.add({"id": "pet-hot", "kind": "dog"})
+    db._views.clear()
+    db.get_record(hot)
+
+    db.add_many([{"data": {"id": f"pet-{i}", "kind": "cat"}} for i in range(20)])
+    assert list(db._views) == [hot]
+    db.close()
+
+    reopened = open_db(log_mode=True, view_cache=100, indexed_fields=["data.kind"])
+    assert len(reopened._views) == 0
+    assert len(reopened.find({"data.kind": "cat"})) == 20
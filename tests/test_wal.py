@@ -0,0 +1,113 @@
+# tests/test_wal.py
+"""Write-ahead log framing, torn-frame recovery and replay into the database"""
+
+import json
+
+from rbd.wal import RECORD_JSON, WriteAheadLog
+
+
+def test_append_and_replay_round_trip(tmp_path):
+    log = WriteAheadLog(str(tmp_path / "s.log"))
+    frames = [{"ref": f"r{i}", "record": {"data": f"t:u:{i}", "ts": i}, "vf": None} for i in range(3)]
+    log.append(frames[0])
+    log.append_many(frames[1:])
+    log.close()
+
+    assert list(WriteAheadLog(log.path).replay()) == frames
+
+
+def test_pre_serialized_record_is_written_verbatim(tmp_path):
+    log = WriteAheadLog(str(tmp_path / "s.log"))
+    record = {"data": "t:u:x", "prev": None, "ts": 1, "type": "t"}
+    log.append({"ref": "r", "record": record, "vf": None, RECORD_JSON: json.dumps(record, sort_keys=True)})
+    log.close()
+
+    assert list(WriteAheadLog(log.path).replay()) == [{"ref": "r", "vf": None, "record": record}]
+
+
+def test_torn_final_frame_is_dropped_and_truncated(tmp_path):
+    path = str(tmp_path / "s.log")
+    log = WriteAheadLog(path)
+    log.append_many([{"ref": "a"}, {"ref": "b"}])
+    log.close()
+    intact = open(path, "rb").read()
+    with open(path, "ab") as f:
+        # A crash in the middle of a write: no newline, not valid JSON
+        f.write(b'{"ref":"c","rec')
+
+    log = WriteAheadLog(path)
+    assert [frame["ref"] for frame in log.replay()] == ["a", "b"]
+    assert open(path, "rb").read() == intact
+
+    # The next append starts on a clean line
+    log.append({"ref": "d"})
+    log.close()
+    assert [frame["ref"] for frame in WriteAheadLog(path).replay()] == ["a", "b", "d"]
+
+
+def test_garbled_complete_line_is_skipped(tmp_path):
+    path = str(tmp_path / "s.log")
+    content = b'{"ref":"a"}\n{"ref":"x","rec{"ref":"y"}\n{"ref":"b"}\n'
+    with open(path, "wb") as f:
+        f.write(content)
+
+    log = WriteAheadLog(path)
+    assert [frame["ref"] for frame in log.replay()] == ["a", "b"]
+    assert open(path, "rb").read() == content
+    frames, offset = log.read_from(0)
+    assert [frame["ref"] for frame in frames] == ["a", "b"] and offset == len(content)
+
+
+def test_append_cuts_a_torn_frame_first(tmp_path):
+    path = str(tmp_path / "s.log")
+    log = WriteAheadLog(path)
+    log.append({"ref": "a"})
+    with open(path, "ab") as f:
+        # Another writer died in the middle of its frame
+        f.write(b'{"ref":"b","record":{"data"')
+
+    log.append({"ref": "c"})
+    log.close()
+    assert open(path, "rb").read() == b'{"ref":"a"}\n{"ref":"c"}\n'
+
+
+def test_read_from_leaves_partial_frame_for_later(tmp_path):
+    path = str(tmp_path / "s.log")
+    with open(path, "wb") as f:
+        f.write(b'{"ref":"a"}\n{"ref":"b"')
+
+    log = WriteAheadLog(path)
+    frames, offset = log.read_from(0)
+    assert [frame["ref"] for frame in frames] == ["a"]
+    assert offset == len(b'{"ref":"a"}\n')
+    # read_from never modifies the file; the writer may still finish the frame
+    with open(path, "ab") as f:
+        f.write(b"}\n")
+    frames, _ = log.read_from(offset)
+    assert [frame["ref"] for frame in frames] == ["b"]
+
+
+def test_database_recovers_from_torn_log(open_db, store_path):
+    db = open_db(log_mode=True)
+    refs = db.add_many([{"data": {"id": f"pet-{i}", "n": i}} for i in range(5)])
+    db.close()
+    with open(store_path + ".log", "ab") as f:
+        f.write(b'{"ref":"sha3:deadbeef","record":{"data"')
+
+    db = open_db(log_mode=True)
+    assert sorted(db.store) == sorted(refs)
+    assert db.get_record(refs[3])["data"] == {"id": "pet-3", "n": 3}
+    # Appends after recovery survive another reopen
+    ref = db.add({"id": "pet-5", "n": 5})
+    db.close()
+    assert ref in open_db(log_mode=True).store
+
+
+def test_save_checkpoints_the_log(open_db, store_path):
+    db = open_db(log_mode=True)
+    refs = db.add_many([{"data": f"note {i}"} for i in range(3)])
+    db.save()
+    assert WriteAheadLog(store_path + ".log").size() == 0
+    db.close()
+
+    assert sorted(open_db(log_mode=True).store) == sorted(refs)
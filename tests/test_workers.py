@@ -0,0 +1,86 @@
+# tests/test_workers.py
+"""Embedding worker processes: chunking, reassembly, stats and failure handling"""
+
+import multiprocessing
+import time
+
+import pytest
+
+from rbd import model_loader, workers
+from rbd.workers import EmbeddingWorkerPool
+
+from conftest import FakeModel
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    """
+    Start EmbeddingWorkerPools whose workers load FakeModel; closed after the test.
+
+    The workers are forked rather than spawned so they inherit the patched
+    model_loader.load_model.
+    """
+    fork = multiprocessing.get_context("fork")
+    monkeypatch.setattr(workers.multiprocessing, "get_context", lambda method=None: fork)
+    monkeypatch.setattr(model_loader, "load_model", lambda n_threads=None, n_batch=512: FakeModel())
+    started = []
+
+    def _start(*args, **kwargs):
+        pool = EmbeddingWorkerPool(*args, **kwargs)
+        started.append(pool)
+        return pool
+
+    yield _start
+    for pool in started:
+        pool.close()
+
+
+def test_chunks_come_back_in_input_order(pools):
+    pool = pools(2, chunk_size=3)
+    texts = [f"pet number {i}" for i in range(10)]
+
+    vectors = pool.embed(texts)
+    assert [vec.tolist() for vec in vectors] == [pytest.approx(FakeModel()._embed(text)) for text in texts]
+    assert pool.embed([]) == []
+
+    stats = pool.stats()
+    assert sum(worker["texts"] for worker in stats) == 10
+    assert sum(worker["chunks"] for worker in stats) == 4
+
+    # A worker that got no chunk may still be reporting in
+    deadline = time.monotonic() + 30
+    while not pool.ready and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool.ready
+
+
+def test_database_embeds_in_the_workers(pools, open_db, fake_model):
+    db = open_db(embedding_workers=pools(2, chunk_size=2))
+    refs = db.add_many([{"data": f"a {colour} cat"} for colour in ("black", "white", "grey")])
+
+    assert [match["ref"] for match in db.query_similar("a white cat", threshold=0.99)] == [refs[1]]
+    # Nothing was embedded in this process
+    assert fake_model.calls == 0
+
+
+def test_requests_fail_when_the_model_cannot_load(pools, monkeypatch):
+    def missing(n_threads=None, n_batch=512):
+        raise FileNotFoundError("no model")
+
+    monkeypatch.setattr(model_loader, "load_model", missing)
+    pool = pools(1)
+
+    with pytest.raises(RuntimeError, match="could not load the model"):
+        pool.submit(["a cat"]).result(timeout=30)
+    with pytest.raises(RuntimeError, match="could not load the model"):
+        pool.submit(["a dog"])
+
+
+def test_requests_fail_when_a_worker_dies(pools):
+    pool = pools(1)
+    pool.embed(["warm up"])
+    pool._processes[0].kill()
+    pool._processes[0].join()
+
+    with pytest.raises(RuntimeError, match="exited"):
+        pool.submit(["a cat"]).result(timeout=30)
@@ -1,15 +1,14 @@
 # view_records_safe.py
 """Safe view of all records in the pet store database"""
 
-from rbd.database import ReferenceBaseDB
-from rbd.query import QueryManager
+from rbd.query import get_default_query_manager
 import json
 
 def view_all_records():
     print("📋 Viewing all records in the pet store database...")
     
-    # Create query manager for unified data access
-    query_manager = QueryManager("data/petstore_rbd.json")
+    # Shared query manager: the store is opened once per run
+    query_manager = get_default_query_manager()
     
     # Get raw records first to inspect structure
     db = query_manager.db  # Access the underlying database for raw data
@@ -47,8 +46,8 @@ def view_records_by_type(record_type: str):
     """View records of a specific type"""
     print(f"📋 Viewing all {record_type} records in the pet store database...")
     
-    # Create query manager for unified data access
-    query_manager = QueryManager("data/petstore_rbd.json")
+    # Shared query manager: the store is opened once per run
+    query_manager = get_default_query_manager()
     
     try:
         records = query_manager.get_records_by_type(record_type)
@@ -72,7 +71,7 @@ if __name__ == "__main__":
     
     # Also show records by type
     print("\n" + "="*50)
-    query_manager = QueryManager("data/petstore_rbd.json")
+    query_manager = get_default_query_manager()
     type_counts = query_manager.get_record_types()
     
     print("\n📊 Records by Type:")
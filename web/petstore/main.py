@@ -1,23 +1,36 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Form, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import RedirectResponse
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
 import uvicorn
 import os
 import json
-from rbd import ReferenceBaseDB
+from rbd import AsyncReferenceBaseDB
+from rbd.indexes import ANY
+
+# Initialize the RBD database; file I/O and embedding run off the event loop
+DB_PATH = "data/petstore_rbd.json"
+db = AsyncReferenceBaseDB(
+    DB_PATH,
+    indexed_fields=("data.first_name", "data.type", "data.status", "data.customer_id")
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await db.close()
 
 # Initialize app
-app = FastAPI(title="Pet Store Manager")
+app = FastAPI(title="Pet Store Manager", lifespan=lifespan)
 
 # Set up templates
 templates = Jinja2Templates(directory="templates")
 
-# Initialize the RBD database
-DB_PATH = "data/petstore_rbd.json"
-db = ReferenceBaseDB(DB_PATH)
+PET_TYPES = ["dog", "cat", "bird", "fish"]
 
 # Models
 class CustomerForm(BaseModel):
@@ -41,11 +54,10 @@ async def home(request: Request):
     return RedirectResponse(url="/customers")
 
 @app.get("/customers")
-async def list_customers(request: Request):
-    # Get all customer records
-    all_records = db.get_all_records()
-    customers = [r["data"] for r in all_records 
-                if isinstance(r["data"], dict) and r["data"].get("first_name") and r["type"] == "j"]
+async def list_customers(request: Request, first_name: Optional[str] = None):
+    # Get customer records from the first_name index
+    records = await db.find({"first_name": first_name if first_name else ANY})
+    customers = [r["data"] for r in records if r["data"].get("first_name")]
     
     return templates.TemplateResponse("customers.html", {
         "request": request,
@@ -68,16 +80,17 @@ async def create_customer(
     }
     
     # Add to database
-    db.add(new_customer, text_hint=f"Customer: {first_name} {last_name}")
+    await db.add(new_customer, text_hint=f"Customer: {first_name} {last_name}", collection="customers")
     
     return RedirectResponse(url="/customers", status_code=303)
 
 @app.get("/pets")
-async def list_pets(request: Request):
-    # Get all pet records
-    all_records = db.get_all_records()
-    pets = [r["data"] for r in all_records 
-           if isinstance(r["data"], dict) and r["data"].get("type") in ["dog", "cat", "bird", "fish"]]
+async def list_pets(request: Request, type: Optional[str] = None, status: Optional[str] = None):
+    # Get pet records from the type/status indexes
+    criteria = {"type": [type] if type in PET_TYPES else PET_TYPES}
+    if status:
+        criteria["status"] = status
+    pets = [r["data"] for r in await db.find(criteria)]
     
     return templates.TemplateResponse("pets.html", {
         "request": request,
@@ -106,16 +119,15 @@ async def create_pet(
     }
     
     # Add to database
-    db.add(new_pet, text_hint=f"Pet: {name}")
+    await db.add(new_pet, text_hint=f"Pet: {name}", collection="pets")
     
     return RedirectResponse(url="/pets", status_code=303)
 
 @app.get("/sales")
-async def list_sales(request: Request):
-    # Get all sale records
-    all_records = db.get_all_records()
-    sales = [r["data"] for r in all_records 
-            if isinstance(r["data"], dict) and r["data"].get("customer_id")]
+async def list_sales(request: Request, customer_id: Optional[str] = None):
+    # Get sale records from the customer_id index
+    records = await db.find({"customer_id": customer_id if customer_id else ANY})
+    sales = [r["data"] for r in records if r["data"].get("customer_id")]
     
     return templates.TemplateResponse("sales.html", {
         "request": request,
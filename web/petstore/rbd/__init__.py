@@ -0,0 +1,25 @@
+# rbd/__init__.py
+"""Reference Base Database (RBD) package"""
+
+import importlib
+
+__all__ = ["ReferenceBaseDB", "AsyncReferenceBaseDB", "DuplicateRecordError"]
+
+# Exported names are imported on first access, so importing a light
+# submodule (e.g. rbd.entities) does not load the database stack
+_EXPORTS = {
+    "ReferenceBaseDB": ".database",
+    "AsyncReferenceBaseDB": ".async_db",
+    "DuplicateRecordError": ".lsh",
+}
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
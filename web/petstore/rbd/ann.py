@@ -0,0 +1,547 @@
+# rbd/ann.py
+"""Approximate nearest-neighbour indexes over a VectorStore"""
+
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
+
+import numpy as np
+
+from .quantization import CODECS, VectorCodec
+
+logger = logging.getLogger(__name__)
+
+
+class ANNIndex(ABC):
+    """
+    Interface for pluggable approximate nearest-neighbour backends.
+
+    An index maps query vectors to candidate row numbers of a VectorStore;
+    exact scoring of the candidates is left to the caller. ``search``
+    returns None while the index cannot answer yet (e.g. untrained), in
+    which case callers fall back to a full scan. ``threshold`` and
+    ``limit`` are hints about the caller's query that backends may use to
+    prune candidates.
+
+    Expensive rebuilds (training) run in a background thread; until a new
+    index is installed by sync(), the previous one keeps answering. The
+    owner sets ``on_built`` to be told when to call sync() again.
+    """
+
+    # Called from the build thread once a rebuilt index is ready; the owner
+    # should call sync() under the lock that guards the vectors
+    on_built: Optional[Callable[[], None]] = None
+
+    @abstractmethod
+    def search(self, query_vec: np.ndarray, nprobe: Optional[int] = None,
+               threshold: Optional[float] = None, limit: int = 0) -> Optional[np.ndarray]:
+        """Candidate rows for ``query_vec``, or None to have the caller scan them all."""
+
+    @abstractmethod
+    def sync(self, vectors):
+        """Bring the index up to date with every row of ``vectors``."""
+
+    @abstractmethod
+    def load(self):
+        """Read the persisted index, if any."""
+
+    @abstractmethod
+    def save(self):
+        """Persist the index."""
+
+    def join(self, timeout: Optional[float] = None):
+        """Wait for a background build (and its on_built call) to finish."""
+
+
+class _Builder:
+    """
+    Runs one index build at a time in a daemon thread.
+
+    The result is kept until taken by the index's sync(); results of builds
+    started before the last reset() are dropped.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._thread: Optional[threading.Thread] = None
+        self._result = None
+        self._generation = 0
+        self._running = False
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        """True from start() until the build has finished (before on_done runs)."""
+        return self._running
+
+    def start(self, build: Callable[[], object], on_done: Optional[Callable[[], None]]):
+        """Run ``build`` in the background, then call ``on_done``."""
+        generation = self._generation
+        self._running = True
+
+        def run():
+            try:
+                result = build()
+            except Exception:
+                logger.exception("Background %s build failed", self.name)
+                self._running = False
+                return
+            with self._lock:
+                self._running = False
+                # A stale result is dropped, but the owner is still told so
+                # it can start a build for the current vectors
+                if generation == self._generation:
+                    self._result = result
+            if on_done is not None:
+                on_done()
+
+        self._thread = threading.Thread(target=run, name=f"rbd-{self.name}-build", daemon=True)
+        self._thread.start()
+
+    def take(self):
+        """The finished build, once (None if there is none)."""
+        with self._lock:
+            result, self._result = self._result, None
+        return result
+
+    def reset(self):
+        """Drop the result of any build in progress."""
+        with self._lock:
+            self._generation += 1
+            self._result = None
+
+    def join(self, timeout: Optional[float] = None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+
+class _PostingLists:
+    """One growable int64 array of row numbers per centroid."""
+
+    def __init__(self, nlist: int):
+        self._arrays = [np.empty(0, dtype=np.int64) for _ in range(nlist)]
+        self._sizes = np.zeros(nlist, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._arrays)
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return self._arrays[i][:self._sizes[i]]
+
+    def extend(self, labels: np.ndarray, start: int):
+        """Append rows ``start, start + 1, ...`` to the lists given by ``labels``."""
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=len(self._arrays))
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        for i in np.flatnonzero(counts):
+            rows = order[bounds[i]:bounds[i + 1]] + start
+            size = self._sizes[i]
+            needed = size + rows.shape[0]
+            if needed > self._arrays[i].shape[0]:
+                grown = np.empty(max(needed, 2 * self._arrays[i].shape[0], 16), dtype=np.int64)
+                grown[:size] = self._arrays[i][:size]
+                self._arrays[i] = grown
+            self._arrays[i][size:needed] = rows
+            self._sizes[i] = needed
+
+    def flatten(self):
+        """(rows, offsets): every list concatenated, with list i at rows[offsets[i]:offsets[i + 1]]."""
+        offsets = np.zeros(len(self._arrays) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(self._sizes)
+        rows = np.concatenate([self[i] for i in range(len(self._arrays))]) if self._arrays else np.zeros(0, np.int64)
+        return rows, offsets
+
+    @classmethod
+    def unflatten(cls, rows: np.ndarray, offsets: np.ndarray) -> "_PostingLists":
+        lists = cls(len(offsets) - 1)
+        lists._arrays = [np.array(rows[offsets[i]:offsets[i + 1]], dtype=np.int64) for i in range(len(offsets) - 1)]
+        lists._sizes = np.diff(offsets).astype(np.int64)
+        return lists
+
+
+class _IVFState:
+    """Centroids and posting lists covering rows [0, count); replaced whole on retraining."""
+
+    def __init__(self, centroids: np.ndarray, lists: _PostingLists, count: int, trained_size: int):
+        self.centroids = centroids
+        self.lists = lists
+        self.count = count
+        self.trained_size = trained_size
+
+    def assign(self, vectors, start: int, stop: int, chunk: int = 16384):
+        """Add rows [start, stop) of ``vectors`` to their nearest centroid's list."""
+        for lo in range(start, stop, chunk):
+            hi = min(lo + chunk, stop)
+            block = np.asarray(vectors.take(np.arange(lo, hi)), dtype=np.float32)
+            self.lists.extend(np.argmax(block @ self.centroids.T, axis=1), lo)
+        self.count = max(self.count, stop)
+
+
+class IVFIndex(ANNIndex):
+    """
+    Inverted-file index: spherical k-means centroids with one posting list each.
+
+    Training starts once ``min_train`` vectors exist, and again whenever
+    the store has grown ``retrain_factor`` times past the size it was
+    trained on. It runs in a background thread on a frozen copy of the
+    vectors: until the first training finishes search() returns None (the
+    caller scans exactly), and during a retrain the old centroids keep
+    answering. Rows added since the last sync are assigned to their
+    nearest centroid. ``nprobe`` trades recall for speed at query time.
+    """
+
+    def __init__(self, path: str, nlist: Optional[int] = None, nprobe: int = 8,
+                 min_train: int = 1024, retrain_factor: float = 4.0,
+                 max_train_sample: int = 65536, n_iter: int = 10, seed: int = 0):
+        """
+        Initialize an untrained IVF index.
+
+        Args:
+            path: Path of the ``.npz`` file the index is persisted to
+            nlist: Number of centroids (default: sqrt of the training size)
+            nprobe: Default number of posting lists scanned per query
+            min_train: Minimum number of vectors before training
+            retrain_factor: Retrain when the store grows by this factor
+            max_train_sample: Maximum number of vectors used for k-means
+            n_iter: Number of k-means iterations
+            seed: Random seed for centroid initialisation and sampling
+        """
+        self.path = path
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.retrain_factor = retrain_factor
+        self.max_train_sample = max_train_sample
+        self.n_iter = n_iter
+        self.seed = seed
+        self._state: Optional[_IVFState] = None
+        self._builder = _Builder("ivf")
+
+    @property
+    def is_trained(self) -> bool:
+        return self._state is not None
+
+    @property
+    def count(self) -> int:
+        """Number of rows assigned to posting lists."""
+        state = self._state
+        return 0 if state is None else state.count
+
+    def _build(self, vectors) -> _IVFState:
+        """Run spherical k-means on (a sample of) the vectors and assign every row."""
+        n = len(vectors)
+        rng = np.random.default_rng(self.seed)
+        nlist = min(self.nlist or max(1, int(np.sqrt(n))), n)
+        if n > self.max_train_sample:
+            sample = vectors.take(np.sort(rng.choice(n, self.max_train_sample, replace=False)))
+        else:
+            sample = vectors.take(np.arange(n))
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+
+        for _ in range(self.n_iter):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1)
+            filled = norms > 0
+            # Empty clusters keep their previous centroid
+            centroids[filled] = sums[filled] / norms[filled, None]
+
+        state = _IVFState(centroids.astype(np.float32), _PostingLists(nlist), 0, n)
+        state.assign(vectors, 0, n)
+        return state
+
+    def train(self, vectors):
+        """
+        Train on every row of ``vectors`` in the calling thread and install the result.
+
+        Args:
+            vectors: VectorStore (or a frozen copy of one)
+        """
+        self._builder.reset()
+        self._state = self._build(vectors)
+
+    def sync(self, vectors):
+        n = len(vectors)
+        if n < self.count:
+            # The store was rolled back behind the index; start over
+            self._state = None
+            self._builder.reset()
+        ready = self._builder.take()
+        if ready is not None and ready.count <= n:
+            self._state = ready
+        state = self._state
+        if n >= self.min_train and (state is None or n >= state.trained_size * self.retrain_factor) \
+                and not self._builder.running:
+            self._builder.start(lambda frozen=vectors.frozen(): self._build(frozen), self.on_built)
+        if state is not None and n > state.count:
+            state.assign(vectors, state.count, n)
+
+    def join(self, timeout: Optional[float] = None):
+        self._builder.join(timeout)
+
+    def search(self, query_vec: np.ndarray, nprobe: Optional[int] = None,
+               threshold: Optional[float] = None, limit: int = 0) -> Optional[np.ndarray]:
+        state = self._state
+        if state is None:
+            return None
+        nlist = len(state.lists)
+        nprobe = min(nprobe or self.nprobe, nlist)
+        centroid_scores = state.centroids @ np.asarray(query_vec, dtype=np.float32)
+        if nprobe < nlist:
+            probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probes = np.arange(nlist)
+        postings = [state.lists[p] for p in probes]
+        return np.concatenate(postings) if postings else np.zeros(0, dtype=np.int64)
+
+    def load(self):
+        self._builder.reset()
+        try:
+            with np.load(self.path) as data:
+                state = _IVFState(data["centroids"], _PostingLists.unflatten(data["rows"], data["offsets"]),
+                                  int(data["count"]), int(data["trained_size"]))
+        except (FileNotFoundError, KeyError, ValueError):
+            return
+        self._state = state
+
+    def save(self):
+        state = self._state
+        if state is None:
+            return
+        rows, offsets = state.lists.flatten()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, centroids=state.centroids, rows=rows, offsets=offsets,
+                     count=state.count, trained_size=state.trained_size)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+class _QuantizedState:
+    """A codec and the codes of rows [0, count); replaced whole on retraining."""
+
+    def __init__(self, codec: VectorCodec, trained_size: int = 0):
+        self.codec = codec
+        self.trained_size = trained_size
+        self._codes: Optional[np.ndarray] = None
+        self.count = 0
+
+    @property
+    def codes(self) -> Optional[np.ndarray]:
+        return None if self._codes is None else self._codes[:self.count]
+
+    def append(self, codes: np.ndarray):
+        needed = self.count + codes.shape[0]
+        if self._codes is None or needed > self._codes.shape[0]:
+            capacity = max(needed, 1024, 2 * (0 if self._codes is None else self._codes.shape[0]))
+            grown = np.empty((capacity,) + codes.shape[1:], dtype=codes.dtype)
+            if self._codes is not None:
+                grown[:self.count] = self._codes[:self.count]
+            self._codes = grown
+        self._codes[self.count:needed] = codes
+        self.count = needed
+
+    def encode(self, vectors, start: int, stop: int, chunk: int):
+        """Append the codes of rows [start, stop) of ``vectors``."""
+        for lo in range(start, stop, chunk):
+            hi = min(lo + chunk, stop)
+            self.append(self.codec.encode(vectors.take(np.arange(lo, hi))))
+
+
+class QuantizedIndex(ANNIndex):
+    """
+    Compressed copy of every vector, scanned in full with approximate scores.
+
+    The codes (float16, int8 + scale, or product-quantized) are what stays
+    in RAM; the float32 rows remain in the memory-mapped VectorStore and
+    are only touched when the caller re-ranks the candidates returned here.
+    Candidates are the rows whose approximate score is within ``margin``
+    of the threshold (at least the best ``rerank`` rows), cut down to the
+    best ``max(rerank, limit * rerank_factor)`` when the caller wants a
+    limited number of results.
+
+    Codecs that need training (pq) are fitted in a background thread on a
+    frozen copy of the vectors, like IVFIndex, and persisted with the
+    codes so reopening does not retrain.
+    """
+
+    def __init__(self, path: str, codec: str = "int8", margin: Optional[float] = None,
+                 rerank: int = 256, rerank_factor: int = 4, min_train: int = 1024,
+                 retrain_factor: float = 4.0, max_train_sample: int = 65536,
+                 chunk_size: int = 4096, **codec_options):
+        """
+        Initialize an empty quantized index.
+
+        Args:
+            path: Path of the ``.npz`` file the index is persisted to
+            codec: Compression scheme (see quantization.CODECS)
+            margin: How far below the threshold approximate scores may fall
+                and still be re-ranked (default depends on the codec)
+            rerank: Minimum number of candidates kept for a limited query
+            rerank_factor: Candidates kept per requested result
+            min_train: Minimum number of vectors before a trained codec
+                (pq) is fitted; until then searches fall back to a full scan
+            retrain_factor: Refit a trained codec when the store grows by
+                this factor
+            max_train_sample: Maximum number of vectors used for training
+            chunk_size: Rows decoded at a time while scanning
+            codec_options: Codec-specific options (e.g. m, ksub for pq)
+        """
+        self.path = path
+        self.codec_kind = codec
+        self.codec_options = codec_options
+        self.margin = margin if margin is not None else {"float16": 0.005, "int8": 0.02}.get(codec, 0.1)
+        self.rerank = rerank
+        self.rerank_factor = rerank_factor
+        self.min_train = min_train
+        self.retrain_factor = retrain_factor
+        self.max_train_sample = max_train_sample
+        self.chunk_size = chunk_size
+        self._state = _QuantizedState(self._new_codec())
+        self._builder = _Builder(codec)
+
+    def _new_codec(self) -> VectorCodec:
+        return CODECS[self.codec_kind](**self.codec_options)
+
+    @property
+    def codec(self) -> VectorCodec:
+        """Codec of the installed codes."""
+        return self._state.codec
+
+    @property
+    def codes(self) -> Optional[np.ndarray]:
+        return self._state.codes
+
+    @property
+    def count(self) -> int:
+        return self._state.count
+
+    def _build(self, vectors) -> _QuantizedState:
+        """Fit a fresh codec to (a sample of) the vectors and encode every row."""
+        n = len(vectors)
+        rng = np.random.default_rng(0)
+        sample_rows = np.arange(n)
+        if n > self.max_train_sample:
+            sample_rows = np.sort(rng.choice(n, self.max_train_sample, replace=False))
+        codec = self._new_codec()
+        codec.train(vectors.take(sample_rows))
+        state = _QuantizedState(codec, trained_size=n)
+        state.encode(vectors, 0, n, self.chunk_size)
+        return state
+
+    def sync(self, vectors):
+        n = len(vectors)
+        if n < self.count:
+            # The store was rolled back behind the index; start over, keeping
+            # the trained codec
+            self._state = _QuantizedState(self._state.codec, trained_size=self._state.trained_size)
+            self._builder.reset()
+        ready = self._builder.take()
+        if ready is not None and ready.count <= n:
+            self._state = ready
+        state = self._state
+        if state.codec.needs_training and n >= self.min_train and not self._builder.running \
+                and (not state.codec.is_trained or n >= state.trained_size * self.retrain_factor):
+            self._builder.start(lambda frozen=vectors.frozen(): self._build(frozen), self.on_built)
+        if state.codec.is_trained and n > state.count:
+            state.encode(vectors, state.count, n, self.chunk_size)
+
+    def join(self, timeout: Optional[float] = None):
+        self._builder.join(timeout)
+
+    def search(self, query_vec: np.ndarray, nprobe: Optional[int] = None,
+               threshold: Optional[float] = None, limit: int = 0) -> Optional[np.ndarray]:
+        state = self._state
+        if state.count == 0 or not state.codec.is_trained:
+            return None
+        q = np.asarray(query_vec, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm == 0:
+            return np.zeros(0, dtype=np.int64)
+        q = q / norm
+
+        codes = state.codes
+        approx = np.concatenate([state.codec.scores(q, codes[lo:lo + self.chunk_size])
+                                 for lo in range(0, state.count, self.chunk_size)])
+        candidates = np.arange(state.count)
+        if threshold is not None:
+            above = np.flatnonzero(approx >= threshold - self.margin)
+            # Few rows near the threshold: take the best `rerank` instead, a
+            # superset that tolerates approximation errors beyond the margin
+            candidates = above if len(above) >= self.rerank else self._best(approx, candidates, self.rerank)
+        if limit:
+            candidates = self._best(approx, candidates, max(self.rerank, limit * self.rerank_factor))
+        return candidates
+
+    @staticmethod
+    def _best(approx: np.ndarray, rows: np.ndarray, k: int) -> np.ndarray:
+        if len(rows) <= k:
+            return rows
+        return rows[np.argpartition(-approx[rows], k - 1)[:k]]
+
+    def load(self):
+        self._builder.reset()
+        try:
+            with np.load(self.path) as data:
+                if str(data["codec"]) != self.codec_kind:
+                    return
+                codec_state = {key[6:]: data[key] for key in data.files if key.startswith("codec_")}
+                codes = data["codes"]
+                trained_size = int(data["trained_size"])
+        except (FileNotFoundError, KeyError, ValueError):
+            return
+        codec = self._new_codec()
+        codec.load_state(codec_state)
+        state = _QuantizedState(codec, trained_size=trained_size)
+        if codes.shape[0]:
+            state.append(codes)
+        self._state = state
+
+    def save(self):
+        state = self._state
+        if state.count == 0:
+            return
+        codec_state = {"codec_" + key: value for key, value in state.codec.state().items()}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, codec=state.codec.kind, codes=state.codes,
+                     trained_size=state.trained_size, **codec_state)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def _quantized(codec: str):
+    return lambda path, **options: QuantizedIndex(path, codec=codec, **options)
+
+
+ANN_BACKENDS = {
+    "ivf": IVFIndex,
+    "float16": _quantized("float16"),
+    "int8": _quantized("int8"),
+    "pq": _quantized("pq"),
+}
+
+
+def create_ann_index(kind: str, path: str, **options) -> ANNIndex:
+    """
+    Instantiate a registered ANN backend.
+
+    Args:
+        kind: Backend name (see ANN_BACKENDS)
+        path: Path the index is persisted to
+        options: Backend-specific options
+
+    Returns:
+        The new, untrained index
+    """
+    try:
+        backend = ANN_BACKENDS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown ANN backend: {kind}")
+    return backend(path, **options)
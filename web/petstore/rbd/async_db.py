@@ -0,0 +1,155 @@
+# rbd/async_db.py
+"""asyncio front end for ReferenceBaseDB"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from .database import ReferenceBaseDB
+
+
+class AsyncReferenceBaseDB:
+    """
+    Awaitable wrapper around a ReferenceBaseDB for async web handlers.
+
+    Nothing blocking runs on the event loop: store reads, writes and file
+    I/O go to an I/O thread pool, and model calls go to a separate
+    embedding pool so a slow embedding never holds up reads. The wrapped
+    database's own locking keeps concurrent calls consistent.
+    """
+
+    def __init__(self, filepath: str, io_workers: int = 4, embed_workers: int = 8, **db_options):
+        """
+        Open the database (synchronously) and start the executors.
+
+        Args:
+            filepath: Path to the JSON snapshot file
+            io_workers: Threads for reads, writes and file I/O
+            embed_workers: Threads waiting on embeddings; concurrent requests
+                are coalesced into shared model calls by the embedding batcher
+            **db_options: Passed on to ReferenceBaseDB
+        """
+        self.db = ReferenceBaseDB(filepath, **db_options)
+        self._io_executor = ThreadPoolExecutor(io_workers, thread_name_prefix="rbd-io")
+        self._embed_executor = ThreadPoolExecutor(embed_workers, thread_name_prefix="rbd-embed")
+
+    async def _run(self, executor: ThreadPoolExecutor, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    def _io(self, func, *args, **kwargs):
+        return self._run(self._io_executor, func, *args, **kwargs)
+
+    def _embed(self, func, *args, **kwargs):
+        return self._run(self._embed_executor, func, *args, **kwargs)
+
+    async def add(self, data, text_hint: str = None, prev: str = None, collection: str = None) -> str:
+        refs = await self.add_many([{"data": data, "text_hint": text_hint, "prev": prev, "collection": collection}])
+        return refs[0]
+
+    async def add_many(self, items: List[Dict[str, Any]]) -> List[str]:
+        """
+        Add a batch of records; see ReferenceBaseDB.add_many.
+
+        Args:
+            items: Dicts with a "data" key and optional "text_hint", "prev"
+                and "collection"
+
+        Returns:
+            Reference hashes of the new records, in input order
+        """
+        frames, texts, text_frames = self.db._prepare_frames(items)
+        vectors = await self._embed(self.db._texts_to_vectors, texts) if texts else []
+        return await self._io(self.db._insert_frames, frames, text_frames, vectors)
+
+    async def query_similar(self, text: str, threshold: float = 0.6,
+                            nprobe: Optional[int] = None, limit: int = 0) -> List[Dict[str, Any]]:
+        """
+        Find records whose text fingerprint is similar to ``text``.
+
+        Args:
+            text: Query text
+            threshold: Minimum cosine similarity
+            nprobe: ANN lists to scan (ignored without an ANN index)
+            limit: Maximum number of results (0 for all)
+
+        Returns:
+            Matches sorted by similarity, highest first
+        """
+        query_vec = await self._embed(self.db._text_to_vector, text)
+        return await self._io(self.db._search, query_vec, threshold, nprobe, limit)
+
+    async def get_record(self, ref_hash: str) -> Optional[Dict[str, Any]]:
+        return await self._io(self.db.get_record, ref_hash)
+
+    async def get_all_records(self, sort_by: str = "timestamp", reverse: bool = True) -> List[Dict]:
+        return await self._io(self.db.get_all_records, sort_by, reverse)
+
+    async def get_records_by_type(self, record_type: str, sort_by: str = "timestamp",
+                                  reverse: bool = True) -> List[Dict]:
+        return await self._io(self.db.get_records_by_type, record_type, sort_by, reverse)
+
+    async def get_records_by_collection(self, collection: str, sort_by: str = "timestamp",
+                                        reverse: bool = True) -> List[Dict]:
+        return await self._io(self.db.get_records_by_collection, collection, sort_by, reverse)
+
+    async def get_records_between(self, since: Optional[int] = None, until: Optional[int] = None,
+                                  record_type: Optional[str] = None, reverse: bool = True) -> List[Dict]:
+        return await self._io(self.db.get_records_between, since, until, record_type, reverse)
+
+    async def get_records_page(self, after: Optional[Tuple[int, str]] = None, limit: int = 100,
+                               record_type: Optional[str] = None, reverse: bool = True,
+                               collection: Optional[str] = None, since: Optional[int] = None,
+                               until: Optional[int] = None) -> List[Dict]:
+        return await self._io(self.db.get_records_page, after, limit, record_type, reverse, collection, since, until)
+
+    async def iter_records(self, record_type: Optional[str] = None, reverse: bool = True,
+                           page_size: int = 500, collection: Optional[str] = None,
+                           since: Optional[int] = None, until: Optional[int] = None) -> AsyncIterator[Dict]:
+        """
+        Yield records in timestamp order, fetching one page at a time off-loop.
+
+        Args:
+            record_type: Restrict to one record type
+            reverse: Whether to yield newest first
+            page_size: Number of records fetched per step
+            collection: Restrict to one collection (instead of a record type)
+            since: Only records with a timestamp strictly after this
+            until: Only records with a timestamp at or before this
+
+        Returns:
+            Async iterator over formatted records
+        """
+        after = None
+        while True:
+            records = await self.get_records_page(after, page_size, record_type, reverse, collection, since, until)
+            if not records:
+                return
+            for record in records:
+                yield record
+            after = (records[-1]["timestamp"], records[-1]["ref"])
+
+    async def find(self, criteria: Dict[str, Any], limit: int = 0,
+                   collection: Optional[str] = None) -> List[Dict]:
+        return await self._io(self.db.find, criteria, limit, collection)
+
+    async def get_chain(self, start_ref: str, limit: int = 0, offset: int = 0) -> List[Any]:
+        return await self._io(self.db.get_chain, start_ref, limit, offset)
+
+    async def get_chain_info(self, ref_hash: str) -> Optional[Dict[str, Any]]:
+        return await self._io(self.db.get_chain_info, ref_hash)
+
+    async def get_record_types(self) -> Dict[str, int]:
+        return await self._io(self.db.get_record_types)
+
+    async def get_collection_counts(self) -> Dict[str, int]:
+        return await self._io(self.db.get_collection_counts)
+
+    async def save(self):
+        await self._io(self.db.save)
+
+    async def close(self):
+        """Close the database and shut the executors down."""
+        await self._io(self.db.close)
+        self._embed_executor.shutdown(wait=True)
+        self._io_executor.shutdown(wait=True)
@@ -0,0 +1,138 @@
+# rbd/batcher.py
+"""Micro-batching of concurrent embedding requests into shared model calls"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+
+from .model_loader import embed_texts
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class EmbeddingBatcher:
+    """
+    Background service that coalesces embedding requests.
+
+    Callers submit lists of texts and wait on the returned future. The
+    batcher thread gathers every request that arrives within ``max_wait``
+    seconds of the first pending one (or until ``max_batch_size`` texts
+    are queued), embeds the distinct texts with as few model calls as
+    ``max_batch_size`` allows and hands each caller its own slice of the
+    result.
+    """
+
+    def __init__(self, embed: Callable[[List[str]], List] = embed_texts,
+                 max_batch_size: int = 64, max_wait: float = 0.005):
+        """
+        Start the batcher thread.
+
+        Args:
+            embed: Embeds a list of texts, returning one vector per text
+            max_batch_size: Run the model early once this many texts are
+                queued; also the most texts passed to one model call
+            max_wait: Longest time a request waits for companions
+        """
+        self._embed = embed
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: List[Tuple[List[str], Future]] = []
+        self._queued_texts = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stats = {"requests": 0, "texts": 0, "batches": 0}
+        self._thread = threading.Thread(target=self._run, name="rbd-embed-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """
+        Queue texts for the next model call.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            Future resolving to a list of float32 vectors, in input order
+        """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EmbeddingBatcher is closed")
+            self._queue.append((list(texts), future))
+            self._queued_texts += len(texts)
+            self._cond.notify_all()
+        return future
+
+    def embed(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed texts, blocking until their batch has run."""
+        if not texts:
+            return []
+        return self.submit(texts).result()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                deadline = time.monotonic() + self.max_wait
+                while self._queued_texts < self.max_batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                group, self._queue = self._queue, []
+                self._queued_texts = 0
+
+            # Concurrent searches often ask for the same text; embed it once
+            distinct = list(dict.fromkeys(text for texts, _ in group for text in texts))
+            chunks = [distinct[i:i + self.max_batch_size] for i in range(0, len(distinct), self.max_batch_size)]
+            try:
+                import numpy as np
+                embedded = {}
+                for chunk in chunks:
+                    vectors = self._embed(chunk)
+                    embedded.update((text, np.asarray(vec, dtype=np.float32)) for text, vec in zip(chunk, vectors))
+            except Exception as e:
+                for _, future in group:
+                    future.set_exception(e)
+                continue
+
+            with self._cond:
+                self._stats["requests"] += len(group)
+                self._stats["texts"] += len(distinct)
+                self._stats["batches"] += len(chunks)
+            for texts, future in group:
+                future.set_result([embedded[text] for text in texts])
+
+    def stats(self) -> dict:
+        """Requests served, distinct texts embedded and model calls made (batches)."""
+        with self._cond:
+            stats = dict(self._stats)
+        stats["mean_batch_size"] = stats["texts"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def close(self):
+        """Run everything still queued and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+
+_default_batcher: Optional[EmbeddingBatcher] = None
+_default_lock = threading.Lock()
+
+
+def get_default_batcher() -> EmbeddingBatcher:
+    """Process-wide batcher in front of the global embedding model."""
+    global _default_batcher
+    with _default_lock:
+        if _default_batcher is None:
+            _default_batcher = EmbeddingBatcher()
+        return _default_batcher
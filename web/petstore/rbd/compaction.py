@@ -0,0 +1,79 @@
+# rbd/compaction.py
+"""Background snapshot compaction for log-mode databases"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Compactor:
+    """
+    Background thread that compacts a log-mode ReferenceBaseDB.
+
+    The thread checks the log every ``check_interval`` seconds and calls
+    ``db.compact()`` once the log holds at least ``min_log_bytes`` and is at
+    least ``ratio`` times the size of the snapshot, or when ``interval``
+    seconds have passed since the last compaction and the log is not
+    empty. Bounding the log bounds how much has to be replayed on restart.
+    """
+
+    def __init__(self, db, min_log_bytes: int = 16 * 1024 * 1024, ratio: float = 1.0,
+                 interval: Optional[float] = None, check_interval: float = 1.0):
+        """
+        Start the compaction thread.
+
+        Args:
+            db: ReferenceBaseDB opened in log mode
+            min_log_bytes: Smallest log worth compacting
+            ratio: Compact once the log is this large relative to the snapshot
+            interval: Also compact a non-empty log this many seconds after
+                the previous compaction (None disables the timer)
+            check_interval: Seconds between trigger checks
+        """
+        if db.log is None:
+            raise ValueError("Compaction requires log_mode")
+        self.db = db
+        self.min_log_bytes = min_log_bytes
+        self.ratio = ratio
+        self.interval = interval
+        self.check_interval = check_interval
+        self._last_run = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rbd-compactor", daemon=True)
+        self._thread.start()
+
+    def should_compact(self) -> bool:
+        """Whether the log has grown enough to compact now."""
+        log_bytes = self.db.log.size()
+        if log_bytes == 0:
+            return False
+        try:
+            snapshot_bytes = os.path.getsize(self.db.filepath)
+        except FileNotFoundError:
+            snapshot_bytes = 0
+        if log_bytes >= self.min_log_bytes and log_bytes >= self.ratio * snapshot_bytes:
+            return True
+        return self.interval is not None and time.monotonic() - self._last_run >= self.interval
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                if self.should_compact():
+                    self.db.compact()
+                    self._last_run = time.monotonic()
+            except Exception:
+                # Keep the thread alive; the log stays authoritative
+                logger.exception("Snapshot compaction failed")
+
+    def stats(self) -> Dict[str, Any]:
+        """Compaction counters of the database (see ReferenceBaseDB.compaction_stats)."""
+        return self.db.compaction_stats()
+
+    def close(self):
+        """Stop the thread, letting a running compaction finish."""
+        self._stop.set()
+        self._thread.join()
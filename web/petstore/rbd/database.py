@@ -1,34 +1,294 @@
 # rbd/database.py
+from __future__ import annotations
+
 import json
 import hashlib
+import heapq
+import os
+import sys
+import threading
 import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
-import numpy as np
-from typing import List, Dict, Any
-from .model_loader import get_embedding_model
+from typing import TYPE_CHECKING, List, Dict, Any, Iterable, Iterator, Optional, Tuple, Union
+from .batcher import EmbeddingBatcher, get_default_batcher
+from .compaction import Compactor
+from .embedding_cache import EmbeddingCache
+from .entities import collection_for_data
+from .indexes import ChainIndex, FieldIndex, TimelineIndex, match_field
+from .model_loader import embed_texts, get_model_id
 from .utils import format_record, sort_records
+from .vectors import VectorStore, pack_array, pack_vector, unpack_array, unpack_vector
+from .locking import FileLock, RWLock
+from .snapshot import (LazyFingerprints, LazyRecordStore, decode_strings, read_header, read_index, read_snapshot,
+                       write_snapshot)
+from .wal import RECORD_JSON, GroupCommitter, WriteAheadLog
+
+# numpy and the ANN, near-duplicate and worker modules are imported when a
+# feature needs them, so opening a store for plain record access stays cheap
+if TYPE_CHECKING:
+    import numpy as np
+    from .ann import ANNIndex
+    from .workers import EmbeddingWorkerPool
+
+
+def _is_ndarray(value) -> bool:
+    # An array can only exist once numpy has been imported
+    ndarray = getattr(sys.modules.get("numpy"), "ndarray", None)
+    return ndarray is not None and isinstance(value, ndarray)
+
+# Ref hash backends: name (also the ref prefix) -> (digest of the canonical
+# record bytes as 16 hex digits, JSON separators of the canonical form).
+# sha3 is what stores written before backends were configurable use; its
+# canonical form keeps json.dumps' default separators so refs stay stable.
+# name -> (digest, separators of the canonical record JSON hashed for a ref).
+# Without separators the ref hashes the compact canonical JSON of the other
+# record fields, a newline and the encoded payload, so the payload is not
+# serialized a second time inside the record.
+HASH_BACKENDS = {
+    "sha3": (lambda data: hashlib.sha3_256(data).hexdigest()[:16], (", ", ": ")),
+    "blake2b": (lambda data: hashlib.blake2b(data, digest_size=8).hexdigest(), None),
+}
+DEFAULT_HASH = "blake2b"
+
+# Number of formatted records kept by the view cache when it is enabled with True
+DEFAULT_VIEW_CACHE_SIZE = 10000
+
+# Canonical payload encoding (part of the hashed record, so never changed)
+_encode_json = json.JSONEncoder(sort_keys=True).encode
+# Record fields other than the payload, for refs of backends without separators
+_encode_fields = json.JSONEncoder(sort_keys=True, separators=(",", ":")).encode
 
 class ReferenceBaseDB:
-    def __init__(self, filepath: str):
+    def __init__(self, filepath: str, log_mode: bool = False, fsync_every: int = 1,
+                 ann_index: Union[str, ANNIndex, None] = None,
+                 embedding_cache: Union[EmbeddingCache, bool] = True,
+                 view_cache: Union[bool, int] = True,
+                 indexed_fields: Iterable[str] = (),
+                 commit_window: Optional[float] = None,
+                 max_commit_batch: int = 1024,
+                 shared: bool = False,
+                 embedding_batcher: Union[EmbeddingBatcher, bool] = True,
+                 embedding_workers: Union[EmbeddingWorkerPool, int] = 0,
+                 dedup: Optional[str] = None,
+                 dedup_radius: float = 0.97,
+                 auto_compact: Union[bool, Dict[str, Any]] = False,
+                 lazy: bool = False,
+                 warm_up_records: int = 0,
+                 hash_algorithm: Optional[str] = None):
+        """
+        Open (or create) a reference base database.
+
+        Args:
+            filepath: Path to the snapshot file (written as JSON lines; older
+                single-document JSON snapshots are still read)
+            log_mode: Append each add to a write-ahead log (``<filepath>.log``)
+                instead of rewriting the whole snapshot
+            fsync_every: In log mode, number of adds between fsync calls
+                (0 leaves syncing to the OS)
+            ann_index: Optional approximate nearest-neighbour index for
+                query_similar, either a backend name ("ivf", or one of the
+                quantized scans "float16", "int8", "pq"; persisted to
+                ``<filepath>.ann.npz``) or an ANNIndex instance. Candidates
+                are always re-ranked against the exact float32 vectors.
+            embedding_cache: EmbeddingCache to consult before calling the
+                model; True uses a private in-memory LRU, False disables caching
+            view_cache: Keep recently read records in memory, decoded and
+                formatted, so repeated reads skip json.loads and formatting.
+                True keeps the DEFAULT_VIEW_CACHE_SIZE most recently used,
+                an int sets that capacity, False (or 0) disables the cache.
+                Streaming reads (iter_records) and index builds bypass it.
+            indexed_fields: JSON payload fields (e.g. "data.customer_id") to
+                maintain value indexes for, used by find()
+            commit_window: Enable group commit: writes are applied in memory
+                at once and persisted by a background committer that waits
+                at most this many seconds to batch concurrent writers into
+                one write and one fsync. None commits inline.
+            max_commit_batch: Number of queued frames that triggers an early
+                group commit
+            shared: Allow several processes to open the same files. Writers
+                take an advisory lock on ``<filepath>.lock`` and every call
+                first applies what other processes have written since (only
+                the new log frames in log mode; a full reload after another
+                process rewrote the snapshot). Best combined with log_mode.
+            embedding_batcher: EmbeddingBatcher that coalesces concurrent
+                embedding requests into shared model calls; True uses the
+                process-wide batcher, False calls the model directly
+            embedding_workers: Embed in worker processes instead of with the
+                in-process model: an EmbeddingWorkerPool, or a number of
+                worker processes to start (and stop on close). With the
+                default batcher setting, a private batcher feeds the pool.
+            dedup: Near-duplicate handling for records with a text
+                fingerprint, using a SimHash index over the embeddings:
+                None disables it, "keep" stores duplicates (see
+                near_duplicates), "reject" raises DuplicateRecordError when
+                a record is a near-duplicate of a stored one or of one
+                earlier in the same batch, and "merge" returns the closest
+                existing ref instead of adding (the rest of the new payload
+                is dropped). Records that set ``prev`` are never merged, so
+                chain links are not lost.
+                The band keys are persisted to ``<filepath>.lsh.keys``.
+            dedup_radius: Minimum cosine similarity for near-duplicates
+            auto_compact: In log mode, run a background Compactor that calls
+                compact() as the log grows; True uses its default triggers,
+                a dict passes Compactor options (min_log_bytes, ratio,
+                interval, check_interval)
+            lazy: Open the snapshot through its offset index
+                (``<filepath>.idx``, kept up to date by every snapshot
+                written in this mode): records are memory-mapped and decoded
+                on first read, and the timeline and chain indexes are built
+                from the index alone, so startup does not parse payloads.
+                The chain index and field indexes are built on first use
+                (or by warm_up()).
+                Legacy snapshots and snapshots without a current index are
+                loaded eagerly until the next save or compaction.
+            warm_up_records: In the background after opening, decode this
+                many of the newest records into the view cache (see warm_up)
+            hash_algorithm: Hash backend for record refs and fingerprints
+                (see HASH_BACKENDS). A store keeps the backend it was
+                created with, recorded in the snapshot header (stores
+                without one are recognised by their ref prefix). None keeps
+                that backend (DEFAULT_HASH for a new store); naming a
+                different one raises ValueError.
+        
+        Reads run concurrently under a shared lock; writes are exclusive.
+        """
         self.filepath = filepath
+        if hash_algorithm is not None and hash_algorithm not in HASH_BACKENDS:
+            raise ValueError(f"Unknown hash algorithm: {hash_algorithm}")
+        self._requested_hash = hash_algorithm
+        self._use_hash(hash_algorithm or DEFAULT_HASH)
         self.store = {}
         self.fingerprints = {}
+        # Reverse of fingerprints: ref -> vf hash
+        self._fingerprint_of: Dict[str, str] = {}
+        self.timeline = TimelineIndex()
+        self.field_index = FieldIndex(indexed_fields)
+        # Indexes a lazy load left to be built on first use ("fields", "chains")
+        self._deferred_indexes = set()
+        # Refs added since a lazy load, for indexes built from a copy of the store
+        self._deferred_backlog: List[str] = []
+        self._deferred_lock = threading.Lock()
+        # Incremented by every load, so builds started before it are dropped
+        self._load_generation = 0
+        self.lazy = lazy
+        self.chains = ChainIndex()
+        self.view_cache = DEFAULT_VIEW_CACHE_SIZE if view_cache is True else int(view_cache)
+        self._views: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Readers share the read lock but reorder the LRU
+        self._views_lock = threading.Lock()
+        self.vectors = VectorStore(filepath + ".vectors.f32", legacy_path=filepath + ".vectors.npy")
+        # Fingerprints still to be embedded by _backfill_vectors (None: not
+        # scanned since the last load); kept up to date by _apply_frame
+        self._missing_vectors: Optional[set] = None
+        if isinstance(ann_index, str):
+            from .ann import create_ann_index
+            ann_index = create_ann_index(ann_index, filepath + ".ann.npz")
+        self.ann = ann_index
+        if self.ann is not None:
+            self.ann.on_built = self._ann_built
+        if dedup not in (None, "keep", "reject", "merge"):
+            raise ValueError(f"Unknown dedup mode: {dedup}")
+        self.dedup = dedup
+        self.lsh = None
+        if dedup:
+            from .lsh import SimHashIndex
+            self.lsh = SimHashIndex(dedup_radius, path=filepath + ".lsh.keys")
+        if embedding_cache is True:
+            embedding_cache = EmbeddingCache(get_model_id())
+        self.embedding_cache = embedding_cache or None
+        # Embedding services created here, closed by close()
+        self._owned_services = []
+        if isinstance(embedding_workers, int):
+            if embedding_workers > 0:
+                from .workers import EmbeddingWorkerPool
+                embedding_workers = EmbeddingWorkerPool(embedding_workers)
+                self._owned_services.append(embedding_workers)
+            else:
+                embedding_workers = None
+        self.embedding_workers = embedding_workers
+        if embedding_batcher is True:
+            if embedding_workers is not None:
+                # One batch is enough to give every worker a full chunk
+                embedding_batcher = EmbeddingBatcher(
+                    embedding_workers.embed, embedding_workers.n_workers * embedding_workers.chunk_size)
+                self._owned_services.insert(0, embedding_batcher)
+            else:
+                embedding_batcher = get_default_batcher()
+        self.embedding_batcher = embedding_batcher or None
+        self._lock = RWLock()
+        self._io_lock = threading.Lock()
+        # Serializes snapshot writers (save and compact)
+        self._compact_lock = threading.Lock()
+        self._compaction_stats = {"compactions": 0, "last_duration": 0.0, "total_duration": 0.0,
+                                  "last_reclaimed_bytes": 0, "total_reclaimed_bytes": 0}
+        self.file_lock = FileLock(filepath + ".lock") if shared else None
+        # What this process has applied: snapshot identity and log offset
+        self._snapshot_stamp = None
+        self._log_offset = 0
+        self.log = None
+        if log_mode:
+            # Group commit syncs once per group instead of every N frames
+            self.log = WriteAheadLog(filepath + ".log", 0 if commit_window is not None else fsync_every)
         self.load()
+        self.committer = None
+        if commit_window is not None:
+            self.committer = GroupCommitter(self._flush_group, commit_window, max_commit_batch)
+        self.compactor = None
+        if auto_compact:
+            self.compactor = Compactor(self, **(auto_compact if isinstance(auto_compact, dict) else {}))
+        if warm_up_records:
+            threading.Thread(target=self.warm_up, args=(warm_up_records,), name="rbd-warm-up", daemon=True).start()
+
+    def _use_hash(self, name: str):
+        digest, separators = HASH_BACKENDS[name]
+        self.hash_algorithm = name
+        self._digest = digest
+        self._canonical = json.JSONEncoder(sort_keys=True, separators=separators).encode if separators else None
+
+    def _resolve_hash(self, recorded: Optional[str]):
+        """Switch to the backend the loaded store was written with; called by _load."""
+        if recorded is None:
+            # Legacy snapshot or log only: go by the prefix of any ref
+            for ref_hash in self.store:
+                prefix = ref_hash.split(":", 1)[0]
+                recorded = prefix if prefix in HASH_BACKENDS else "sha3"
+                break
+        if recorded is None:
+            recorded = self._requested_hash or DEFAULT_HASH
+        elif self._requested_hash is not None and self._requested_hash != recorded:
+            raise ValueError(f"{self.filepath} uses {recorded} refs, not {self._requested_hash}")
+        self._use_hash(recorded)
 
     def _hash(self, content: str) -> str:
-        return "sha3:" + hashlib.sha3_256(content.encode()).hexdigest()[:16]
+        return f"{self.hash_algorithm}:{self._digest(content.encode())}"
 
     def _encode_data(self, data) -> str:
         if isinstance(data, str):
             return f"t:u:{data}"
         elif isinstance(data, (int, float)):
             return f"n:f:{data}"
+        elif _is_ndarray(data) and data.ndim == 1 and data.dtype.kind in "iuf":
+            if data.dtype.kind == "f" and data.dtype.itemsize == 4:
+                # Little-endian float32, base64; decoded with np.frombuffer
+                return f"v:b:{pack_vector(data)}"
+            # Other dtypes keep their own, tagged: v:a:<dtype>:<base64>
+            dtype = data.dtype.newbyteorder("<").str
+            return f"v:a:{dtype}:{pack_array(data, dtype)}"
+        elif isinstance(data, list) and all(type(x) is float for x in data):
+            # Python floats are doubles; float64 round-trips them exactly
+            return f"v:l:<f8:{pack_array(data, '<f8')}"
+        elif isinstance(data, list) and all(type(x) is int and -2 ** 63 <= x < 2 ** 63 for x in data):
+            return f"v:l:<i8:{pack_array(data, '<i8')}"
+        elif isinstance(data, list) and all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in data):
+            # Mixed ints and floats: JSON keeps each element's type
+            return f"v:j:{_encode_json(data)}"
         elif isinstance(data, list):
             vec_str = ",".join(f"{x:.6f}" for x in data)
             return f"v:f:{vec_str}"
         elif isinstance(data, dict):
-            json_str = json.dumps(data, sort_keys=True)
-            return f"j:j:{json_str}"
+            return f"j:j:{_encode_json(data)}"
         else:
             return f"u:u:{str(data)}"
 
@@ -40,7 +300,16 @@ class ReferenceBaseDB:
                 return float(s[4:])
             except ValueError:
                 return s[4:]
+        elif s.startswith("v:b:"):
+            return unpack_vector(s[4:])
+        elif s.startswith("v:l:") or s.startswith("v:a:"):
+            dtype, _, packed = s[4:].partition(":")
+            values = unpack_array(packed, dtype)
+            return values.tolist() if s[2] == "l" else values
+        elif s.startswith("v:j:"):
+            return json.loads(s[4:])
         elif s.startswith("v:f:"):
+            # Text vectors written before the binary encoding
             return [float(x) for x in s[4:].split(",")]
         elif s.startswith("j:j:"):
             return json.loads(s[4:])
@@ -53,84 +322,754 @@ class ReferenceBaseDB:
         return self._hash(f"vf:{vec_str}")
 
     def load(self):
+        with self._lock.write(), self._file_locked(exclusive=False):
+            self._load()
+            self._mark_synced()
+
+    def _load(self):
+        index = read_index(self.filepath) if self.lazy else None
+        self._load_generation += 1
+        self._deferred_backlog = []
+        self._views = OrderedDict()
+        self.field_index.clear()
+        if index is not None:
+            self.store = LazyRecordStore(self.filepath, index)
+            self.fingerprints = LazyFingerprints(index)
+            vector_rows = decode_strings(index["columns"]["vector_rows"])
+            self.timeline.rebuild_from_columns(*self.store.columns())
+            self.chains = ChainIndex()
+            self._deferred_indexes = {"chains", "fields"} if self.field_index.fields else {"chains"}
+        else:
+            try:
+                self.store, self.fingerprints, vector_rows = read_snapshot(self.filepath)
+            except FileNotFoundError:
+                self.store = {}
+                self.fingerprints = {}
+                vector_rows = []
+            self.timeline.rebuild(self.store, self._collection_of)
+            self.chains.rebuild(self.store)
+            self._deferred_indexes = set()
+            self._build_field_index(self.field_index, self.store)
+        # A lazy store keeps the fingerprint of each persisted record in its index
+        self._fingerprint_of = {} if index is not None else {
+            ref_hash: vf_hash for vf_hash, refs in self.fingerprints.items() for ref_hash in refs}
+        self.vectors.load(vector_rows)
+        self._missing_vectors = None
+
+        if self.log is not None:
+            with self._io_lock:
+                # Compaction may have replaced the log file; reopen on next append
+                self.log.close()
+            for frame in self.log.replay():
+                self._apply_frame(frame)
+
+        header = read_header(self.filepath)
+        self._resolve_hash(header.get("hash") if header else None)
+
+        if self.ann is not None:
+            self.ann.load()
+        if self.lsh is not None:
+            self.lsh.load()
+        self._sync_vector_indexes()
+
+    def _build_field_index(self, field_index: FieldIndex, store: Dict[str, Dict]):
+        if field_index.fields:
+            for ref_hash, record in store.items():
+                if record.get("type") == "j":
+                    field_index.add(ref_hash, self._decode_data(record["data"]))
+
+    def _ensure_indexes(self, *names: str):
+        """
+        Build indexes deferred by a lazy load; called without the database lock.
+
+        The indexes are built from a point-in-time copy of the store with no
+        lock held, so readers and writers carry on meanwhile. They are then
+        swapped in under a short write lock, after indexing the records
+        added since the copy was taken.
+        """
+        while self._deferred_indexes.intersection(names):
+            with self._deferred_lock:
+                with self._reading():
+                    wanted = self._deferred_indexes.intersection(names)
+                    if not wanted:
+                        return
+                    store = self.store.copy()
+                    generation, mark = self._load_generation, len(self._deferred_backlog)
+
+                chains = fields = None
+                if "chains" in wanted:
+                    # The offset index has prev and ts for every record without decoding it
+                    chains = ChainIndex()
+                    chains.rebuild(store.headers())
+                if "fields" in wanted:
+                    fields = FieldIndex(self.field_index.fields)
+                    self._build_field_index(fields, store)
+
+                with self._lock.write():
+                    if generation != self._load_generation:
+                        # Reloaded meanwhile; the copy is stale
+                        continue
+                    for ref_hash in self._deferred_backlog[mark:]:
+                        record = self.store[ref_hash]
+                        if chains is not None:
+                            chains.add(ref_hash, record.get("prev"), record.get("ts", 0))
+                        if fields is not None and record.get("type") == "j":
+                            fields.add(ref_hash, self._decode_data(record["data"]))
+                    if chains is not None:
+                        self.chains = chains
+                    if fields is not None:
+                        self.field_index = fields
+                    self._deferred_indexes -= wanted
+                    if not self._deferred_indexes:
+                        self._deferred_backlog = []
+
+    def warm_up(self, count: int = 1000) -> int:
+        """
+        Pre-fetch hot records after a lazy load.
+
+        Builds the indexes a lazy load deferred and decodes the newest
+        records into the view cache, so the first requests do not pay for it.
+
+        Args:
+            count: Number of most recent records to pre-fetch
+
+        Returns:
+            Number of records pre-fetched
+        """
+        self._ensure_indexes("chains", "fields")
+        with self._reading():
+            entries = self.timeline.page(limit=count)
+            for _, ref_hash in entries:
+                self._view(ref_hash)
+        return len(entries)
+
+    def save(self):
+        """Write a full snapshot; in log mode this also checkpoints the log."""
+        with self._compact_lock, self._lock.write(), self._shared_write(), self._io_lock:
+            self._write_snapshot()
+
+    def compact(self) -> Dict[str, Any]:
+        """
+        Fold the log into a new snapshot and drop the frames it covers.
+
+        State is copied under the read lock, so readers are never blocked
+        and writers only while the copy is taken; the snapshot is written
+        to a temporary file and renamed over the old one, then the log is
+        rewritten to hold just the frames appended meanwhile. Replaying a
+        frame already in the snapshot is harmless, so a crash at any point
+        loses nothing. In shared mode other processes must not see the new
+        snapshot with the old log, so writers are paused throughout.
+
+        Returns:
+            Dict with the duration in seconds and the bytes reclaimed
+        """
+        if self.log is None:
+            raise ValueError("compact() requires log_mode; use save()")
+        started = time.perf_counter()
+        with self._compact_lock:
+            before = self._disk_usage()
+            if self.file_lock is not None:
+                with self._lock.write(), self._shared_write(), self._io_lock:
+                    before = self._disk_usage()
+                    self._write_snapshot()
+            else:
+                with self._lock.read():
+                    with self._io_lock:
+                        # Every frame before the cut has been applied in memory
+                        self.log.sync()
+                        cut = self.log.size()
+                    store = self.store.copy() if isinstance(self.store, LazyRecordStore) else dict(self.store)
+                    order = [ref_hash for _, ref_hash in self.timeline.timeline] if self.lazy else None
+                    if isinstance(self.fingerprints, LazyFingerprints):
+                        fingerprints = self.fingerprints.copy()
+                    else:
+                        fingerprints = {vf_hash: list(refs) for vf_hash, refs in self.fingerprints.items()}
+                    count = len(self.vectors)
+                    vector_rows = self.vectors.keys[:count]
+                    # Only the rows added since the last save are copied and appended
+                    unsaved = self.vectors.unsaved_rows() if self.vectors.unsaved else None
+                    if self.ann is not None:
+                        self.ann.save()
+                    if self.lsh is not None:
+                        self.lsh.save()
+                # Vectors first: a newer sidecar is still valid for an older key list
+                if unsaved is not None:
+                    self.vectors.write(*unsaved)
+                index = write_snapshot(self.filepath, store, fingerprints, vector_rows,
+                                       self._collection_of if self.lazy else None, order,
+                                       self._snapshot_meta())
+                with self._lock.write():
+                    if unsaved is not None:
+                        self.vectors.rebase(count)
+                    if self.lazy:
+                        self._adopt_snapshot(index)
+                with self._io_lock:
+                    self.log.discard_prefix(cut)
+            after = self._disk_usage()
+
+        duration = time.perf_counter() - started
+        reclaimed = max(0, before - after)
+        stats = self._compaction_stats
+        stats["compactions"] += 1
+        stats["last_duration"] = duration
+        stats["total_duration"] += duration
+        stats["last_reclaimed_bytes"] = reclaimed
+        stats["total_reclaimed_bytes"] += reclaimed
+        return {"duration": duration, "reclaimed_bytes": reclaimed}
+
+    def compaction_stats(self) -> Dict[str, Any]:
+        """
+        Counters for compactions run so far, plus current file sizes.
+
+        Returns:
+            Dict with compactions, last/total duration (seconds),
+            last/total reclaimed bytes, snapshot_bytes and log_bytes
+        """
+        stats = dict(self._compaction_stats)
         try:
-            with open(self.filepath, 'r') as f:
-                data = json.load(f)
-                self.store = data['store']
-                self.fingerprints = data['fingerprints']
+            stats["snapshot_bytes"] = os.path.getsize(self.filepath)
         except FileNotFoundError:
-            self.store = {}
-            self.fingerprints = {}
+            stats["snapshot_bytes"] = 0
+        stats["log_bytes"] = self.log.size() if self.log is not None else 0
+        return stats
 
-    def save(self):
-        with open(self.filepath, 'w') as f:
-            json.dump({
-                "store": self.store,
-                "fingerprints": self.fingerprints
-            }, f, indent=2)
-
-    def add(self, data, text_hint: str = None, prev: str = None) -> str:
-        encoded_data = self._encode_data(data)
-        record = {
-            "data": encoded_data,
-            "prev": prev,
-            "ts": int(time.time()),
-            "type": encoded_data.split(":")[0]
-        }
-        serialized = json.dumps(record, sort_keys=True)
-        ref_hash = self._hash(serialized)
-        
-        # Semantic fingerprint
-        if isinstance(data, str) or text_hint:
-            text = text_hint or str(data)
-            vec = self._text_to_vector(text)
-            vf_hash = self._vector_to_fingerprint(vec)
-            self.fingerprints.setdefault(vf_hash, []).append(ref_hash)
-
-        self.store[ref_hash] = record
-        self.save()
-        return ref_hash
-
-    def _text_to_vector(self, text: str) -> List[float]:
-        model = get_embedding_model()
-        result = model.create_embedding(text)
-        return result["data"][0]["embedding"]
-
-    def query_similar(self, text: str, threshold: float = 0.6) -> List[Dict[str, Any]]:
-        query_vec = self._text_to_vector(text)
-        query_vec_np = np.array(query_vec)
-        results = []
+    def _disk_usage(self) -> int:
+        """Bytes used by the snapshot and log."""
+        try:
+            size = os.path.getsize(self.filepath)
+        except FileNotFoundError:
+            size = 0
+        return size + (self.log.size() if self.log is not None else 0)
+
+    def refresh(self) -> bool:
+        """
+        Apply writes made by other processes sharing the files.
+
+        Called automatically before every read and write in shared mode.
+
+        Returns:
+            True if anything changed on disk since the last refresh
+        """
+        if self.file_lock is None or not self._files_changed():
+            return False
+        with self._lock.write(), self.file_lock.shared():
+            self._refresh()
+        return True
+
+    def _stat_snapshot(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.filepath)
+        except FileNotFoundError:
+            return None
+        # Snapshots are replaced by rename, so the inode changes on every rewrite
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _mark_synced(self):
+        self._snapshot_stamp = self._stat_snapshot()
+        self._log_offset = self.log.size() if self.log is not None else 0
+
+    def _files_changed(self) -> bool:
+        if self._stat_snapshot() != self._snapshot_stamp:
+            return True
+        return self.log is not None and self.log.size() != self._log_offset
+
+    def _refresh(self) -> bool:
+        """Catch up with the files; called with the write lock and file lock held."""
+        log_size = self.log.size() if self.log is not None else 0
+        if self._stat_snapshot() != self._snapshot_stamp or log_size < self._log_offset:
+            # Another process wrote a snapshot (and checkpointed the log)
+            self._load()
+            self._mark_synced()
+            return True
+        if log_size > self._log_offset:
+            frames, self._log_offset = self.log.read_from(self._log_offset)
+            for frame in frames:
+                self._apply_frame(frame)
+            if frames:
+                self._sync_vector_indexes()
+        return False
+
+    def _file_locked(self, exclusive: bool):
+        if self.file_lock is None:
+            return nullcontext()
+        return self.file_lock.exclusive() if exclusive else self.file_lock.shared()
+
+    @contextmanager
+    def _shared_write(self):
+        """
+        Hold the cross-process writer lock around a write, catching up on
+        other processes first. Called with the write lock held; yields True
+        if the catch-up had to reload everything.
+        """
+        if self.file_lock is None:
+            yield False
+            return
+        with self.file_lock.exclusive():
+            reloaded = self._refresh()
+            yield reloaded
+            self._mark_synced()
+
+    @contextmanager
+    def _reading(self):
+        """Hold the read lock, after applying other processes' writes."""
+        self.refresh()
+        with self._lock.read():
+            yield
+
+    def _write_snapshot(self):
+        # Vectors first: a newer sidecar is still valid for an older key list
+        self.vectors.save()
+        if self.ann is not None:
+            self.ann.save()
+        if self.lsh is not None:
+            self.lsh.save()
+        if self.lazy:
+            # Timeline order, so a lazy load rebuilds the timeline without sorting
+            index = write_snapshot(self.filepath, self.store, self.fingerprints, self.vectors.keys,
+                                   self._collection_of, [ref_hash for _, ref_hash in self.timeline.timeline],
+                                   self._snapshot_meta())
+            self._adopt_snapshot(index)
+        else:
+            write_snapshot(self.filepath, self.store, self.fingerprints, self.vectors.keys,
+                           meta=self._snapshot_meta())
+
+        if self.log is not None:
+            self.log.truncate()
+
+    def _snapshot_meta(self) -> Dict[str, Any]:
+        """Per-store settings recorded in the snapshot header."""
+        return {"hash": self.hash_algorithm}
+
+    def _adopt_snapshot(self, index: Dict[str, Any]):
+        """Serve persisted records from the snapshot just written; called with the write lock held."""
+        if isinstance(self.fingerprints, LazyFingerprints):
+            self.fingerprints.rebase(index)
+        if isinstance(self.store, LazyRecordStore):
+            self.store.rebase(self.filepath, index)
+            self._fingerprint_of = {ref_hash: vf_hash for ref_hash, vf_hash in self._fingerprint_of.items()
+                                    if self.store.fingerprint(ref_hash) != vf_hash}
+            return
+        store = LazyRecordStore(self.filepath, index)
+        for ref_hash, record in self.store.items():
+            if ref_hash not in store:
+                store[ref_hash] = record
+        self.store = store
+
+    def close(self):
+        """Commit queued writes and flush any unsynced log frames to disk."""
+        if self.compactor is not None:
+            self.compactor.close()
+            self.compactor = None
+        if self.committer is not None:
+            self.committer.close()
+            self.committer = None
+        if self.log is not None:
+            with self._io_lock:
+                self.log.close()
+        if self.file_lock is not None:
+            self.file_lock.close()
+        for service in self._owned_services:
+            service.close()
+        self._owned_services = []
+
+    def _apply_frame(self, frame: Dict[str, Any]):
+        vf_hash = frame.get("vf")
+        if vf_hash and "vec" in frame:
+            self.vectors.add(vf_hash, unpack_vector(frame["vec"]))
+            if self._missing_vectors is not None:
+                self._missing_vectors.discard(vf_hash)
+
+        # Vector-only frames carry embeddings backfilled for legacy records
+        ref_hash = frame.get("ref")
+        if ref_hash is None:
+            return
+        if ref_hash not in self.store:
+            self.timeline.add(ref_hash, frame["record"], self._collection_of(ref_hash, frame["record"]))
+            if self._deferred_indexes:
+                self._deferred_backlog.append(ref_hash)
+            if "chains" not in self._deferred_indexes:
+                self.chains.add(ref_hash, frame["record"].get("prev"), frame["record"].get("ts", 0))
+        self.store[ref_hash] = frame["record"]
+        self._views.pop(ref_hash, None)
+        if self.field_index.fields and frame["record"].get("type") == "j":
+            # Decoded directly: ingest and replay must not evict the hot views
+            self.field_index.add(ref_hash, self._decode_data(frame["record"]["data"]))
+        if vf_hash:
+            refs = self.fingerprints.setdefault(vf_hash, [])
+            if ref_hash not in refs:
+                refs.append(ref_hash)
+            self._fingerprint_of[ref_hash] = vf_hash
+            if self._missing_vectors is not None and vf_hash not in self.vectors:
+                self._missing_vectors.add(vf_hash)
+
+    def _sync_vector_indexes(self):
+        """Bring the ANN and near-duplicate indexes up to date with the vectors."""
+        if self.ann is not None:
+            self.ann.sync(self.vectors)
+        if self.lsh is not None:
+            self.lsh.sync(self.vectors)
+
+    def _ann_built(self):
+        """Install an ANN index rebuilt in the background; called from its build thread."""
+        with self._lock.write():
+            if self.ann is not None:
+                self.ann.sync(self.vectors)
+
+    def _commit(self, frames: List[Dict[str, Any]]):
+        """Persist applied frames; called with the write lock held."""
+        if self.committer is not None:
+            return self.committer.submit(frames)
+        if self.log is not None:
+            with self._io_lock:
+                self.log.append_many(frames)
+        else:
+            with self._io_lock:
+                self._write_snapshot()
+        return None
+
+    def _flush_group(self, frames: List[Dict[str, Any]]):
+        if self.log is not None and self.file_lock is None:
+            with self._io_lock:
+                self.log.append_many(frames)
+                self.log.sync()
+            return
+
+        # The snapshot reads every structure, and shared files must be caught
+        # up before appending, so writers are paused
+        with self._lock.write(), self._shared_write() as reloaded, self._io_lock:
+            if reloaded:
+                # A reload from another process's snapshot dropped this group
+                for frame in frames:
+                    self._apply_frame(frame)
+                self._sync_vector_indexes()
+            if self.log is not None:
+                self.log.append_many(frames)
+                self.log.sync()
+            else:
+                self._write_snapshot()
+
+    @staticmethod
+    def _wait(pending):
+        if pending is not None:
+            pending.result()
+
+    def _fingerprint(self, ref_hash: str) -> Optional[str]:
+        """Fingerprint of a record, from the lazy store's index when it was not set since the load."""
+        vf_hash = self._fingerprint_of.get(ref_hash)
+        if vf_hash is None and isinstance(self.store, LazyRecordStore):
+            vf_hash = self.store.fingerprint(ref_hash)
+        return vf_hash
+
+    def _collection_of(self, ref_hash: str, record: Dict[str, Any]) -> Optional[str]:
+        collection = record.get("col")
+        if collection is None and record.get("type") == "j":
+            # Records written before collections existed: derive from the id prefix
+            collection = collection_for_data(self._decode_data(record["data"]))
+        return collection
+
+    def add(self, data, text_hint: str = None, prev: str = None, collection: str = None) -> str:
+        return self.add_many([{"data": data, "text_hint": text_hint, "prev": prev, "collection": collection}])[0]
+
+    def add_many(self, items: List[Dict[str, Any]]) -> List[str]:
+        """
+        Add a batch of records with one embedding call and one commit.
+
+        Args:
+            items: Dicts with a "data" key and optional "text_hint", "prev" and
+                "collection" (derived from the payload's id prefix if omitted)
+
+        Returns:
+            Reference hashes of the new records, in input order
+        """
+        frames, texts, text_frames = self._prepare_frames(items)
+        # Embed outside the lock so readers are not blocked on the model
+        vectors = self._texts_to_vectors(texts) if texts else []
+        return self._insert_frames(frames, text_frames, vectors)
+
+    def _prepare_frames(self, items: List[Dict[str, Any]]):
+        """Encode items into log frames, collecting the texts to embed."""
+        ts = int(time.time())
+        frames = []
+        texts = []
+        text_frames = []
+
+        for item in items:
+            data = item["data"]
+            text_hint = item.get("text_hint")
+            encoded_data = self._encode_data(data)
+            fields = {"prev": item.get("prev"), "ts": ts, "type": encoded_data.split(":")[0]}
+            collection = item.get("collection") or collection_for_data(data)
+            if collection:
+                fields["col"] = collection
+            record = {"data": encoded_data, **fields}
+            if self._canonical is None:
+                # The payload string is hashed as is, not re-encoded inside the record
+                content = _encode_fields(fields).encode() + b"\n" + encoded_data.encode()
+                frame = {"ref": f"{self.hash_algorithm}:{self._digest(content)}", "record": record, "vf": None}
+            else:
+                # Serialized once: hashed for the ref and reused by the log writer
+                serialized = self._canonical(record)
+                frame = {"ref": f"{self.hash_algorithm}:{self._digest(serialized.encode())}",
+                         "record": record, "vf": None}
+                if self.log is not None:
+                    frame[RECORD_JSON] = serialized
+            frames.append(frame)
+
+            # Semantic fingerprint
+            if isinstance(data, str) or text_hint:
+                texts.append(text_hint or str(data))
+                text_frames.append(frame)
+        return frames, texts, text_frames
+
+    def _insert_frames(self, frames: List[Dict[str, Any]], text_frames: List[Dict[str, Any]],
+                       vectors: List[np.ndarray]) -> List[str]:
+        """Attach embeddings to prepared frames, apply and commit them."""
+        if self.lsh is not None:
+            # Legacy records need vectors to be found as duplicates
+            self._backfill_vectors()
+
+        with self._lock.write(), self._shared_write():
+            vec_of = {}
+            for frame, vec in zip(text_frames, vectors):
+                frame["vf"] = self._vector_to_fingerprint(vec)
+                if frame["vf"] not in self.vectors:
+                    frame["vec"] = pack_vector(vec)
+                vec_of[id(frame)] = vec
+
+            if self.dedup == "reject":
+                duplicates = {}
+                positions = [i for i, frame in enumerate(frames) if id(frame) in vec_of]
+                batch_refs = [frames[i]["ref"] for i in positions]
+                for i, ref_hash in zip(positions, batch_refs):
+                    refs = self._near_duplicate_refs(vec_of[id(frames[i])], ref_hash)
+                    if refs:
+                        duplicates[i] = refs
+                # Near-duplicates within the batch are not in the index yet
+                within = self.lsh.batch_duplicates([vec_of[id(frames[i])] for i in positions])
+                for row, earlier in within.items():
+                    refs = [batch_refs[e] for e in earlier if batch_refs[e] != batch_refs[row]]
+                    if refs:
+                        i = positions[row]
+                        duplicates[i] = list(dict.fromkeys(duplicates.get(i, []) + refs))
+                if duplicates:
+                    from .lsh import DuplicateRecordError
+                    raise DuplicateRecordError(duplicates)
+
+            refs = []
+            applied = []
+            for frame in frames:
+                if self.dedup == "merge" and id(frame) in vec_of and frame["record"].get("prev") is None:
+                    # Also catches near-duplicates earlier in the same batch
+                    self.lsh.sync(self.vectors)
+                    duplicate_refs = self._near_duplicate_refs(vec_of[id(frame)], frame["ref"])
+                    if duplicate_refs:
+                        refs.append(duplicate_refs[0])
+                        continue
+                self._apply_frame(frame)
+                applied.append(frame)
+                refs.append(frame["ref"])
+            self._sync_vector_indexes()
+            pending = self._commit(applied) if applied else None
+
+        self._wait(pending)
+        return refs
+
+    def _near_duplicate_refs(self, vec, exclude: Optional[str] = None) -> List[str]:
+        """Refs whose fingerprint vector is within the dedup radius, closest first."""
+        refs = []
+        for row, _ in self.lsh.query(self.vectors, vec):
+            for ref_hash in self.fingerprints.get(self.vectors.keys[row], []):
+                if ref_hash != exclude and ref_hash not in refs:
+                    refs.append(ref_hash)
+        return refs
+
+    def near_duplicates(self, ref_hash: str) -> List[str]:
+        """
+        Find records whose text fingerprint is a near-duplicate of a record's.
 
-        for vf_hash, ref_hashes in self.fingerprints.items():
-            sample_ref = self.store[ref_hashes[0]]
-            decoded = self._decode_data(sample_ref["data"])
-            if isinstance(decoded, str):
-                stored_vec = self._text_to_vector(decoded)
-                stored_vec_np = np.array(stored_vec)
-                dot_product = np.dot(query_vec_np, stored_vec_np)
-                norm_a = np.linalg.norm(query_vec_np)
-                norm_b = np.linalg.norm(stored_vec_np)
-                similarity = dot_product / (norm_a * norm_b) if norm_a > 0 and norm_b > 0 else 0.0
-
-                if similarity >= threshold:
-                    for ref_hash in ref_hashes:
-                        results.append({
-                            "ref": ref_hash,
-                            "similarity": float(similarity),
-                            "data": self._decode_data(self.store[ref_hash]["data"])
-                        })
-
-        results.sort(key=lambda x: x["similarity"], reverse=True)
+        Requires dedup to be enabled.
+
+        Args:
+            ref_hash: Reference hash of the record
+
+        Returns:
+            Refs of near-duplicates (excluding the record itself), closest
+            first; empty if the record has no fingerprint vector
+        """
+        if self.lsh is None:
+            raise ValueError("Near-duplicate detection is disabled (dedup=None)")
+        with self._reading():
+            vf_hash = self._fingerprint(ref_hash)
+            if vf_hash is None or vf_hash not in self.vectors:
+                return []
+            vec = self.vectors.take([self.vectors.rows[vf_hash]])[0]
+            return self._near_duplicate_refs(vec, ref_hash)
+
+    def _text_to_vector(self, text: str) -> np.ndarray:
+        return self._texts_to_vectors([text])[0]
+
+    def _texts_to_vectors(self, texts: List[str]) -> List[np.ndarray]:
+        import numpy as np
+        cache = self.embedding_cache
+        vectors = cache.get_many(texts) if cache is not None else [None] * len(texts)
+
+        # Embed each distinct missing text once
+        missing = list(dict.fromkeys(text for text, vec in zip(texts, vectors) if vec is None))
+        if missing:
+            if self.embedding_batcher is not None:
+                embedded_vectors = self.embedding_batcher.embed(missing)
+            elif self.embedding_workers is not None:
+                embedded_vectors = self.embedding_workers.embed(missing)
+            else:
+                embedded_vectors = embed_texts(missing)
+            embedded = {text: np.asarray(vec, dtype=np.float32) for text, vec in zip(missing, embedded_vectors)}
+            if cache is not None:
+                cache.put_many(missing, [embedded[text] for text in missing])
+            vectors = [embedded[text] if vec is None else vec for text, vec in zip(texts, vectors)]
+        return vectors
+
+    def _backfill_vectors(self):
+        """
+        Embed fingerprints stored before vectors were persisted, once.
+
+        The fingerprints lacking a vector are found with one scan after
+        each load and tracked incrementally from then on, so once they are
+        embedded this returns without touching the store.
+        """
+        missing = self._missing_vectors
+        if missing is not None and not missing:
+            return
+
+        with self._reading():
+            if self._missing_vectors is None:
+                self._missing_vectors = {vf_hash for vf_hash in self.fingerprints if vf_hash not in self.vectors}
+            texts = []
+            text_hashes = []
+            vectorless = []
+            for vf_hash in list(self._missing_vectors):
+                decoded = self._decode_data(self.store[self.fingerprints[vf_hash][0]]["data"])
+                if isinstance(decoded, str):
+                    texts.append(decoded)
+                    text_hashes.append(vf_hash)
+                else:
+                    # The original text hint was never stored, so there is nothing to embed
+                    vectorless.append(vf_hash)
+
+        vectors = self._texts_to_vectors(texts) if texts else []
+
+        with self._lock.write(), self._shared_write():
+            if self._missing_vectors is not None:
+                self._missing_vectors.difference_update(vectorless)
+            frames = []
+            for vf_hash, vec in zip(text_hashes, vectors):
+                if vf_hash not in self.vectors:
+                    frames.append({"vf": vf_hash, "vec": pack_vector(vec)})
+                    self._apply_frame(frames[-1])
+            if not frames:
+                return
+            self._sync_vector_indexes()
+            pending = self._commit(frames)
+        self._wait(pending)
+
+    def query_similar(self, text: str, threshold: float = 0.6,
+                      nprobe: Optional[int] = None, limit: int = 0) -> List[Dict[str, Any]]:
+        """
+        Find records whose text fingerprint is similar to ``text``.
+
+        Args:
+            text: Query text
+            threshold: Minimum cosine similarity
+            nprobe: ANN lists to scan (ignored without an ANN index)
+            limit: Maximum number of results (0 for all)
+
+        Returns:
+            Matches sorted by similarity, highest first
+        """
+        return self._search(self._text_to_vector(text), threshold, nprobe, limit)
+
+    def _search(self, query_vec, threshold: float, nprobe: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        """query_similar for an already embedded query."""
+        self._backfill_vectors()
+
+        with self._reading():
+            return self._query_vector(query_vec, threshold, nprobe, limit)
+
+    def _query_vector(self, query_vec, threshold: float, nprobe: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        import numpy as np
+        rows = self.ann.search(query_vec, nprobe, threshold, limit) if self.ann is not None else None
+        if rows is None:
+            scores = self.vectors.scores(query_vec)
+            rows = np.arange(len(scores))
+        else:
+            scores = self.vectors.scores(query_vec, rows)
+
+        hits = np.flatnonzero(scores >= threshold)
+        # Every fingerprint has at least one ref, so the top `limit` rows suffice
+        if limit > 0 and len(hits) > limit:
+            hits = hits[np.argpartition(-scores[hits], limit - 1)[:limit]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+
+        results = []
+        for i in hits:
+            similarity = float(scores[i])
+            for ref_hash in self.fingerprints.get(self.vectors.keys[rows[i]], []):
+                if limit > 0 and len(results) >= limit:
+                    return results
+                results.append({
+                    "ref": ref_hash,
+                    "similarity": similarity,
+                    "data": self._view(ref_hash)["data"]
+                })
         return results
 
-    def get_chain(self, start_ref: str) -> List[Any]:
-        chain = []
-        current_ref = start_ref
-        while current_ref and current_ref in self.store:
-            record = self.store[current_ref]
-            chain.append(self._decode_data(record["data"]))
-            current_ref = record["prev"]
-        return chain
+    def get_chain(self, start_ref: str, limit: int = 0, offset: int = 0) -> List[Any]:
+        """
+        Follow ``prev`` links from a record back towards the chain root.
+
+        Args:
+            start_ref: Reference to start from (newest end)
+            limit: Maximum number of records to return (0 for all)
+            offset: Number of links to skip first; found via skip pointers
+
+        Returns:
+            Decoded data of each record, starting ``offset`` links back
+        """
+        if offset:
+            self._ensure_indexes("chains")
+        with self._reading():
+            current_ref = self.chains.ancestor(start_ref, offset) if offset else start_ref
+            chain = []
+            while current_ref and current_ref in self.store:
+                if limit and len(chain) >= limit:
+                    break
+                view = self._view(current_ref)
+                chain.append(view["data"])
+                current_ref = view["prev"]
+            return chain
+
+    def get_chain_info(self, ref_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Navigation metadata for the chain containing a record.
+
+        Args:
+            ref_hash: Any record in the chain
+
+        Returns:
+            Dict with the record's ``length`` (records from it back to the
+            root), the chain ``root``, its latest record (``head``) and the
+            ``next`` records that link to it; None if the ref is unknown
+        """
+        self._ensure_indexes("chains")
+        with self._reading():
+            if ref_hash not in self.chains:
+                return None
+            return {
+                "ref": ref_hash,
+                "length": self.chains.depth[ref_hash] + 1,
+                "root": self.chains.root[ref_hash],
+                "head": self.chains.head(ref_hash),
+                "next": list(self.chains.next.get(ref_hash, []))
+            }
 
     def get_all_records(self, sort_by: str = "timestamp", reverse: bool = True) -> List[Dict]:
         """
@@ -143,15 +1082,11 @@ class ReferenceBaseDB:
         Returns:
             List of all records with decoded data
         """
-        records = []
-        
-        for ref_hash, record in self.store.items():
-            decoded_data = self._decode_data(record["data"])
-            formatted_record = format_record(ref_hash, record, decoded_data)
-            records.append(formatted_record)
-        
-        # Sort records using utility function
-        return sort_records(records, sort_by, reverse)
+        with self._reading():
+            records = self._format_entries(self.timeline.entries(), reverse)
+            if sort_by != "timestamp":
+                records = sort_records(records, sort_by, reverse)
+            return records
     
     def get_records_by_type(self, record_type: str, sort_by: str = "timestamp", reverse: bool = True) -> List[Dict]:
         """
@@ -165,13 +1100,221 @@ class ReferenceBaseDB:
         Returns:
             List of records with the specified type
         """
-        records = []
+        with self._reading():
+            records = self._format_entries(self.timeline.entries(record_type=record_type), reverse)
+            if sort_by != "timestamp":
+                records = sort_records(records, sort_by, reverse)
+            return records
+
+    def get_records_by_collection(self, collection: str, sort_by: str = "timestamp", reverse: bool = True) -> List[Dict]:
+        """
+        Retrieve all records of one collection (e.g. "pets") from its partition.
         
-        for ref_hash, record in self.store.items():
-            if record.get("type") == record_type:
-                decoded_data = self._decode_data(record["data"])
-                formatted_record = format_record(ref_hash, record, decoded_data)
-                records.append(formatted_record)
+        Args:
+            collection: Collection name
+            sort_by: Field to sort by (default: "timestamp")
+            reverse: Whether to sort in descending order (newest first)
         
-        # Sort records using utility function
-        return sort_records(records, sort_by, reverse)
\ No newline at end of file
+        Returns:
+            List of records in the collection
+        """
+        with self._reading():
+            records = self._format_entries(self.timeline.entries(collection=collection), reverse)
+            if sort_by != "timestamp":
+                records = sort_records(records, sort_by, reverse)
+            return records
+
+    def get_records_between(self, since: Optional[int] = None, until: Optional[int] = None,
+                            record_type: Optional[str] = None, reverse: bool = True) -> List[Dict]:
+        """
+        Retrieve records in a time range using the timestamp index.
+        
+        Args:
+            since: Only records with a timestamp strictly after this
+            until: Only records with a timestamp at or before this
+            record_type: Restrict to one record type
+            reverse: Whether to return newest first
+        
+        Returns:
+            List of matching records ordered by timestamp
+        """
+        with self._reading():
+            return self._format_entries(self.timeline.entries(since, until, record_type), reverse)
+
+    def get_records_page(self, after: Optional[Tuple[int, str]] = None, limit: int = 100,
+                         record_type: Optional[str] = None, reverse: bool = True,
+                         collection: Optional[str] = None, since: Optional[int] = None,
+                         until: Optional[int] = None) -> List[Dict]:
+        """
+        Retrieve one page of records ordered by (timestamp, ref).
+        
+        Args:
+            after: (timestamp, ref) of the last record of the previous page
+            limit: Maximum number of records in the page
+            record_type: Restrict to one record type
+            reverse: Whether to page newest first
+            collection: Restrict to one collection (instead of a record type)
+            since: Only records with a timestamp strictly after this
+            until: Only records with a timestamp at or before this
+        
+        Returns:
+            List of up to ``limit`` records following the cursor
+        """
+        with self._reading():
+            entries = self.timeline.page(after, limit, reverse, record_type, collection, since, until)
+            return self._format_entries(entries, False)
+
+    def iter_records(self, record_type: Optional[str] = None, reverse: bool = True,
+                     page_size: int = 500, collection: Optional[str] = None,
+                     since: Optional[int] = None, until: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Lazily yield records in timestamp order without materializing the store.
+        
+        Args:
+            record_type: Restrict to one record type
+            reverse: Whether to yield newest first
+            page_size: Number of index entries fetched per step
+            collection: Restrict to one collection (instead of a record type)
+            since: Only records with a timestamp strictly after this
+            until: Only records with a timestamp at or before this
+        
+        Returns:
+            Iterator over formatted records
+        """
+        after = None
+        while True:
+            # Hold the read lock per page, never across a yield
+            with self._reading():
+                entries = self.timeline.page(after, page_size, reverse, record_type, collection, since, until)
+                records = [dict(self._view(ref_hash, cache=False)) for _, ref_hash in entries]
+            if not records:
+                return
+            yield from records
+            after = entries[-1]
+
+    def find(self, criteria: Dict[str, Any], limit: int = 0, collection: Optional[str] = None) -> List[Dict]:
+        """
+        Retrieve records whose JSON payload matches every criterion.
+        
+        Criteria on indexed fields are answered from the field index;
+        any others are checked against the candidates (or, if no criterion
+        is indexed, against every record).
+        
+        Args:
+            criteria: Mapping of payload field to a value, a list of
+                alternative values, or indexes.ANY (field present)
+            limit: Maximum number of records (0 for all)
+            collection: Only consider records in this collection
+        
+        Returns:
+            Matching records, newest first
+        """
+        self._ensure_indexes("fields")
+        with self._reading():
+            indexed = [(field, value) for field, value in criteria.items() if field in self.field_index]
+            unindexed = [(field, value) for field, value in criteria.items() if field not in self.field_index]
+
+            if indexed:
+                candidate_sets = sorted((self.field_index.lookup(field, value) for field, value in indexed), key=len)
+                if collection is not None:
+                    candidate_sets.append(self.timeline.in_collection(collection))
+                    candidate_sets.sort(key=len)
+                refs = set(candidate_sets[0]).intersection(*candidate_sets[1:])
+                entries = self._newest_first(refs, limit)
+            else:
+                # Every record is a candidate; the timeline is already in order
+                entries = self.timeline.newest(collection=collection)
+
+            records = []
+            for _, ref_hash in entries:
+                view = self._view(ref_hash)
+                if all(match_field(view["data"], field, value) for field, value in unindexed):
+                    records.append(dict(view))
+                    if limit and len(records) >= limit:
+                        break
+            return records
+
+    def _newest_first(self, refs: Iterable[str], limit: int = 0) -> Iterator[Tuple[int, str]]:
+        """
+        (timestamp, ref) of each ref, newest first.
+
+        With a limit, only the newest entries are selected (heapq.nlargest)
+        instead of sorting them all; if the caller keeps asking because
+        some were filtered out, the selection widens geometrically.
+
+        Args:
+            refs: Refs to order
+            limit: Number of entries the caller expects to need (0: all)
+        """
+        entries = [(self._timestamp(ref_hash), ref_hash) for ref_hash in refs]
+        size, done = max(limit, 64), 0
+        while done < len(entries):
+            if not limit or size >= len(entries):
+                batch = sorted(entries, reverse=True)
+            else:
+                batch = heapq.nlargest(size, entries)
+            yield from batch[done:]
+            done, size = len(batch), size * 4
+
+    def _timestamp(self, ref_hash: str) -> int:
+        if isinstance(self.store, LazyRecordStore):
+            return self.store.timestamp(ref_hash)
+        return self.store[ref_hash]["ts"]
+
+    def get_record_types(self) -> Dict[str, int]:
+        """Number of records per record type."""
+        with self._reading():
+            return self.timeline.type_counts()
+
+    def get_collection_counts(self) -> Dict[str, int]:
+        """Number of records per collection."""
+        with self._reading():
+            return self.timeline.collection_counts()
+
+    def _format_entries(self, entries, reverse: bool) -> List[Dict]:
+        if reverse:
+            entries = reversed(entries)
+        return [dict(self._view(ref_hash)) for _, ref_hash in entries]
+
+    def _view(self, ref_hash: str, cache: bool = True) -> Dict[str, Any]:
+        """
+        Formatted record for a ref, served from the view cache when possible.
+
+        Args:
+            ref_hash: Reference hash of the record
+            cache: Whether to remember the view and mark it recently used;
+                passes over many records use False so they do not evict
+                the hot ones
+        """
+        with self._views_lock:
+            view = self._views.get(ref_hash)
+            if view is not None and cache:
+                self._views.move_to_end(ref_hash)
+        if view is None:
+            record = self.store[ref_hash]
+            view = format_record(ref_hash, record, self._decode_data(record["data"]))
+            view["collection"] = record.get("col") or collection_for_data(view["data"])
+            if cache and self.view_cache > 0:
+                with self._views_lock:
+                    self._views[ref_hash] = view
+                    while len(self._views) > self.view_cache:
+                        self._views.popitem(last=False)
+        return view
+
+    def get_record(self, ref_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve a single formatted record.
+        
+        The returned dict is a shallow copy; its ``data`` is shared with the
+        view cache and must not be mutated.
+        
+        Args:
+            ref_hash: Reference hash of the record
+        
+        Returns:
+            The formatted record, or None if not found
+        """
+        with self._reading():
+            if ref_hash not in self.store:
+                return None
+            return dict(self._view(ref_hash))
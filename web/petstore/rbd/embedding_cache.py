@@ -0,0 +1,151 @@
+# rbd/embedding_cache.py
+"""Two-tier (in-memory LRU + on-disk) cache of text embeddings"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Cache of embedding vectors keyed by model id + text hash.
+
+    Lookups hit a bounded in-memory LRU first and then, if configured, a
+    SQLite file that survives restarts. Vectors are stored as float32.
+    All methods are thread-safe.
+    """
+
+    def __init__(self, model_id: str, capacity: int = 4096, path: Optional[str] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            model_id: Identifier of the embedding model; part of every key so
+                vectors from different models never mix
+            capacity: Maximum number of vectors kept in memory (0 disables
+                the memory tier)
+            path: Optional SQLite file for the on-disk tier
+        """
+        self.model_id = model_id
+        self.capacity = capacity
+        self.path = path
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB NOT NULL)"
+            )
+            self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode()).hexdigest()
+
+    def _remember(self, key: str, vec: np.ndarray):
+        if self.capacity <= 0:
+            return
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up several texts at once.
+
+        Args:
+            texts: Texts to look up
+
+        Returns:
+            Cached vector for each text, or None on a miss
+        """
+        import numpy as np
+        keys = [self._key(text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        with self._lock:
+            disk_lookups = []
+            for i, key in enumerate(keys):
+                vec = self._memory.get(key)
+                if vec is not None:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    results[i] = vec
+                else:
+                    disk_lookups.append(i)
+
+            if disk_lookups and self._conn is not None:
+                wanted = list({keys[i] for i in disk_lookups})
+                found = {}
+                # Stay well under SQLite's bound-parameter limit
+                for start in range(0, len(wanted), 500):
+                    chunk = wanted[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    for key, blob in self._conn.execute(
+                        f"SELECT key, vec FROM embeddings WHERE key IN ({placeholders})", chunk
+                    ):
+                        found[key] = np.frombuffer(blob, dtype="<f4")
+                for i in disk_lookups:
+                    vec = found.get(keys[i])
+                    if vec is not None:
+                        self._counters["disk_hits"] += 1
+                        self._remember(keys[i], vec)
+                        results[i] = vec
+
+            self._counters["misses"] += sum(1 for vec in results if vec is None)
+        return results
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Look up a single text; see get_many."""
+        return self.get_many([text])[0]
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        """
+        Store vectors for several texts.
+
+        Args:
+            texts: Texts that were embedded
+            vectors: Their embeddings, in the same order
+        """
+        import numpy as np
+        rows = []
+        with self._lock:
+            for text, vec in zip(texts, vectors):
+                key = self._key(text)
+                arr = np.asarray(vec, dtype="<f4")
+                self._remember(key, arr)
+                rows.append((key, arr.tobytes()))
+            if self._conn is not None and rows:
+                self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)", rows)
+                self._conn.commit()
+
+    def put(self, text: str, vec: List[float]):
+        """Store a single vector; see put_many."""
+        self.put_many([text], [vec])
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit/miss counters and current memory-tier size.
+
+        Returns:
+            Dictionary with memory_hits, disk_hits, misses and memory_size
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_size"] = len(self._memory)
+        return stats
+
+    def close(self):
+        """Close the on-disk tier."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,55 @@
+# rbd/entities.py
+"""Mapping of petstore entities to RBD collections"""
+
+from typing import Any, Optional
+
+# ID prefixes produced by petstore.generate_id
+ID_PREFIX_COLLECTIONS = {
+    "pet": "pets",
+    "prod": "products",
+    "cust": "customers",
+    "sale": "sales",
+    "serv": "services",
+}
+
+# Pydantic model class names from petstore.py
+MODEL_COLLECTIONS = {
+    "Pet": "pets",
+    "Product": "products",
+    "Customer": "customers",
+    "Sale": "sales",
+    "Service": "services",
+}
+
+
+def collection_for_model(model: Any) -> Optional[str]:
+    """
+    Get the collection for a Pydantic model class or instance.
+
+    Args:
+        model: Model class or instance (e.g. petstore.Pet)
+
+    Returns:
+        Collection name, or None for unknown models
+    """
+    cls = model if isinstance(model, type) else type(model)
+    return MODEL_COLLECTIONS.get(cls.__name__)
+
+
+def collection_for_data(data: Any) -> Optional[str]:
+    """
+    Derive the collection of a payload from the prefix of its ``id`` field.
+
+    Args:
+        data: Decoded record data
+
+    Returns:
+        Collection name, or None if the payload has no recognised id
+    """
+    if not isinstance(data, dict):
+        return None
+    entity_id = data.get("id")
+    if not isinstance(entity_id, str):
+        return None
+    prefix, sep, _ = entity_id.partition(":")
+    return ID_PREFIX_COLLECTIONS.get(prefix) if sep else None
@@ -0,0 +1,381 @@
+# rbd/indexes.py
+"""In-memory secondary indexes maintained alongside the record store"""
+
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Sorts after every real ref at the same timestamp ("blake2b:...", "sha3:...")
+_MAX_REF = "\uffff"
+
+# Criterion value matching any record that has the field at all
+ANY = object()
+
+
+class TimelineIndex:
+    """
+    Refs kept sorted by (timestamp, ref), overall, per record type and per
+    collection, plus the set of refs in each collection for membership
+    tests.
+
+    Range lookups are a bisect plus a slice, so they cost O(log n + k).
+    Inserts append in O(1) when timestamps arrive in order, which is the
+    normal case for a store stamped with the current time.
+    """
+
+    def __init__(self):
+        self.timeline: List[Tuple[int, str]] = []
+        self.by_type: Dict[str, List[Tuple[int, str]]] = {}
+        self.by_collection: Dict[str, List[Tuple[int, str]]] = {}
+        self.collection_refs: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.timeline)
+
+    @staticmethod
+    def _insert(entries: List[Tuple[int, str]], entry: Tuple[int, str]):
+        if not entries or entries[-1] <= entry:
+            entries.append(entry)
+        else:
+            insort(entries, entry)
+
+    def add(self, ref_hash: str, record: Dict, collection: Optional[str] = None):
+        """
+        Index a record that is not already indexed.
+
+        Args:
+            ref_hash: Reference hash of the record
+            record: Raw stored record
+            collection: Collection the record belongs to, if any
+        """
+        entry = (record.get("ts", 0), ref_hash)
+        self._insert(self.timeline, entry)
+        self._insert(self.by_type.setdefault(record.get("type", "unknown"), []), entry)
+        if collection:
+            self._insert(self.by_collection.setdefault(collection, []), entry)
+            self.collection_refs.setdefault(collection, set()).add(ref_hash)
+
+    def rebuild(self, store: Dict[str, Dict],
+                collection_of: Optional[Callable[[str, Dict], Optional[str]]] = None):
+        """
+        Rebuild every index from scratch.
+
+        Args:
+            store: Mapping of ref hash to raw record
+            collection_of: Function returning the collection of (ref, record)
+        """
+        self.timeline = sorted((record.get("ts", 0), ref_hash) for ref_hash, record in store.items())
+        self.by_type = {}
+        self.by_collection = {}
+        self.collection_refs = {}
+        for entry in self.timeline:
+            record = store[entry[1]]
+            self.by_type.setdefault(record.get("type", "unknown"), []).append(entry)
+            collection = collection_of(entry[1], record) if collection_of else None
+            if collection:
+                self.by_collection.setdefault(collection, []).append(entry)
+                self.collection_refs.setdefault(collection, set()).add(entry[1])
+
+    def rebuild_from_columns(self, refs: List[str], timestamps: List[int], types: List[str],
+                             collections: List[Optional[str]]):
+        """
+        Rebuild every index from parallel lists of record fields.
+
+        The lists must already be in timeline order (a lazy snapshot is
+        written that way), so this is a single pass with no sorting.
+
+        Args:
+            refs: Reference hashes
+            timestamps: Timestamp of each record
+            types: Record type of each record
+            collections: Collection of each record (None if it has none)
+        """
+        self.timeline = list(zip(timestamps, refs))
+        self.by_type = {}
+        self.by_collection = {}
+        for entry, record_type, collection in zip(self.timeline, types, collections):
+            self.by_type.setdefault(record_type, []).append(entry)
+            if collection:
+                self.by_collection.setdefault(collection, []).append(entry)
+        self.collection_refs = {collection: {ref_hash for _, ref_hash in entries}
+                                for collection, entries in self.by_collection.items()}
+
+    def in_collection(self, collection: str) -> Set[str]:
+        """Refs of the records in a collection (shared; do not modify)."""
+        return self.collection_refs.get(collection, set())
+
+    def type_counts(self) -> Dict[str, int]:
+        """Number of indexed records per type."""
+        return {record_type: len(entries) for record_type, entries in self.by_type.items()}
+
+    def collection_counts(self) -> Dict[str, int]:
+        """Number of indexed records per collection."""
+        return {collection: len(entries) for collection, entries in self.by_collection.items()}
+
+    def _partition(self, record_type: Optional[str], collection: Optional[str]) -> List[Tuple[int, str]]:
+        if record_type is not None and collection is not None:
+            raise ValueError("Filter by record type or by collection, not both")
+        if collection is not None:
+            return self.by_collection.get(collection, [])
+        if record_type is not None:
+            return self.by_type.get(record_type, [])
+        return self.timeline
+
+    def entries(self, since: Optional[int] = None, until: Optional[int] = None,
+                record_type: Optional[str] = None, collection: Optional[str] = None) -> List[Tuple[int, str]]:
+        """
+        Select (timestamp, ref) entries in a time range, oldest first.
+
+        Args:
+            since: Only entries with a timestamp strictly after this
+            until: Only entries with a timestamp at or before this
+            record_type: Restrict to one record type
+            collection: Restrict to one collection (instead of a record type)
+
+        Returns:
+            Matching entries in ascending (timestamp, ref) order
+        """
+        entries = self._partition(record_type, collection)
+        lo = 0 if since is None else bisect_right(entries, (since, _MAX_REF))
+        hi = len(entries) if until is None else bisect_left(entries, (until + 1, ""))
+        return entries[lo:hi]
+
+    def newest(self, record_type: Optional[str] = None,
+               collection: Optional[str] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Walk (timestamp, ref) entries newest first without copying them.
+
+        Args:
+            record_type: Restrict to one record type
+            collection: Restrict to one collection (instead of a record type)
+
+        Returns:
+            Iterator in descending (timestamp, ref) order; the index must not
+            change while it is consumed
+        """
+        return reversed(self._partition(record_type, collection))
+
+    def page(self, after: Optional[Tuple[int, str]] = None, limit: int = 0,
+             reverse: bool = True, record_type: Optional[str] = None,
+             collection: Optional[str] = None, since: Optional[int] = None,
+             until: Optional[int] = None) -> List[Tuple[int, str]]:
+        """
+        Keyset pagination over the timeline.
+
+        Args:
+            after: (timestamp, ref) of the last entry of the previous page
+            limit: Maximum number of entries (0 for no limit)
+            reverse: Walk newest first
+            record_type: Restrict to one record type
+            collection: Restrict to one collection (instead of a record type)
+            since: Only entries with a timestamp strictly after this
+            until: Only entries with a timestamp at or before this
+
+        Returns:
+            Entries following the cursor in the requested direction
+        """
+        entries = self._partition(record_type, collection)
+        start = 0 if since is None else bisect_right(entries, (since, _MAX_REF))
+        end = len(entries) if until is None else bisect_left(entries, (until + 1, ""))
+        if reverse:
+            hi = end if after is None else min(end, bisect_left(entries, tuple(after)))
+            lo = max(start, hi - limit) if limit else start
+            return entries[lo:hi][::-1]
+        lo = start if after is None else max(start, bisect_right(entries, tuple(after)))
+        hi = min(end, lo + limit) if limit else end
+        return entries[lo:hi]
+
+
+class FieldIndex:
+    """
+    Value -> refs maps for declared top-level fields of JSON payloads.
+
+    Field names may be given with or without a ``data.`` prefix. Only
+    hashable scalar values (str, int, float, bool, None) are indexed;
+    lists and nested objects are skipped.
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        """
+        Initialize empty indexes.
+
+        Args:
+            fields: Payload field names to index (e.g. "data.customer_id")
+        """
+        self.fields = [self._field_name(field) for field in fields]
+        self.values: Dict[str, Dict[Any, Set[str]]] = {field: {} for field in self.fields}
+
+    @staticmethod
+    def _field_name(field: str) -> str:
+        return field[5:] if field.startswith("data.") else field
+
+    def __contains__(self, field: str) -> bool:
+        return self._field_name(field) in self.values
+
+    def add(self, ref_hash: str, data: Any):
+        """
+        Index a decoded payload.
+
+        Args:
+            ref_hash: Reference hash of the record
+            data: Decoded record data (non-dict payloads are ignored)
+        """
+        if not isinstance(data, dict):
+            return
+        for field in self.fields:
+            if field not in data:
+                continue
+            value = data[field]
+            if value is None or isinstance(value, (str, int, float, bool)):
+                self.values[field].setdefault(value, set()).add(ref_hash)
+
+    def clear(self):
+        """Drop every indexed value."""
+        self.values = {field: {} for field in self.fields}
+
+    def lookup(self, field: str, value: Any) -> Set[str]:
+        """
+        Refs whose payload field matches a value.
+
+        Args:
+            field: Indexed field name
+            value: A scalar, a list/tuple/set of alternatives, or ANY
+
+        Returns:
+            Set of matching refs (shared when a single scalar is looked up;
+            do not mutate)
+        """
+        by_value = self.values[self._field_name(field)]
+        if value is ANY:
+            return set().union(*by_value.values())
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return set().union(*(by_value.get(v, set()) for v in value))
+        return by_value.get(value, set())
+
+
+class ChainIndex:
+    """
+    Navigation metadata for ``prev``-linked record chains.
+
+    For every ref it keeps the depth (0 for a chain root), the root, the
+    forward links to records that point at it, and binary-lifting skip
+    pointers so the Nth ancestor is found in O(log n) hops. Each root also
+    tracks its head: the most recently added record of the chain.
+    """
+
+    def __init__(self):
+        self.depth: Dict[str, int] = {}
+        self.root: Dict[str, str] = {}
+        self.next: Dict[str, List[str]] = {}
+        self.heads: Dict[str, Tuple[int, int, str]] = {}
+        # up[k][ref] is the 2**k-th ancestor of ref
+        self.up: List[Dict[str, str]] = [{}]
+
+    def __contains__(self, ref_hash: str) -> bool:
+        return ref_hash in self.depth
+
+    def add(self, ref_hash: str, prev: Optional[str], ts: int = 0):
+        """
+        Index a record whose ``prev`` (if any) is already indexed.
+
+        A ``prev`` that is not indexed is treated as a dangling link and the
+        record becomes the root of its own chain.
+
+        Args:
+            ref_hash: Reference hash of the record
+            prev: Reference hash of the previous record in the chain
+            ts: Timestamp of the record, used to pick the chain head
+        """
+        if ref_hash in self.depth:
+            return
+        if prev is not None and prev in self.depth:
+            self.depth[ref_hash] = self.depth[prev] + 1
+            self.root[ref_hash] = self.root[prev]
+            self.next.setdefault(prev, []).append(ref_hash)
+            self.up[0][ref_hash] = prev
+            k = 1
+            while True:
+                half = self.up[k - 1].get(ref_hash)
+                ancestor = self.up[k - 1].get(half) if half is not None else None
+                if ancestor is None:
+                    break
+                if k == len(self.up):
+                    self.up.append({})
+                self.up[k][ref_hash] = ancestor
+                k += 1
+        else:
+            self.depth[ref_hash] = 0
+            self.root[ref_hash] = ref_hash
+
+        root = self.root[ref_hash]
+        candidate = (ts, self.depth[ref_hash], ref_hash)
+        if root not in self.heads or candidate > self.heads[root]:
+            self.heads[root] = candidate
+
+    def rebuild(self, store: Dict[str, Dict]):
+        """
+        Rebuild the index, visiting every record after its ``prev``.
+
+        Args:
+            store: Mapping of ref hash to raw record
+        """
+        self.__init__()
+        for ref_hash in store:
+            # Walk back to the first indexed (or missing) ancestor, then add forwards
+            pending = []
+            seen = set()
+            current = ref_hash
+            while current in store and current not in self.depth and current not in seen:
+                pending.append(current)
+                seen.add(current)
+                current = store[current].get("prev")
+            for pending_ref in reversed(pending):
+                record = store[pending_ref]
+                self.add(pending_ref, record.get("prev"), record.get("ts", 0))
+
+    def ancestor(self, ref_hash: str, steps: int) -> Optional[str]:
+        """
+        Jump ``steps`` links back along the chain.
+
+        Args:
+            ref_hash: Starting reference
+            steps: Number of prev links to follow
+
+        Returns:
+            The ancestor's ref, or None if the chain is shorter than that
+        """
+        if ref_hash not in self.depth or steps > self.depth[ref_hash]:
+            return None
+        k = 0
+        while steps and ref_hash is not None:
+            if steps & 1:
+                ref_hash = self.up[k].get(ref_hash)
+            steps >>= 1
+            k += 1
+        return ref_hash
+
+    def head(self, ref_hash: str) -> Optional[str]:
+        """Most recently added record of the chain containing ``ref_hash``."""
+        root = self.root.get(ref_hash)
+        return self.heads[root][2] if root is not None else None
+
+
+def match_field(data: Any, field: str, value: Any) -> bool:
+    """
+    Check a single find() criterion against a decoded payload without an index.
+
+    Args:
+        data: Decoded record data
+        field: Field name (with or without a ``data.`` prefix)
+        value: A scalar, a list/tuple/set of alternatives, or ANY
+
+    Returns:
+        True if the payload satisfies the criterion
+    """
+    field = field[5:] if field.startswith("data.") else field
+    if not isinstance(data, dict) or field not in data:
+        return False
+    if value is ANY:
+        return True
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return data[field] in value
+    return data[field] == value
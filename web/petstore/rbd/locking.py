@@ -0,0 +1,119 @@
+# rbd/locking.py
+"""Thread synchronisation primitives for ReferenceBaseDB"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+class RWLock:
+    """
+    Readers/writer lock with writer preference.
+
+    Any number of readers may hold the lock together; a writer waits for
+    active readers to drain and blocks new readers while it is queued, so
+    a steady read load cannot starve writes. Not reentrant.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        """Hold the lock shared for the duration of the block."""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        """Hold the lock exclusively for the duration of the block."""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class FileLock:
+    """
+    Advisory cross-process lock (``flock``) on a sidecar file.
+
+    Exclusive for writers, shared for readers catching up on other
+    processes' writes. The lock is tied to one file descriptor per
+    instance, so callers must serialise use within a process (the
+    database only takes it while holding its own write lock).
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the lock.
+
+        Args:
+            path: Lock file path (created if missing)
+
+        Raises:
+            NotImplementedError: If the platform has no fcntl.flock
+        """
+        if fcntl is None:
+            raise NotImplementedError("Cross-process locking requires fcntl (POSIX)")
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    @contextmanager
+    def _locked(self, mode):
+        fcntl.flock(self._fd, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def exclusive(self):
+        """Hold the lock exclusively (writers)."""
+        return self._locked(fcntl.LOCK_EX)
+
+    def shared(self):
+        """Hold the lock shared (readers)."""
+        return self._locked(fcntl.LOCK_SH)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,260 @@
+# rbd/lsh.py
+"""SimHash locality-sensitive hashing for near-duplicate embeddings"""
+
+import math
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Key file layout: magic, bands, band bits, hyperplane seed, then one row of
+# ``bands`` little-endian int64 band keys per vector row, back to back
+KEYS_MAGIC = b"RBDLSH01"
+KEYS_HEADER = struct.Struct("<8sIIQ")
+
+
+class DuplicateRecordError(ValueError):
+    """Raised when an add is rejected because near-duplicates exist, stored or earlier in the batch."""
+
+    def __init__(self, duplicates: Dict[int, List[str]]):
+        """
+        Args:
+            duplicates: Position in the batch -> refs of its near-duplicates
+                (stored records, then records earlier in the same batch)
+        """
+        self.duplicates = duplicates
+        self.refs = list(dict.fromkeys(ref for refs in duplicates.values() for ref in refs))
+        super().__init__(f"Near-duplicate of record(s): {', '.join(self.refs)}")
+
+
+class SimHashIndex:
+    """
+    Banded SimHash over the rows of a VectorStore.
+
+    Each vector is hashed to the signs of its projections on random
+    hyperplanes; the bits are split into bands and every band is a bucket
+    key. Two vectors at cosine similarity s agree on a bit with
+    probability 1 - arccos(s) / pi, so the band width is chosen from the
+    radius such that vectors at least that similar share a bucket with
+    probability ``recall``, while dissimilar ones rarely do. Candidates are
+    confirmed with an exact cosine check, so lookups cost O(1) expected.
+
+    The band keys of every row are kept in one int64 array. Buckets are
+    that array argsorted per band (searched with np.searchsorted), plus
+    small dicts for the rows hashed since the last merge. With a ``path``
+    the keys are persisted append-only, so opening a store does not rehash
+    every vector.
+    """
+
+    def __init__(self, radius: float = 0.97, recall: float = 0.99, seed: int = 0,
+                 path: Optional[str] = None):
+        """
+        Initialize an empty index.
+
+        Args:
+            radius: Minimum cosine similarity for two vectors to be near-duplicates
+            recall: Target probability of finding a near-duplicate at the radius
+            seed: Random seed for the hyperplanes
+            path: Optional file the band keys are persisted to
+        """
+        self.radius = radius
+        self.recall = recall
+        self.seed = seed
+        self.path = path
+        # Bits that must agree within a band and number of bands
+        p = 1.0 - math.acos(min(max(radius, -1.0), 1.0)) / math.pi
+        self.band_bits = max(1, min(62, math.ceil(math.log(0.3) / math.log(p)) if p < 1.0 else 62))
+        p_band = p ** self.band_bits
+        self.bands = max(1, math.ceil(math.log(1.0 - recall) / math.log(1.0 - p_band))) if p_band < 1.0 else 1
+        self.planes: Optional[np.ndarray] = None
+        self._weights = (1 << np.arange(self.band_bits, dtype=np.int64))
+        self.clear()
+
+    def _keys(self, matrix: np.ndarray) -> np.ndarray:
+        """Band keys, shape (n, bands)."""
+        bits = (np.asarray(matrix, dtype=np.float32) @ self.planes.T) > 0
+        return bits.reshape(bits.shape[0], self.bands, self.band_bits).astype(np.int64) @ self._weights
+
+    def clear(self):
+        """Forget every indexed row."""
+        self._key_rows = np.zeros((0, self.bands), dtype=np.int64)
+        self.count = 0
+        # Rows [0, _merged) are in the sorted arrays, later ones in buckets
+        self._sorted_keys: List[np.ndarray] = [np.zeros(0, dtype=np.int64)] * self.bands
+        self._sorted_rows: List[np.ndarray] = [np.zeros(0, dtype=np.int64)] * self.bands
+        self._merged = 0
+        self.buckets: List[Dict[int, List[int]]] = [{} for _ in range(self.bands)]
+        # Rows already in the key file; 0 rewrites it
+        self._saved = 0
+        # Keys read by load() are checked against the vectors on the next sync
+        self._unverified = False
+
+    def _append(self, keys: np.ndarray):
+        needed = self.count + keys.shape[0]
+        if needed > self._key_rows.shape[0]:
+            grown = np.empty((max(needed, 1024, 2 * self._key_rows.shape[0]), self.bands), dtype=np.int64)
+            grown[:self.count] = self._key_rows[:self.count]
+            self._key_rows = grown
+        self._key_rows[self.count:needed] = keys
+        self.count = needed
+
+    def _merge(self):
+        """Sort every band's keys, emptying the buckets."""
+        keys = self._key_rows[:self.count]
+        for band in range(self.bands):
+            order = np.argsort(keys[:, band], kind="stable")
+            self._sorted_keys[band] = keys[order, band]
+            self._sorted_rows[band] = order
+        self._merged = self.count
+        self.buckets = [{} for _ in range(self.bands)]
+
+    def _verified(self, vectors) -> bool:
+        """Whether loaded keys match a sample of the vectors' rows."""
+        rng = np.random.default_rng(self.seed)
+        rows = np.unique(np.concatenate(([0, self.count - 1], rng.integers(0, self.count, 8))))
+        return np.array_equal(self._keys(vectors.take(rows)), self._key_rows[rows])
+
+    def _ensure_planes(self, dim: int):
+        if self.planes is None or self.planes.shape[1] != dim:
+            rng = np.random.default_rng(self.seed)
+            self.planes = rng.standard_normal((self.bands * self.band_bits, dim)).astype(np.float32)
+
+    def sync(self, vectors, chunk: int = 16384):
+        """Hash every row of ``vectors`` not yet indexed."""
+        n = len(vectors)
+        if n < self.count:
+            # The store was rolled back behind the index; start over
+            self.clear()
+        if n == 0:
+            return
+        self._ensure_planes(vectors.dim)
+        if self._unverified:
+            self._unverified = False
+            if not self._verified(vectors):
+                self.clear()
+        if n == self.count:
+            return
+        start = self.count
+        for lo in range(start, n, chunk):
+            self._append(self._keys(vectors.take(np.arange(lo, min(lo + chunk, n)))))
+        if n - self._merged > max(1024, self._merged // 8):
+            self._merge()
+            return
+        for offset, row_keys in enumerate(self._key_rows[start:n].tolist()):
+            for band, key in enumerate(row_keys):
+                self.buckets[band].setdefault(key, []).append(start + offset)
+
+    def query(self, vectors, vec) -> List[Tuple[int, float]]:
+        """
+        Rows within the radius of a vector.
+
+        Args:
+            vectors: The VectorStore the index was synced with
+            vec: Query embedding
+
+        Returns:
+            (row, cosine similarity) pairs, most similar first
+        """
+        if self.planes is None or self.count == 0:
+            return []
+        q = np.asarray(vec, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm == 0:
+            return []
+        q = q / norm
+        candidates = set()
+        for band, key in enumerate(self._keys(q[None, :])[0].tolist()):
+            keys = self._sorted_keys[band]
+            lo, hi = np.searchsorted(keys, key, side="left"), np.searchsorted(keys, key, side="right")
+            candidates.update(self._sorted_rows[band][lo:hi].tolist())
+            candidates.update(self.buckets[band].get(key, ()))
+        if not candidates:
+            return []
+        rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        sims = vectors.take(rows) @ q
+        hits = np.flatnonzero(sims >= self.radius)
+        hits = hits[np.argsort(-sims[hits], kind="stable")]
+        return [(int(rows[i]), float(sims[i])) for i in hits]
+
+    def batch_duplicates(self, matrix) -> Dict[int, List[int]]:
+        """
+        Near-duplicates among vectors that are not indexed, e.g. a batch
+        about to be added. Uses the same bands and radius as query().
+
+        Args:
+            matrix: Vectors, one per row
+
+        Returns:
+            Row -> earlier rows within the radius, most similar first (rows
+            without any are left out)
+        """
+        m = np.asarray(matrix, dtype=np.float32)
+        if m.shape[0] < 2:
+            return {}
+        norms = np.linalg.norm(m, axis=1)
+        m = m / np.where(norms == 0, 1.0, norms)[:, None]
+        self._ensure_planes(m.shape[1])
+        earlier: List[set] = [set() for _ in range(m.shape[0])]
+        for band_keys in self._keys(m).T.tolist():
+            seen: Dict[int, List[int]] = {}
+            for row, key in enumerate(band_keys):
+                rows = seen.setdefault(key, [])
+                earlier[row].update(rows)
+                rows.append(row)
+        duplicates = {}
+        for row, candidates in enumerate(earlier):
+            if not candidates or norms[row] == 0:
+                continue
+            rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            sims = m[rows] @ m[row]
+            hits = np.flatnonzero((sims >= self.radius) & (norms[rows] > 0))
+            if len(hits):
+                duplicates[row] = rows[hits[np.argsort(-sims[hits], kind="stable")]].tolist()
+        return duplicates
+
+    def load(self):
+        """Replace the index with the keys persisted at ``path`` (empty if there are none)."""
+        self.clear()
+        if self.path is None:
+            return
+        try:
+            with open(self.path, "rb") as f:
+                magic, bands, band_bits, seed = KEYS_HEADER.unpack(f.read(KEYS_HEADER.size))
+                data = f.read()
+        except (FileNotFoundError, struct.error):
+            return
+        if (magic, bands, band_bits, seed) != (KEYS_MAGIC, self.bands, self.band_bits, self.seed):
+            return
+        # A torn append leaves a partial row at the end; ignore it
+        count = len(data) // (8 * self.bands)
+        if count == 0:
+            return
+        self._append(np.frombuffer(data, dtype="<i8", count=count * self.bands).reshape(count, self.bands))
+        self._saved = count
+        self._unverified = True
+        self._merge()
+
+    def save(self):
+        """Append the keys of rows hashed since the last save to ``path``."""
+        if self.path is None or self.count == self._saved:
+            return
+        if not os.path.exists(self.path):
+            self._saved = 0
+        data = np.ascontiguousarray(self._key_rows[self._saved:self.count], dtype="<i8").tobytes()
+        if self._saved == 0:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(KEYS_HEADER.pack(KEYS_MAGIC, self.bands, self.band_bits, self.seed))
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        else:
+            with open(self.path, "r+b") as f:
+                f.seek(KEYS_HEADER.size + self._saved * 8 * self.bands)
+                f.write(data)
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+        self._saved = self.count
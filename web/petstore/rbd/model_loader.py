@@ -1,79 +1,173 @@
 # rbd/model_loader.py
 import logging
+import threading
+import time
 from pathlib import Path
-from llama_cpp import Llama
+from typing import Any, Dict, List, Optional
 
-# Set up logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+# Embedding model file (under llama.cpp/models)
+MODEL_FILENAME = "nomic-embed-text-v1.5.Q5_K_M.gguf"
+
 # Global model instance
 _model = None
 
+# llama.cpp contexts are not thread-safe; serialise embedding calls
+_model_lock = threading.Lock()
+
+# Serialises loading, so concurrent first requests load the model once
+_load_lock = threading.Lock()
+
+# Lifecycle of the global model, reported by model_status()
+_status = {
+    "state": "not_loaded",  # not_loaded, loading, loaded, warming_up, ready, failed
+    "load_seconds": None,
+    "warmup_seconds": None,
+    "loaded_at": None,
+    "error": None,
+}
+
+def get_model_id() -> str:
+    """Identifier of the embedding model, used to key cached embeddings"""
+    return Path(MODEL_FILENAME).stem
+
+def get_model_path() -> Path:
+    """Location of the GGUF file: llama.cpp/models next to the rbd package"""
+    return Path(__file__).resolve().parent.parent / "llama.cpp" / "models" / MODEL_FILENAME
+
 def get_embedding_model():
+    """
+    Return the global model, loading it on first use.
+
+    Returns:
+        Llama model in embedding mode
+
+    Raises:
+        FileNotFoundError: If the model file is missing
+    """
     global _model
-    
-    # If model already loaded, return it
-    if _model is not None:
-        logger.debug("Model already loaded, returning cached instance")
-        return _model
-    
-    logger.info("=== Starting Model Loading Process ===")
-    
-    # Get the directory of the current file
-    current_file = Path(__file__).resolve()
-    logger.debug(f"Current file location: {current_file}")
-    
-    # Get the project root directory (parent of rbd folder)
-    project_root = current_file.parent.parent
-    logger.debug(f"Project root directory: {project_root}")
-    
-    # Construct model path
-    model_path = project_root / "llama.cpp" / "models" / "nomic-embed-text-v1.5.Q5_K_M.gguf"
-    logger.debug(f"Constructed model path: {model_path}")
-    
-    # Check if path exists
-    logger.debug(f"Model path exists: {model_path.exists()}")
-    logger.debug(f"Model path is file: {model_path.is_file()}")
-    
-    # List contents of parent directories for debugging
-    models_dir = project_root / "llama.cpp" / "models"
-    if models_dir.exists():
-        logger.debug(f"Contents of models directory: {list(models_dir.iterdir())}")
-    
-    codellama_dir = models_dir / "CodeLlama-7B-Instruct-GGUF"
-    if codellama_dir.exists():
-        logger.debug(f"Contents of CodeLlama directory: {list(codellama_dir.iterdir())}")
-    
-    # Check if model file exists
-    if not model_path.exists():
-        error_msg = f"""
-        ❌ Model file not found!
-        Looking for: {model_path}
-        Current working directory: {Path.cwd()}
-        Project root: {project_root}
-        Model directory exists: {model_path.parent.exists()}
-        """
-        logger.error(error_msg)
-        raise FileNotFoundError(error_msg)
-    
-    logger.info(f"✅ Model found at: {model_path}")
-    logger.info("🔄 Initializing Llama model (this may take a moment)...")
-    
+
+    model = _model
+    if model is not None:
+        return model
+
+    with _load_lock:
+        if _model is None:
+            _status.update(state="loading", error=None)
+            started = time.perf_counter()
+            try:
+                _model = load_model()
+            except Exception as e:
+                _status.update(state="failed", error=str(e))
+                raise
+            _status.update(state="loaded", load_seconds=time.perf_counter() - started,
+                           loaded_at=time.time())
+    return _model
+
+def warm_up_model(text: str = "warm-up") -> Dict[str, Any]:
+    """
+    Load the global model if needed and run one embedding through it.
+
+    The first inference pays for allocating llama.cpp buffers and faulting
+    in the memory-mapped weights; doing it at startup keeps that off the
+    first request. Failures are recorded in the status rather than raised.
+
+    Args:
+        text: Text embedded for the warm-up
+
+    Returns:
+        The model status (see model_status)
+    """
     try:
-        # Initialize the model
-        _model = Llama(
-            model_path=str(model_path),
-            embedding=True,
-            verbose=True,  # Set to True to see more loading info
-            n_ctx=2048,
-        )
-        logger.info("✅ Model loaded successfully!")
-        return _model
-        
+        get_embedding_model()
+        _status["state"] = "warming_up"
+        started = time.perf_counter()
+        embed_texts([text])
+        _status.update(state="ready", warmup_seconds=time.perf_counter() - started)
+        logger.info("Embedding model ready (load %.2fs, warm-up %.2fs)",
+                    _status["load_seconds"] or 0.0, _status["warmup_seconds"])
     except Exception as e:
-        logger.error(f"❌ Failed to load model: {e}")
-        raise
\ No newline at end of file
+        _status.update(state="failed", error=str(e))
+        logger.error("Embedding model warm-up failed: %s", e)
+    return model_status()
+
+def model_status() -> Dict[str, Any]:
+    """
+    Load state and timings of the global model.
+
+    Returns:
+        Dict with the model id, ``state`` (not_loaded, loading, loaded,
+        warming_up, ready or failed), ``ready``, ``load_seconds``,
+        ``warmup_seconds``, ``loaded_at`` (epoch seconds) and ``error``
+    """
+    status = dict(_status)
+    status["model"] = get_model_id()
+    status["ready"] = status["state"] == "ready"
+    return status
+
+def load_model(n_threads: Optional[int] = None, n_batch: int = 512, verbose: bool = False):
+    """
+    Load a new instance of the embedding model.
+
+    The GGUF file is memory-mapped, so several processes loading it share
+    the weights through the page cache.
+
+    Args:
+        n_threads: CPU threads used by llama.cpp (None lets it decide)
+        n_batch: Maximum number of tokens evaluated per llama.cpp batch
+        verbose: Let llama.cpp print its loading and timing output
+
+    Returns:
+        Llama model in embedding mode
+
+    Raises:
+        FileNotFoundError: If the model file is missing
+    """
+    model_path = get_model_path()
+    if not model_path.is_file():
+        raise FileNotFoundError(f"Embedding model not found: {model_path} (cwd: {Path.cwd()})")
+
+    # Imported here: loading the llama.cpp library is slow and only needed
+    # by processes that actually embed
+    from llama_cpp import Llama
+
+    logger.info("Loading embedding model from %s", model_path)
+    return Llama(
+        model_path=str(model_path),
+        embedding=True,
+        verbose=verbose,
+        n_ctx=2048,
+        n_threads=n_threads,
+        n_batch=n_batch,
+        use_mmap=True,
+    )
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """
+    Embed several texts with one call to the global model.
+
+    Args:
+        texts: Texts to embed
+
+    Returns:
+        One embedding per text, in input order
+    """
+    model = get_embedding_model()
+    with _model_lock:
+        return embed_with_model(model, texts)
+
+def embed_with_model(model, texts: List[str]) -> List[List[float]]:
+    """
+    Embed several texts with one call to a given model instance.
+
+    Args:
+        model: Llama model in embedding mode
+        texts: Texts to embed
+
+    Returns:
+        One embedding per text, in input order
+    """
+    result = model.create_embedding(texts)
+    ordered = sorted(result["data"], key=lambda item: item.get("index", 0))
+    return [item["embedding"] for item in ordered]
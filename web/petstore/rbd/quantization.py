@@ -0,0 +1,182 @@
+# rbd/quantization.py
+"""Compressed encodings of normalized embeddings for approximate scoring"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class VectorCodec(ABC):
+    """
+    Interface for vector compression schemes.
+
+    A codec turns float32 rows into compact codes (one entry per row along
+    the first axis) and scores a query against codes without decoding them.
+    Scores approximate the inner product; callers re-rank the best
+    candidates against the exact vectors.
+    """
+
+    # Name stored alongside persisted codes
+    kind = ""
+    # Whether train() must run before encode()
+    needs_training = False
+
+    @property
+    def is_trained(self) -> bool:
+        return True
+
+    def train(self, sample: np.ndarray):
+        """Fit codec parameters to a sample of rows."""
+
+    @abstractmethod
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        """Codes for the rows of ``matrix``."""
+
+    @abstractmethod
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate inner products of ``query`` with each encoded row."""
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Arrays needed to restore a trained codec."""
+        return {}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        """Restore parameters saved by state()."""
+
+
+class Float16Codec(VectorCodec):
+    """Half-precision rows: 2 bytes per dimension, near-exact scores."""
+
+    kind = "float16"
+
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        return np.asarray(matrix, dtype=np.float16)
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) @ query
+
+
+class Int8Codec(VectorCodec):
+    """
+    Scalar quantization to int8 with one float32 scale per vector:
+    1 byte per dimension plus 4 bytes per row.
+    """
+
+    kind = "int8"
+
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        matrix = np.asarray(matrix, dtype=np.float32)
+        codes = np.empty(matrix.shape[0], dtype=[("q", np.int8, (matrix.shape[1],)), ("scale", np.float32)])
+        scale = np.abs(matrix).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        codes["q"] = np.rint(matrix / scale[:, None])
+        codes["scale"] = scale
+        return codes
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return (codes["q"].astype(np.float32) @ query) * codes["scale"]
+
+
+class PQCodec(VectorCodec):
+    """
+    Product quantization: each row is split into ``m`` sub-vectors and each
+    sub-vector is replaced by the id of its nearest of ``ksub`` centroids
+    (``m`` bytes per row). Queries are scored by asymmetric distance
+    computation: one lookup table of query/centroid inner products per
+    sub-space, summed over the row's code.
+    """
+
+    kind = "pq"
+    needs_training = True
+
+    def __init__(self, m: Optional[int] = None, ksub: int = 256, n_iter: int = 10,
+                 points_per_centroid: int = 40, seed: int = 0):
+        """
+        Initialize an untrained codec.
+
+        Args:
+            m: Number of sub-spaces (default: dimension / 8)
+            ksub: Centroids per sub-space (at most 256)
+            n_iter: Number of k-means iterations per sub-space
+            points_per_centroid: Training rows used per centroid; larger
+                samples are subsampled
+            seed: Random seed for centroid initialisation and sampling
+        """
+        self.m = m
+        self.ksub = min(ksub, 256)
+        self.n_iter = n_iter
+        self.points_per_centroid = points_per_centroid
+        self.seed = seed
+        # (m, ksub, dsub)
+        self.centroids: Optional[np.ndarray] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def _split(self, matrix: np.ndarray) -> np.ndarray:
+        """View rows as (n, m, dsub), zero-padding the last sub-vector."""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        m, dsub = self.centroids.shape[0], self.centroids.shape[2]
+        if matrix.shape[-1] < m * dsub:
+            pad = [(0, 0)] * (matrix.ndim - 1) + [(0, m * dsub - matrix.shape[-1])]
+            matrix = np.pad(matrix, pad)
+        return matrix.reshape(matrix.shape[:-1] + (m, dsub))
+
+    def train(self, sample: np.ndarray):
+        rng = np.random.default_rng(self.seed)
+        sample = np.asarray(sample, dtype=np.float32)
+        if sample.shape[0] > self.ksub * self.points_per_centroid:
+            sample = sample[rng.choice(sample.shape[0], self.ksub * self.points_per_centroid, replace=False)]
+        n, dim = sample.shape
+        m = self.m or max(1, dim // 8)
+        dsub = -(-dim // m)
+        ksub = min(self.ksub, n)
+
+        self.centroids = np.zeros((m, ksub, dsub), dtype=np.float32)
+        subs = self._split(sample)
+        for j in range(m):
+            x = subs[:, j, :]
+            centroids = x[rng.choice(n, ksub, replace=False)].copy()
+            for _ in range(self.n_iter):
+                labels = self._nearest(x, centroids)
+                counts = np.bincount(labels, minlength=ksub)
+                sums = np.stack([np.bincount(labels, weights=x[:, k], minlength=ksub)
+                                 for k in range(dsub)], axis=1)
+                filled = counts > 0
+                # Empty clusters keep their previous centroid
+                centroids[filled] = sums[filled] / counts[filled, None]
+            self.centroids[j] = centroids
+
+    @staticmethod
+    def _nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # argmin ||x - c||^2 == argmax 2 x.c - ||c||^2, computed in place
+        scores = x @ (2.0 * centroids).T
+        scores -= (centroids * centroids).sum(axis=1)
+        return np.argmax(scores, axis=1)
+
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        subs = self._split(matrix)
+        codes = np.empty(subs.shape[:2], dtype=np.uint8)
+        for j in range(subs.shape[1]):
+            codes[:, j] = self._nearest(subs[:, j, :], self.centroids[j])
+        return codes
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        # table[j, c] = <query sub-vector j, centroid c of sub-space j>
+        table = np.einsum("jcd,jd->jc", self.centroids, self._split(query))
+        return table[np.arange(table.shape[0]), codes].sum(axis=1)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"centroids": self.centroids}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        self.centroids = state["centroids"]
+
+
+CODECS = {
+    "float16": Float16Codec,
+    "int8": Int8Codec,
+    "pq": PQCodec,
+}
@@ -1,4 +1,5 @@
 # queries.py
+import json
 from datetime import datetime
 
 def get_all_records(db):
@@ -23,11 +24,11 @@ def get_all_records(db):
 
 def get_records_by_type(db, record_type: str):
     """Get all records of a specific type"""
-    return [r for r in get_all_records(db) if r["type"] == record_type]
+    return db.get_records_by_type(record_type)
 
 def get_records_after(db, timestamp: int):
     """Get all records after a specific timestamp"""
-    return [r for r in get_all_records(db) if r["timestamp"] > timestamp]
+    return db.get_records_between(since=timestamp)
 
 def print_all_records(db):
     """Print all records in a readable format"""
@@ -1,21 +1,46 @@
 # petstore/rbd/query.py
 """Unified query module for database operations"""
 
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from .database import ReferenceBaseDB
-from .utils import format_record, sort_records
+
+def encode_cursor(timestamp: int, ref_hash: str) -> str:
+    """Build a pagination cursor from the last record of a page"""
+    return f"{timestamp}:{ref_hash}"
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[int, str]]:
+    """
+    Parse a pagination cursor.
+    
+    Args:
+        cursor: Cursor string produced by encode_cursor, or None
+        
+    Returns:
+        (timestamp, ref) tuple, or None for the first page
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if not cursor:
+        return None
+    timestamp, sep, ref_hash = cursor.partition(":")
+    if not sep or not ref_hash:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return int(timestamp), ref_hash
 
 class QueryManager:
     """Manages database queries and provides a unified interface for data access"""
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, **db_options):
         """
         Initialize the QueryManager with a database path.
         
         Args:
             db_path: Path to the database file
+            db_options: Extra options passed to ReferenceBaseDB (e.g. log_mode)
         """
-        self.db = ReferenceBaseDB(db_path)
+        self.db = ReferenceBaseDB(db_path, **db_options)
     
     def get_all_records(self, sort_by: str = "timestamp", reverse: bool = True) -> List[Dict[str, Any]]:
         """
@@ -44,6 +69,103 @@ class QueryManager:
         """
         return self.db.get_records_by_type(record_type, sort_by, reverse)
     
+    def get_records_by_collection(self, collection: str, sort_by: str = "timestamp", reverse: bool = True) -> List[Dict[str, Any]]:
+        """
+        Retrieve all records of one collection (e.g. "pets", "sales").
+        
+        Args:
+            collection: Collection name
+            sort_by: Field to sort by (default: "timestamp")
+            reverse: Whether to sort in descending order (newest first)
+        
+        Returns:
+            List of records in the collection
+        """
+        return self.db.get_records_by_collection(collection, sort_by, reverse)
+    
+    def get_collection_counts(self) -> Dict[str, int]:
+        """
+        Get a count of records in each collection.
+        
+        Returns:
+            Dictionary mapping collection names to their counts
+        """
+        return self.db.get_collection_counts()
+    
+    def get_records_between(self, since: Optional[int] = None, until: Optional[int] = None,
+                            record_type: Optional[str] = None, reverse: bool = True) -> List[Dict[str, Any]]:
+        """
+        Retrieve records within a time range.
+        
+        Args:
+            since: Only records with a timestamp strictly after this
+            until: Only records with a timestamp at or before this
+            record_type: Restrict to one record type
+            reverse: Whether to return newest first
+        
+        Returns:
+            List of matching records ordered by timestamp
+        """
+        return self.db.get_records_between(since, until, record_type, reverse)
+    
+    def get_records_page(self, limit: int = 100, after: Optional[str] = None,
+                         record_type: Optional[str] = None, reverse: bool = True,
+                         collection: Optional[str] = None, since: Optional[int] = None,
+                         until: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Retrieve one page of records using an opaque keyset cursor.
+        
+        Args:
+            limit: Maximum number of records in the page
+            after: Cursor returned as ``next_cursor`` by the previous page
+            record_type: Restrict to one record type
+            reverse: Whether to page newest first
+            collection: Restrict to one collection (instead of a record type)
+            since: Only records with a timestamp strictly after this
+            until: Only records with a timestamp at or before this
+        
+        Returns:
+            Dictionary with the page's ``records`` and ``next_cursor``
+            (None once the last page has been returned)
+        """
+        records = self.db.get_records_page(decode_cursor(after), limit, record_type, reverse, collection, since, until)
+        next_cursor = None
+        if records and len(records) == limit:
+            next_cursor = encode_cursor(records[-1]["timestamp"], records[-1]["ref"])
+        return {"records": records, "next_cursor": next_cursor}
+    
+    def iter_records(self, record_type: Optional[str] = None, reverse: bool = True,
+                     collection: Optional[str] = None, since: Optional[int] = None,
+                     until: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream records one at a time in timestamp order.
+        
+        Args:
+            record_type: Restrict to one record type
+            reverse: Whether to yield newest first
+            collection: Restrict to one collection (instead of a record type)
+            since: Only records with a timestamp strictly after this
+            until: Only records with a timestamp at or before this
+            
+        Returns:
+            Iterator over formatted records
+        """
+        return self.db.iter_records(record_type, reverse, collection=collection, since=since, until=until)
+    
+    def find(self, limit: int = 0, collection: Optional[str] = None, **criteria) -> List[Dict[str, Any]]:
+        """
+        Find records by JSON payload fields, e.g. ``find(status="available", type=["cat"])``.
+        
+        Args:
+            limit: Maximum number of records (0 for all)
+            collection: Only search this collection
+            criteria: Payload field to value, list of alternatives, or indexes.ANY
+            
+        Returns:
+            Matching records, newest first
+        """
+        return self.db.find(criteria, limit, collection)
+    
     def get_record_by_ref(self, ref_hash: str) -> Optional[Dict[str, Any]]:
         """
         Retrieve a specific record by its reference hash.
@@ -54,38 +176,65 @@ class QueryManager:
         Returns:
             The formatted record or None if not found
         """
-        if ref_hash in self.db.store:
-            record = self.db.store[ref_hash]
-            decoded_data = self.db._decode_data(record["data"])
-            return format_record(ref_hash, record, decoded_data)
-        return None
+        return self.db.get_record(ref_hash)
     
-    def query_similar(self, text: str, threshold: float = 0.6) -> List[Dict[str, Any]]:
+    def query_similar(self, text: str, threshold: float = 0.6, nprobe: Optional[int] = None,
+                      limit: int = 0) -> List[Dict[str, Any]]:
         """
         Query for similar records based on text similarity.
         
         Args:
             text: Text to search for similar records
             threshold: Similarity threshold (0.0 to 1.0)
+            nprobe: Posting lists scanned when an ANN index is enabled
+                (higher is slower but more accurate)
+            limit: Maximum number of results to return (0 for all)
             
         Returns:
-            List of similar records with similarity scores
+            List of similar records with similarity scores, best first
         """
-        return self.db.query_similar(text, threshold)
+        return self.db.query_similar(text, threshold, nprobe, limit)
     
-    def get_chain(self, start_ref: str) -> List[Any]:
+    def get_chain(self, start_ref: str, limit: int = 0, offset: int = 0) -> List[Any]:
         """
         Get the chain of records starting from a reference.
         
         Args:
             start_ref: The starting reference hash
+            limit: Maximum number of records to return (0 for all)
+            offset: Number of links to skip before the first returned record
             
         Returns:
             List of decoded data in the chain
         """
-        return self.db.get_chain(start_ref)
+        return self.db.get_chain(start_ref, limit, offset)
+    
+    def get_chain_info(self, ref_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Get length, root, latest record and forward links for a record's chain.
+        
+        Args:
+            ref_hash: Any record in the chain
+            
+        Returns:
+            Chain metadata, or None if the reference is unknown
+        """
+        return self.db.get_chain_info(ref_hash)
     
-    def add_record(self, data: Any, text_hint: str = None, prev: str = None) -> str:
+    def get_latest_in_chain(self, ref_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the most recently added record of the chain containing a reference.
+        
+        Args:
+            ref_hash: Any record in the chain
+            
+        Returns:
+            The formatted latest record, or None if the reference is unknown
+        """
+        info = self.db.get_chain_info(ref_hash)
+        return self.db.get_record(info["head"]) if info else None
+    
+    def add_record(self, data: Any, text_hint: str = None, prev: str = None, collection: str = None) -> str:
         """
         Add a new record to the database.
         
@@ -93,11 +242,51 @@ class QueryManager:
             data: The data to store
             text_hint: Text hint for semantic search
             prev: Reference to previous record in chain
+            collection: Collection to store the record in (derived from
+                the payload's id prefix if omitted)
             
         Returns:
             The reference hash of the new record
         """
-        return self.db.add(data, text_hint, prev)
+        return self.db.add(data, text_hint, prev, collection)
+    
+    def add_records(self, records: List[Dict[str, Any]]) -> List[str]:
+        """
+        Add a batch of records with a single embedding call and save.
+        
+        Args:
+            records: Dicts with a "data" key and optional "text_hint", "prev"
+                and "collection"
+            
+        Returns:
+            The reference hashes of the new records, in input order
+        """
+        return self.db.add_many(records)
+    
+    def get_near_duplicates(self, ref_hash: str) -> List[str]:
+        """
+        Get records whose text is a near-duplicate of a record's.
+        
+        Args:
+            ref_hash: Reference hash of the record
+            
+        Returns:
+            Refs of near-duplicates, closest first (empty if dedup is disabled)
+        """
+        if self.db.lsh is None:
+            return []
+        return self.db.near_duplicates(ref_hash)
+    
+    def embedding_cache_stats(self) -> Dict[str, int]:
+        """
+        Get hit/miss counters of the embedding cache.
+        
+        Returns:
+            Dictionary of cache counters (empty if caching is disabled)
+        """
+        if self.db.embedding_cache is None:
+            return {}
+        return self.db.embedding_cache.stats()
     
     def get_record_types(self) -> Dict[str, int]:
         """
@@ -106,40 +295,81 @@ class QueryManager:
         Returns:
             Dictionary mapping record types to their counts
         """
-        type_counts = {}
-        for record in self.db.store.values():
-            record_type = record.get("type", "unknown")
-            type_counts[record_type] = type_counts.get(record_type, 0) + 1
-        return type_counts
+        return self.db.get_record_types()
 
-# Create a default query manager for the petstore database
-default_query_manager = QueryManager("data/petstore_rbd.json")
+# Default query manager for the petstore database, opened on first use so
+# that importing this module does not load the store
+DEFAULT_DB_PATH = "data/petstore_rbd.json"
+_default_query_manager: Optional[QueryManager] = None
+_default_lock = threading.Lock()
+
+def get_default_query_manager() -> QueryManager:
+    """Return the shared default query manager, opening it on first call"""
+    global _default_query_manager
+    if _default_query_manager is None:
+        with _default_lock:
+            if _default_query_manager is None:
+                _default_query_manager = QueryManager(DEFAULT_DB_PATH)
+    return _default_query_manager
+
+def __getattr__(name):
+    # Keeps `from rbd.query import default_query_manager` working, lazily
+    if name == "default_query_manager":
+        return get_default_query_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Convenience functions that use the default query manager
 def get_all_records(sort_by: str = "timestamp", reverse: bool = True) -> List[Dict[str, Any]]:
     """Convenience function to get all records using the default query manager"""
-    return default_query_manager.get_all_records(sort_by, reverse)
+    return get_default_query_manager().get_all_records(sort_by, reverse)
 
 def get_records_by_type(record_type: str, sort_by: str = "timestamp", reverse: bool = True) -> List[Dict[str, Any]]:
     """Convenience function to get records by type using the default query manager"""
-    return default_query_manager.get_records_by_type(record_type, sort_by, reverse)
+    return get_default_query_manager().get_records_by_type(record_type, sort_by, reverse)
+
+def get_records_between(since: Optional[int] = None, until: Optional[int] = None,
+                        record_type: Optional[str] = None, reverse: bool = True) -> List[Dict[str, Any]]:
+    """Convenience function to get records in a time range using the default query manager"""
+    return get_default_query_manager().get_records_between(since, until, record_type, reverse)
+
+def get_records_page(limit: int = 100, after: Optional[str] = None,
+                     record_type: Optional[str] = None, reverse: bool = True) -> Dict[str, Any]:
+    """Convenience function to get a page of records using the default query manager"""
+    return get_default_query_manager().get_records_page(limit, after, record_type, reverse)
+
+def find(limit: int = 0, collection: Optional[str] = None, **criteria) -> List[Dict[str, Any]]:
+    """Convenience function to find records by payload fields using the default query manager"""
+    return get_default_query_manager().find(limit, collection, **criteria)
 
 def get_record_by_ref(ref_hash: str) -> Optional[Dict[str, Any]]:
     """Convenience function to get a record by reference using the default query manager"""
-    return default_query_manager.get_record_by_ref(ref_hash)
+    return get_default_query_manager().get_record_by_ref(ref_hash)
 
-def query_similar(text: str, threshold: float = 0.6) -> List[Dict[str, Any]]:
+def query_similar(text: str, threshold: float = 0.6, nprobe: Optional[int] = None,
+                  limit: int = 0) -> List[Dict[str, Any]]:
     """Convenience function to query similar records using the default query manager"""
-    return default_query_manager.query_similar(text, threshold)
+    return get_default_query_manager().query_similar(text, threshold, nprobe, limit)
 
-def get_chain(start_ref: str) -> List[Any]:
+def get_chain(start_ref: str, limit: int = 0, offset: int = 0) -> List[Any]:
     """Convenience function to get a chain of records using the default query manager"""
-    return default_query_manager.get_chain(start_ref)
+    return get_default_query_manager().get_chain(start_ref, limit, offset)
 
-def add_record(data: Any, text_hint: str = None, prev: str = None) -> str:
+def add_record(data: Any, text_hint: str = None, prev: str = None, collection: str = None) -> str:
     """Convenience function to add a record using the default query manager"""
-    return default_query_manager.add_record(data, text_hint, prev)
+    return get_default_query_manager().add_record(data, text_hint, prev, collection)
+
+def add_records(records: List[Dict[str, Any]]) -> List[str]:
+    """Convenience function to add a batch of records using the default query manager"""
+    return get_default_query_manager().add_records(records)
+
+def get_records_by_collection(collection: str, sort_by: str = "timestamp", reverse: bool = True) -> List[Dict[str, Any]]:
+    """Convenience function to get a collection's records using the default query manager"""
+    return get_default_query_manager().get_records_by_collection(collection, sort_by, reverse)
+
+def get_collection_counts() -> Dict[str, int]:
+    """Convenience function to get collection counts using the default query manager"""
+    return get_default_query_manager().get_collection_counts()
 
 def get_record_types() -> Dict[str, int]:
     """Convenience function to get record types using the default query manager"""
-    return default_query_manager.get_record_types()
\ No newline at end of file
+    return get_default_query_manager().get_record_types()
\ No newline at end of file
@@ -0,0 +1,536 @@
+# rbd/snapshot.py
+"""Reading and writing RBD snapshot files"""
+
+import json
+import mmap
+import os
+import uuid
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# First-line key identifying the JSON-lines format
+SNAPSHOT_HEADER = "rbd_snapshot"
+SNAPSHOT_VERSION = 1
+
+# Offset index layout: a JSON header line (snapshot id and size, string
+# tables, and the dtype, byte offset and length of every column), padded to
+# 8 bytes, then fixed-width little-endian columns, each 8-byte aligned, that
+# are memory-mapped. Record columns are in snapshot (timeline) order.
+INDEX_HEADER = "rbd_index"
+INDEX_VERSION = 2
+
+
+def index_path(path: str) -> str:
+    """Path of the offset index written next to a snapshot."""
+    return path + ".idx"
+
+
+def write_snapshot(path: str, store: Dict[str, Dict], fingerprints: Dict[str, List[str]],
+                   vector_rows: List[str],
+                   collection_of: Optional[Callable[[str, Dict], Optional[str]]] = None,
+                   order: Optional[Iterable[str]] = None,
+                   meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Atomically write a JSON-lines snapshot.
+
+    The first line is a header with the record and fingerprint counts and
+    any per-store settings from ``meta``, followed by one compact line per record, one per fingerprint, and a
+    final line with the fingerprint of each persisted vector row.
+
+    When ``collection_of`` is given, a binary offset index is also written
+    to ``<path>.idx``: the byte range of every record line plus the fields
+    the in-memory indexes are built from (timestamp, type, prev,
+    collection, fingerprint), the fingerprints and the vector rows. It lets
+    LazyRecordStore and LazyFingerprints open the snapshot by mapping
+    fixed-width columns, without parsing anything.
+
+    Args:
+        path: Snapshot file path (written via a temporary file and rename)
+        store: Mapping of ref hash to raw record (a LazyRecordStore copies
+            its persisted lines verbatim)
+        fingerprints: Mapping of fingerprint hash to refs
+        vector_rows: Fingerprint of each row of the vector sidecar
+        collection_of: Function returning the collection of (ref, record);
+            required to write the offset index
+        order: Refs in the order to write them (default: store order);
+            must be timeline order when the offset index is written, as a
+            lazy load rebuilds the timeline from it without sorting
+        meta: Extra header fields (e.g. {"hash": "blake2b"}), returned by
+            read_header()
+
+    Returns:
+        The mapped offset index (see read_index()); only the snapshot id
+        and size when it was not written
+    """
+    dumps = json.JSONEncoder(separators=(",", ":")).encode
+    lazy = store if isinstance(store, LazyRecordStore) else None
+    snapshot_id = uuid.uuid4().hex
+    index = {"snapshot_id": snapshot_id, "refs": [], "offsets": [], "lengths": [],
+             "ts": [], "types": [], "prev": [], "collections": []}
+    write_index = collection_of is not None
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        head = {SNAPSHOT_HEADER: SNAPSHOT_VERSION, "id": snapshot_id, "records": len(store),
+                "fingerprints": len(fingerprints)}
+        head.update(meta or {})
+        f.write((dumps(head) + "\n").encode())
+        offset = f.tell()
+        for ref_hash in (store if order is None else order):
+            line = lazy.line(ref_hash) if lazy is not None else None
+            if line is None:
+                record = store[ref_hash]
+                line = (dumps({"ref": ref_hash, "record": record}) + "\n").encode()
+                header = (record.get("ts", 0), record.get("type", "unknown"), record.get("prev"),
+                          collection_of(ref_hash, record) if write_index else None)
+            else:
+                header = lazy.header(ref_hash)
+            f.write(line)
+            index["refs"].append(ref_hash)
+            index["offsets"].append(offset)
+            index["lengths"].append(len(line))
+            for key, value in zip(("ts", "types", "prev", "collections"), header):
+                index[key].append(value)
+            offset += len(line)
+        for vf_hash, refs in fingerprints.items():
+            f.write((dumps({"vf": vf_hash, "refs": refs}) + "\n").encode())
+        f.write((dumps({"vector_rows": vector_rows}) + "\n").encode())
+        f.flush()
+        os.fsync(f.fileno())
+        index["size"] = f.tell()
+    os.replace(tmp_path, path)
+
+    if not write_index:
+        return {"snapshot_id": snapshot_id, "size": index["size"]}
+    # A crash between the two renames leaves an index whose id no longer
+    # matches the snapshot; read_index() then ignores it
+    _write_index(index_path(path), index, fingerprints, vector_rows)
+    return _map_index(index_path(path))
+
+
+def _write_index(path: str, index: Dict[str, Any], fingerprints: Dict[str, List[str]],
+                 vector_rows: List[str]):
+    """Write the collected record columns, fingerprints and vector rows as a binary index."""
+    import numpy as np
+
+    def strings(values):
+        # Fixed-width bytes; None is stored as b"" (numpy strips trailing NULs)
+        return np.array([value.encode() if value else b"" for value in values] or [b""])[:len(values)]
+
+    fingerprint_of = {ref_hash: vf_hash for vf_hash, refs in fingerprints.items() for ref_hash in refs}
+    refs = strings(index["refs"])
+    types = sorted(set(index["types"]))
+    collections = sorted({collection for collection in index["collections"] if collection})
+    type_codes = {record_type: i for i, record_type in enumerate(types)}
+    collection_codes = {collection: i for i, collection in enumerate(collections)}
+    fp_keys = strings(list(fingerprints))
+    fp_sizes = [len(refs_of) for refs_of in fingerprints.values()]
+    ref_order = np.argsort(refs, kind="stable")
+    fp_order = np.argsort(fp_keys, kind="stable")
+    columns = {
+        "refs": refs,
+        "offsets": np.array(index["offsets"], dtype="<i8"),
+        "lengths": np.array(index["lengths"], dtype="<i8"),
+        "ts": np.array(index["ts"], dtype="<i8"),
+        "types": np.array([type_codes[t] for t in index["types"]], dtype="<i2"),
+        "collections": np.array([collection_codes.get(c, -1) if c else -1 for c in index["collections"]], dtype="<i2"),
+        "prev": strings(index["prev"]),
+        "fingerprint": strings([fingerprint_of.get(ref_hash) for ref_hash in index["refs"]]),
+        # Refs sorted, with their row, for binary search
+        "sorted_refs": refs[ref_order],
+        "sorted_rows": ref_order.astype("<i8"),
+        "fp_keys": fp_keys,
+        "fp_sorted": fp_keys[fp_order],
+        "fp_sorted_rows": fp_order.astype("<i8"),
+        "fp_starts": np.concatenate(([0], np.cumsum(fp_sizes, dtype="<i8"))).astype("<i8"),
+        "fp_refs": strings([ref_hash for refs_of in fingerprints.values() for ref_hash in refs_of]),
+        "vector_rows": strings(list(vector_rows)),
+    }
+    header = {INDEX_HEADER: INDEX_VERSION, "snapshot_id": index["snapshot_id"], "size": index["size"],
+              "types": types, "collections": collections, "columns": {}}
+    # Offsets are relative to the end of the padded header line
+    offset = 0
+    for name, column in columns.items():
+        header["columns"][name] = [column.dtype.str, offset, len(column)]
+        offset += _align(column.nbytes)
+    line = json.dumps(header, separators=(",", ":")).encode()
+    line = line.ljust(_align(len(line) + 1) - 1) + b"\n"
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(line)
+        for column in columns.values():
+            data = np.ascontiguousarray(column).tobytes()
+            f.write(data + b"\0" * (_align(len(data)) - len(data)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _align(size: int) -> int:
+    return -(-size // 8) * 8
+
+
+def _map_index(path: str) -> Optional[Dict[str, Any]]:
+    """Map a binary offset index; None if the file is missing or not in this format."""
+    import numpy as np
+    try:
+        with open(path, "rb") as f:
+            line = f.readline()
+            # Cheap check first: earlier versions wrote the index as one JSON document
+            if not line.startswith(b'{"%s":' % INDEX_HEADER.encode()):
+                return None
+            header = json.loads(line)
+            if header.get(INDEX_HEADER) != INDEX_VERSION:
+                return None
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        # Missing, empty, or a JSON index written by an earlier version
+        return None
+    start = len(line)
+    columns = {name: np.frombuffer(mm, dtype=dtype, count=count, offset=start + offset)
+               for name, (dtype, offset, count) in header["columns"].items()}
+    return {"snapshot_id": header["snapshot_id"], "size": header["size"], "types": header["types"],
+            "collections": header["collections"], "columns": columns}
+
+
+def read_snapshot(path: str) -> Tuple[Dict[str, Dict], Dict[str, List[str]], List[str]]:
+    """
+    Read a snapshot in either format.
+
+    JSON-lines snapshots are recognised by their header line; anything else
+    is parsed as the original single JSON document
+    (``{"store": ..., "fingerprints": ..., "vector_rows": ...}``).
+
+    Args:
+        path: Snapshot file path
+
+    Returns:
+        Tuple of (store, fingerprints, vector_rows)
+
+    Raises:
+        FileNotFoundError: If the snapshot does not exist
+        ValueError: If a JSON-lines snapshot is incomplete
+    """
+    with open(path, "r") as f:
+        header = _parse_header(f.readline())
+        if header is None:
+            f.seek(0)
+            data = json.load(f)
+            return data["store"], data["fingerprints"], data.get("vector_rows", [])
+
+        store = {}
+        fingerprints = {}
+        vector_rows = []
+        for line in f:
+            entry = json.loads(line)
+            if "ref" in entry:
+                store[entry["ref"]] = entry["record"]
+            elif "vf" in entry:
+                fingerprints[entry["vf"]] = entry["refs"]
+            elif "vector_rows" in entry:
+                vector_rows = entry["vector_rows"]
+
+    if len(store) != header["records"] or len(fingerprints) != header["fingerprints"]:
+        raise ValueError(f"Incomplete snapshot: {path}")
+    return store, fingerprints, vector_rows
+
+
+def _parse_header(line: str) -> Optional[Dict[str, Any]]:
+    """The JSON-lines header, or None for a legacy snapshot."""
+    try:
+        header = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(header, dict) or SNAPSHOT_HEADER not in header:
+        return None
+    return header
+
+
+def read_header(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Read the header line of a snapshot.
+
+    Args:
+        path: Snapshot file path
+
+    Returns:
+        The header (counts, id and the meta fields of write_snapshot()), or
+        None if the snapshot is missing or in the legacy format
+    """
+    try:
+        with open(path, "r") as f:
+            return _parse_header(f.readline())
+    except FileNotFoundError:
+        return None
+
+
+def read_index(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Load the offset index of a snapshot if it matches the snapshot on disk.
+
+    Only the snapshot's header line is read.
+
+    Args:
+        path: Snapshot file path
+
+    Returns:
+        The index written by write_snapshot(), or None if the snapshot is
+        missing, in the legacy format, or newer than its index
+    """
+    try:
+        with open(path, "r") as f:
+            header = _parse_header(f.readline())
+            size = os.fstat(f.fileno()).st_size
+    except (FileNotFoundError, ValueError):
+        return None
+    index = _map_index(index_path(path))
+    if index is None or header is None or header.get("id") != index["snapshot_id"] or index["size"] != size:
+        return None
+    return index
+
+
+def _find(sorted_keys, key: str) -> int:
+    """Position of ``key`` in a sorted fixed-width bytes column, or -1."""
+    encoded = key.encode()
+    i = int(sorted_keys.searchsorted(encoded))
+    return i if i < len(sorted_keys) and sorted_keys[i] == encoded else -1
+
+
+def decode_strings(column) -> List[str]:
+    """Decode a string column of the offset index (UTF-8 bytes) to str."""
+    return [value.decode() for value in column.tolist()]
+
+
+class LazyRecordStore(MutableMapping):
+    """
+    Record store backed by a memory-mapped JSON-lines snapshot.
+
+    Only the memory-mapped offset index is consulted; a record is decoded
+    from its snapshot line each time it is read (the database's view cache
+    keeps hot records decoded) and refs are found by binary search, so
+    opening costs no per-record work. Records written after the snapshot
+    live in an in-memory overlay until the next snapshot is adopted with
+    rebase().
+    """
+
+    def __init__(self, path: str, index: Dict[str, Any]):
+        """
+        Map a snapshot using its offset index.
+
+        Args:
+            path: Snapshot file path
+            index: Index returned by read_index() or write_snapshot()
+        """
+        self._overlay: Dict[str, Dict] = {}
+        self._map(path, index)
+
+    def _map(self, path: str, index: Dict[str, Any]):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        columns = index["columns"]
+        self._refs = columns["refs"]
+        self._sorted_refs = columns["sorted_refs"]
+        self._sorted_rows = columns["sorted_rows"]
+        self._offsets = columns["offsets"]
+        self._lengths = columns["lengths"]
+        self._ts = columns["ts"]
+        self._types = columns["types"]
+        self._prev = columns["prev"]
+        self._collections = columns["collections"]
+        self._fingerprints = columns["fingerprint"]
+        self._type_names = index["types"]
+        self._collection_names = index["collections"]
+
+    def _row(self, ref_hash: str) -> int:
+        """Row of a persisted record in the index, or -1."""
+        i = _find(self._sorted_refs, ref_hash)
+        return -1 if i < 0 else int(self._sorted_rows[i])
+
+    def _persisted_row(self, ref_hash: str) -> int:
+        i = self._row(ref_hash)
+        if i < 0:
+            raise KeyError(ref_hash)
+        return i
+
+    def __getitem__(self, ref_hash: str) -> Dict:
+        record = self._overlay.get(ref_hash)
+        if record is not None:
+            return record
+        i = self._persisted_row(ref_hash)
+        start = int(self._offsets[i])
+        return json.loads(self._mm[start:start + int(self._lengths[i])])["record"]
+
+    def __setitem__(self, ref_hash: str, record: Dict):
+        self._overlay[ref_hash] = record
+
+    def __delitem__(self, ref_hash: str):
+        raise TypeError("Records cannot be deleted")
+
+    def __contains__(self, ref_hash) -> bool:
+        return ref_hash in self._overlay or self._row(ref_hash) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        yield from decode_strings(self._refs)
+        for ref_hash in self._overlay:
+            if self._row(ref_hash) < 0:
+                yield ref_hash
+
+    def __len__(self) -> int:
+        return len(self._refs) + sum(1 for ref_hash in self._overlay if self._row(ref_hash) < 0)
+
+    def timestamp(self, ref_hash: str) -> int:
+        """Timestamp of a record, from the index when it is persisted."""
+        record = self._overlay.get(ref_hash)
+        if record is not None:
+            return record.get("ts", 0)
+        return int(self._ts[self._persisted_row(ref_hash)])
+
+    def fingerprint(self, ref_hash: str) -> Optional[str]:
+        """Fingerprint of a persisted record when the snapshot was written (None if it had none)."""
+        i = self._row(ref_hash)
+        return self._fingerprints[i].decode() or None if i >= 0 else None
+
+    def line(self, ref_hash: str) -> Optional[bytes]:
+        """Snapshot line of a persisted, unmodified record (None otherwise)."""
+        if ref_hash in self._overlay:
+            return None
+        i = self._row(ref_hash)
+        if i < 0:
+            return None
+        start = int(self._offsets[i])
+        return self._mm[start:start + int(self._lengths[i])]
+
+    def header(self, ref_hash: str) -> Tuple[int, str, Optional[str], Optional[str]]:
+        """(timestamp, type, prev, collection) of a persisted record, from the index."""
+        i = self._persisted_row(ref_hash)
+        collection = int(self._collections[i])
+        return (int(self._ts[i]), self._type_names[self._types[i]], self._prev[i].decode() or None,
+                self._collection_names[collection] if collection >= 0 else None)
+
+    def columns(self) -> Tuple[List[str], List[int], List[str], List[Optional[str]]]:
+        """
+        (refs, timestamps, types, collections) of the persisted records, from
+        the index, in snapshot (timeline) order.
+        """
+        types = [self._type_names[code] for code in range(len(self._type_names))]
+        collections = self._collection_names + [None]
+        return (decode_strings(self._refs), self._ts.tolist(), [types[code] for code in self._types.tolist()],
+                [collections[code] for code in self._collections.tolist()])
+
+    def headers(self) -> Dict[str, Dict]:
+        """
+        Stand-in records holding the index fields of every record.
+
+        Returns:
+            ref -> {"ts", "type", "prev"} (overlay records are returned as is)
+        """
+        types = self._type_names
+        headers = {ref_hash: {"ts": ts, "type": types[code], "prev": prev or None}
+                   for ref_hash, ts, code, prev in zip(decode_strings(self._refs), self._ts.tolist(),
+                                                       self._types.tolist(), decode_strings(self._prev))}
+        headers.update(self._overlay)
+        return headers
+
+    def copy(self) -> "LazyRecordStore":
+        """Point-in-time copy sharing the mapped snapshot."""
+        clone = LazyRecordStore.__new__(LazyRecordStore)
+        clone.__dict__.update(self.__dict__)
+        clone._overlay = dict(self._overlay)
+        return clone
+
+    def rebase(self, path: str, index: Dict[str, Any]):
+        """
+        Switch to a newly written snapshot, keeping newer overlay records.
+
+        Args:
+            path: Snapshot file path
+            index: Index returned by write_snapshot()
+        """
+        self._map(path, index)
+        self._overlay = {ref_hash: record for ref_hash, record in self._overlay.items()
+                         if self._row(ref_hash) < 0}
+
+
+class LazyFingerprints(MutableMapping):
+    """
+    Fingerprint -> refs mapping backed by the offset index.
+
+    Lists are decoded from the index on each read; an entry is copied into
+    an in-memory overlay when it is changed (setdefault() returns the
+    overlay list, so appending to it sticks).
+    """
+
+    def __init__(self, index: Dict[str, Any]):
+        """
+        Args:
+            index: Index returned by read_index() or write_snapshot()
+        """
+        self._overlay: Dict[str, List[str]] = {}
+        self._map(index)
+
+    def _map(self, index: Dict[str, Any]):
+        columns = index["columns"]
+        self._keys = columns["fp_keys"]
+        self._sorted_keys = columns["fp_sorted"]
+        self._sorted_rows = columns["fp_sorted_rows"]
+        self._starts = columns["fp_starts"]
+        self._refs = columns["fp_refs"]
+
+    def _persisted(self, vf_hash: str) -> Optional[List[str]]:
+        i = _find(self._sorted_keys, vf_hash)
+        if i < 0:
+            return None
+        row = int(self._sorted_rows[i])
+        return decode_strings(self._refs[self._starts[row]:self._starts[row + 1]])
+
+    def __getitem__(self, vf_hash: str) -> List[str]:
+        refs = self._overlay.get(vf_hash)
+        if refs is None:
+            refs = self._persisted(vf_hash)
+            if refs is None:
+                raise KeyError(vf_hash)
+        return refs
+
+    def __setitem__(self, vf_hash: str, refs: List[str]):
+        self._overlay[vf_hash] = refs
+
+    def __delitem__(self, vf_hash: str):
+        raise TypeError("Fingerprints cannot be deleted")
+
+    def __contains__(self, vf_hash) -> bool:
+        return vf_hash in self._overlay or _find(self._sorted_keys, vf_hash) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        yield from decode_strings(self._keys)
+        for vf_hash in self._overlay:
+            if _find(self._sorted_keys, vf_hash) < 0:
+                yield vf_hash
+
+    def __len__(self) -> int:
+        return len(self._keys) + sum(1 for vf_hash in self._overlay if _find(self._sorted_keys, vf_hash) < 0)
+
+    def setdefault(self, vf_hash: str, default: Optional[List[str]] = None) -> List[str]:
+        refs = self._overlay.get(vf_hash)
+        if refs is None:
+            refs = self._persisted(vf_hash)
+            self._overlay[vf_hash] = refs if refs is not None else default
+        return self._overlay[vf_hash]
+
+    def rebase(self, index: Dict[str, Any]):
+        """
+        Switch to a newly written index, keeping overlay entries changed since.
+
+        Args:
+            index: Index returned by write_snapshot()
+        """
+        self._map(index)
+        self._overlay = {vf_hash: refs for vf_hash, refs in self._overlay.items()
+                         if self._persisted(vf_hash) != refs}
+
+    def copy(self) -> "LazyFingerprints":
+        """Point-in-time copy sharing the mapped index."""
+        clone = LazyFingerprints.__new__(LazyFingerprints)
+        clone.__dict__.update(self.__dict__)
+        clone._overlay = {vf_hash: list(refs) for vf_hash, refs in self._overlay.items()}
+        return clone
@@ -23,6 +23,10 @@ def format_record(ref_hash: str, record: Dict[str, Any], decoded_data: Any = Non
         db = ReferenceBaseDB.__new__(ReferenceBaseDB)  # Create instance without __init__
         decoded_data = db._decode_data(record["data"])
     
+    # Binary vector payloads decode to numpy arrays; API output needs plain lists
+    if hasattr(decoded_data, "tolist"):
+        decoded_data = decoded_data.tolist()
+    
     # Create formatted record
     formatted_record = {
         "ref": ref_hash,
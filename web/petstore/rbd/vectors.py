@@ -0,0 +1,359 @@
+# rbd/vectors.py
+"""Contiguous float32 embedding matrix keyed by semantic fingerprint"""
+
+from __future__ import annotations
+
+import base64
+import os
+import struct
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+# numpy is imported where it is used, so opening a store whose vectors are
+# never touched (e.g. a script listing records) does not pay for it
+if TYPE_CHECKING:
+    import numpy as np
+
+# Sidecar layout: magic, row dimension (uint32), padding, then little-endian
+# float32 rows back to back
+SIDECAR_MAGIC = b"RBDVEC01"
+SIDECAR_HEADER = struct.Struct("<8sI4x")
+
+
+def pack_vector(vec) -> str:
+    """Pack a vector as base64 of little-endian float32, for log frames."""
+    import numpy as np
+    return base64.b64encode(np.asarray(vec, dtype="<f4").tobytes()).decode("ascii")
+
+
+def unpack_vector(s: str) -> np.ndarray:
+    """Inverse of pack_vector."""
+    import numpy as np
+    return np.frombuffer(base64.b64decode(s), dtype="<f4")
+
+
+def pack_array(values, dtype: str) -> str:
+    """Pack a 1-D array as base64 of the given little-endian dtype (e.g. "<f8")."""
+    import numpy as np
+    return base64.b64encode(np.asarray(values, dtype=dtype).tobytes()).decode("ascii")
+
+
+def unpack_array(s: str, dtype: str) -> np.ndarray:
+    """Inverse of pack_array."""
+    import numpy as np
+    return np.frombuffer(base64.b64decode(s), dtype=dtype)
+
+
+class VectorStore:
+    """
+    Row-per-fingerprint matrix of L2-normalized embeddings.
+
+    Rows persisted by ``save()`` live in an append-only float32 sidecar
+    that is memory-mapped on first use after load; rows added since then
+    are kept in an in-memory tail buffer that grows geometrically. Row
+    order is append-only, so a prefix of the sidecar is always valid for a
+    shorter key list, and saving only appends the tail.
+    """
+
+    def __init__(self, path: str, legacy_path: Optional[str] = None):
+        """
+        Initialize an empty vector store.
+
+        Args:
+            path: Path of the float32 sidecar file
+            legacy_path: ``.npy`` sidecar written by earlier versions, read
+                when ``path`` does not exist yet and replaced by it on the
+                next save
+        """
+        self.path = path
+        self.legacy_path = legacy_path
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._dim: Optional[int] = None
+        self._base = None
+        self._tail = None
+        self._tail_len = 0
+        # The mapped base came from legacy_path and must be rewritten to path
+        self._migrate = False
+        # Row keys given to load(), until the sidecar is mapped
+        self._pending: Optional[List[str]] = None
+        self._attach_lock = threading.Lock()
+
+    @property
+    def keys(self) -> List[str]:
+        """Fingerprint of each row, in row order."""
+        self._attach()
+        return self._keys
+
+    @property
+    def rows(self) -> Dict[str, int]:
+        """Row index of each fingerprint."""
+        self._attach()
+        return self._rows
+
+    @property
+    def dim(self) -> Optional[int]:
+        """Vector dimension (None while empty)."""
+        self._attach()
+        return self._dim
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.rows
+
+    def load(self, keys: List[str]):
+        """
+        Attach the sidecar to the persisted row keys.
+
+        The sidecar is memory-mapped on first use. Rows whose vectors are
+        missing from it are dropped then; callers are expected to re-embed
+        them on demand.
+
+        Args:
+            keys: Fingerprint of each persisted row, in row order
+        """
+        self._keys, self._rows = [], {}
+        self._dim, self._base, self._tail, self._tail_len = None, None, None, 0
+        self._migrate = False
+        self._pending = list(keys) if keys else None
+
+    def _map(self, count: Optional[int] = None):
+        """Map the first ``count`` rows of the sidecar (all complete rows if None)."""
+        import numpy as np
+        with open(self.path, "rb") as f:
+            magic, dim = SIDECAR_HEADER.unpack(f.read(SIDECAR_HEADER.size))
+            size = os.fstat(f.fileno()).st_size
+        if magic != SIDECAR_MAGIC:
+            raise ValueError(f"Not a vector sidecar: {self.path}")
+        # A torn append leaves a partial row at the end; ignore it
+        available = (size - SIDECAR_HEADER.size) // (4 * dim) if dim else 0
+        count = available if count is None else min(count, available)
+        if count == 0:
+            return None
+        return np.memmap(self.path, dtype="<f4", mode="r", offset=SIDECAR_HEADER.size, shape=(count, dim))
+
+    def _attach(self):
+        if self._pending is None:
+            return
+        # Concurrent readers may get here first together
+        with self._attach_lock:
+            if self._pending is None:
+                return
+            import numpy as np
+            keys = self._pending
+            try:
+                base = self._map(len(keys))
+            except (FileNotFoundError, ValueError, struct.error):
+                base = None
+                if self.legacy_path is not None:
+                    try:
+                        base = np.load(self.legacy_path, mmap_mode="r")
+                        self._migrate = True
+                    except (FileNotFoundError, ValueError):
+                        pass
+            count = 0 if base is None else min(len(keys), base.shape[0])
+            if count:
+                self._base = base[:count]
+                self._dim = base.shape[1]
+                self._keys = keys[:count]
+                self._rows = {key: row for row, key in enumerate(self._keys)}
+            self._migrate = self._migrate and count > 0
+            self._pending = None
+
+    def add(self, key: str, vec) -> int:
+        """
+        Store the normalized vector for a fingerprint if not already present.
+
+        Args:
+            key: Fingerprint hash
+            vec: Embedding vector
+
+        Returns:
+            Row index of the fingerprint
+        """
+        if key in self.rows:
+            return self._rows[key]
+
+        import numpy as np
+        v = np.asarray(vec, dtype=np.float32)
+        if self._dim is None:
+            self._dim = v.shape[0]
+        elif v.shape[0] != self._dim:
+            raise ValueError(f"Vector dimension {v.shape[0]} does not match store dimension {self._dim}")
+        norm = np.linalg.norm(v)
+        if norm > 0:
+            v = v / norm
+
+        if self._tail is None or self._tail_len == self._tail.shape[0]:
+            capacity = max(64, 2 * self._tail_len)
+            grown = np.zeros((capacity, self._dim), dtype=np.float32)
+            if self._tail is not None:
+                grown[:self._tail_len] = self._tail[:self._tail_len]
+            self._tail = grown
+        self._tail[self._tail_len] = v
+        self._tail_len += 1
+
+        row = len(self._keys)
+        self._keys.append(key)
+        self._rows[key] = row
+        return row
+
+    def take(self, rows) -> np.ndarray:
+        """
+        Gather a subset of rows into a new array.
+
+        Args:
+            rows: Row indices
+
+        Returns:
+            Array with one row per requested index
+        """
+        import numpy as np
+        self._attach()
+        rows = np.asarray(rows, dtype=np.int64)
+        out = np.empty((rows.shape[0], self._dim or 0), dtype=np.float32)
+        base_len = 0 if self._base is None else self._base.shape[0]
+        in_base = rows < base_len
+        if in_base.any():
+            out[in_base] = self._base[rows[in_base]]
+        if not in_base.all():
+            out[~in_base] = self._tail[rows[~in_base] - base_len]
+        return out
+
+    def scores(self, query_vec, rows=None) -> np.ndarray:
+        """
+        Cosine similarity of the query against every row, or a subset.
+
+        Args:
+            query_vec: Query embedding
+            rows: Optional row indices to score instead of the whole matrix
+
+        Returns:
+            Array of similarities, indexed by row (or aligned with ``rows``)
+        """
+        import numpy as np
+        count = len(self.keys) if rows is None else len(rows)
+        if count == 0:
+            return np.zeros(0, dtype=np.float32)
+        q = np.asarray(query_vec, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm == 0:
+            return np.zeros(count, dtype=np.float32)
+        q = q / norm
+        if rows is not None:
+            return self.take(rows) @ q
+        parts = []
+        if self._base is not None:
+            parts.append(self._base @ q)
+        if self._tail_len:
+            parts.append(self._tail[:self._tail_len] @ q)
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    def matrix(self) -> np.ndarray:
+        """Return all rows as one array (copies when a tail is present)."""
+        import numpy as np
+        self._attach()
+        parts = []
+        if self._base is not None:
+            parts.append(self._base)
+        if self._tail_len:
+            parts.append(self._tail[:self._tail_len])
+        if not parts:
+            return np.zeros((0, self._dim or 0), dtype=np.float32)
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    def frozen(self) -> "VectorStore":
+        """
+        Point-in-time copy for reading rows without holding the caller's lock.
+
+        The mapped sidecar is shared and only the in-memory tail and the
+        key list are copied. Meant for row access (len, take, matrix,
+        scores) by background index builds; it must not be modified.
+        """
+        self._attach()
+        clone = VectorStore.__new__(VectorStore)
+        clone.__dict__.update(self.__dict__)
+        clone._keys = self._keys[:]
+        clone._tail = None if self._tail is None else self._tail[:self._tail_len].copy()
+        return clone
+
+    def save(self):
+        """Append the rows added since the last save to the sidecar and remap it."""
+        if not self.unsaved:
+            return
+        start, rows = self.unsaved_rows()
+        self.write(start, rows)
+        self.rebase(start + rows.shape[0])
+
+    @property
+    def unsaved(self) -> bool:
+        """True if the sidecar lacks rows of this store."""
+        return self._pending is None and (self._tail_len > 0 or self._migrate)
+
+    def unsaved_rows(self) -> Tuple[int, np.ndarray]:
+        """
+        Copy the rows the sidecar lacks.
+
+        Returns:
+            (first row number, rows): the tail added since the last save,
+            or every row when the sidecar has to be rewritten
+        """
+        import numpy as np
+        if self._migrate:
+            return 0, np.array(self.matrix())
+        start = 0 if self._base is None else self._base.shape[0]
+        return start, self._tail[:self._tail_len].copy()
+
+    def write(self, start: int, rows: np.ndarray):
+        """
+        Write rows to the sidecar from row number ``start`` without remapping.
+
+        Rows before ``start`` are never touched, so mapped prefixes stay
+        valid; anything after the written rows (left by a crash before the
+        snapshot listing them was written) is cut off. ``start`` 0 replaces
+        the file atomically. Safe to call without locks on rows copied by
+        unsaved_rows(); follow with rebase() to map them.
+
+        Args:
+            start: Row number of the first row (the number of rows the
+                sidecar already holds for this store)
+            rows: Rows to write
+        """
+        import numpy as np
+        data = np.ascontiguousarray(rows, dtype="<f4").tobytes()
+        if start == 0:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(SIDECAR_HEADER.pack(SIDECAR_MAGIC, rows.shape[1]))
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            if self.legacy_path is not None and os.path.exists(self.legacy_path):
+                os.remove(self.legacy_path)
+            return
+        with open(self.path, "r+b") as f:
+            f.seek(SIDECAR_HEADER.size + start * 4 * rows.shape[1])
+            f.write(data)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+    def rebase(self, count: int):
+        """
+        Map the first ``count`` rows from the sidecar, keeping later rows in memory.
+
+        Args:
+            count: Number of rows the sidecar was written with
+        """
+        import numpy as np
+        newer = self.take(np.arange(count, len(self._keys))) if count < len(self._keys) else None
+        self._base = self._map(count) if count else None
+        self._migrate = False
+        self._tail, self._tail_len = None, 0
+        if newer is not None:
+            self._tail = np.zeros((max(64, 2 * newer.shape[0]), self._dim), dtype=np.float32)
+            self._tail[:newer.shape[0]] = newer
+            self._tail_len = newer.shape[0]
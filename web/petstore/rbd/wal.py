@@ -0,0 +1,306 @@
+# rbd/wal.py
+"""Append-only write-ahead log used by ReferenceBaseDB in log mode"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+# Frame key holding the record already serialized to JSON (not written itself)
+RECORD_JSON = "record_json"
+
+
+class WriteAheadLog:
+    """
+    Append-only log of compact JSON record frames, one frame per line.
+
+    Each frame is written with a single write call and flushed to the OS
+    immediately; fsync is batched so that at most ``fsync_every`` frames
+    can be lost on power failure (0 leaves syncing to the OS).
+
+    A frame left unfinished by a writer that died mid-append is cut off
+    before the next append, and a line that still fails to decode (an
+    older torn frame with another appended onto it) is skipped when
+    reading, so the frames after it are not lost.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 1):
+        """
+        Initialize the log.
+
+        Args:
+            path: Path to the log file (created on first append)
+            fsync_every: Number of frames between fsync calls (0 disables fsync)
+        """
+        self.path = path
+        self.fsync_every = fsync_every
+        self._file = None
+        self._unsynced = 0
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "a+b")
+        return self._file
+
+    @staticmethod
+    def _cut_torn_tail(f):
+        """Truncate the file back to its last newline; writes are serialized by the caller."""
+        end = f.seek(0, os.SEEK_END)
+        if not end:
+            return
+        f.seek(end - 1)
+        if f.read(1) == b"\n":
+            return
+        pos = end
+        while pos > 0:
+            start = max(0, pos - 65536)
+            f.seek(start)
+            newline = f.read(pos - start).rfind(b"\n")
+            if newline >= 0:
+                f.truncate(start + newline + 1)
+                return
+            pos = start
+        f.truncate(0)
+
+    @staticmethod
+    def _encode_frame(frame: Dict[str, Any]) -> bytes:
+        record_json = frame.get(RECORD_JSON)
+        if record_json is None:
+            return (json.dumps(frame, separators=(",", ":")) + "\n").encode()
+        # Splice in the text the ref was hashed from instead of encoding the record again
+        rest = {key: value for key, value in frame.items() if key not in ("record", RECORD_JSON)}
+        return (json.dumps(rest, separators=(",", ":"))[:-1] + ',"record":' + record_json + "}\n").encode()
+
+    def append(self, frame: Dict[str, Any]):
+        """
+        Append a single frame to the log.
+
+        Args:
+            frame: JSON-serializable record frame; a pre-serialized record
+                under RECORD_JSON is written in place of "record"
+        """
+        self.append_many([frame])
+
+    def append_many(self, frames: List[Dict[str, Any]]):
+        """
+        Append several frames with one write and at most one fsync.
+
+        Callers must be the only writer (in shared mode, hold the exclusive
+        file lock): a torn frame at the end of the file is cut off first.
+
+        Args:
+            frames: JSON-serializable record frames
+        """
+        if not frames:
+            return
+        f = self._open()
+        self._cut_torn_tail(f)
+        f.write(b"".join(self._encode_frame(frame) for frame in frames))
+        f.flush()
+        self._unsynced += len(frames)
+        if self.fsync_every and self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        """Force all appended frames to stable storage."""
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def replay(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yield every complete frame in the log, oldest first.
+
+        A torn final frame (left by a crash mid-write) is dropped and the
+        file is truncated back to the last complete frame so that later
+        appends start on a clean line. A complete line that does not
+        decode is skipped.
+
+        Returns:
+            Iterator over decoded frames
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        good_offset = 0
+        torn = False
+        with f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    torn = True
+                    break
+                good_offset += len(line)
+                try:
+                    frame = json.loads(line)
+                except ValueError:
+                    continue
+                yield frame
+        if torn:
+            self.close()
+            with open(self.path, "r+b") as f:
+                f.truncate(good_offset)
+
+    def read_from(self, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Read complete frames appended after a byte offset, without modifying the file.
+
+        Used to catch up on frames written by other processes. An incomplete
+        trailing frame is left for the next call; a complete line that does
+        not decode is skipped.
+
+        Args:
+            offset: Byte offset just past the last frame already applied
+
+        Returns:
+            Tuple of (new frames, offset just past the last complete frame)
+        """
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], offset
+
+        frames = []
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            try:
+                frames.append(json.loads(line))
+            except ValueError:
+                continue
+        return frames, offset
+
+    def size(self) -> int:
+        """Return the current size of the log file in bytes."""
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def discard_prefix(self, offset: int):
+        """
+        Drop the frames before a byte offset, keeping any appended after it.
+
+        The remaining frames are copied to a new file that atomically
+        replaces the log, so a crash leaves either the old or the new log.
+
+        Args:
+            offset: End of the frames already captured by a snapshot
+        """
+        self.close()
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                remaining = f.read()
+        except FileNotFoundError:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(remaining)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def truncate(self):
+        """Discard all frames, typically after a snapshot has been written."""
+        self.close()
+        with open(self.path, "wb") as f:
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        """Sync outstanding frames and close the underlying file."""
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+
+class GroupCommitter:
+    """
+    Background committer that persists queued frames in groups.
+
+    Writers submit frames and wait on the returned future. The committer
+    thread collects everything submitted within ``max_latency`` seconds of
+    the first pending submission (or until ``max_batch`` frames are
+    queued) and persists the whole group with a single flush call, so
+    concurrent writers share one write and one fsync.
+    """
+
+    def __init__(self, flush: Callable[[List[Dict[str, Any]]], None],
+                 max_latency: float = 0.005, max_batch: int = 1024):
+        """
+        Start the committer thread.
+
+        Args:
+            flush: Persists a group of frames; exceptions are propagated to
+                every writer in the group
+            max_latency: Longest time a submission waits for companions
+            max_batch: Flush early once this many frames are queued
+        """
+        self._flush = flush
+        self.max_latency = max_latency
+        self.max_batch = max_batch
+        self._queue: List[Tuple[List[Dict[str, Any]], Future]] = []
+        self._queued_frames = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="rbd-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, frames: List[Dict[str, Any]]) -> Future:
+        """
+        Queue frames for the next group.
+
+        Args:
+            frames: Frames to persist
+
+        Returns:
+            Future resolved once the frames are durable
+        """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("GroupCommitter is closed")
+            self._queue.append((frames, future))
+            self._queued_frames += len(frames)
+            self._cond.notify_all()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                deadline = time.monotonic() + self.max_latency
+                while self._queued_frames < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                group, self._queue = self._queue, []
+                self._queued_frames = 0
+
+            try:
+                self._flush([frame for frames, _ in group for frame in frames])
+            except Exception as e:
+                for _, future in group:
+                    future.set_exception(e)
+            else:
+                for _, future in group:
+                    future.set_result(None)
+
+    def close(self):
+        """Flush everything still queued and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
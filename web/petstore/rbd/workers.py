@@ -0,0 +1,205 @@
+# rbd/workers.py
+"""Pool of embedding worker processes, each with its own model instance"""
+
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def _worker_main(worker_id: int, tasks, results, n_threads: Optional[int], n_batch: int):
+    """Worker process loop: load the model once, then embed chunks until told to stop."""
+    from .model_loader import embed_with_model, load_model
+
+    try:
+        model = load_model(n_threads=n_threads, n_batch=n_batch)
+    except Exception as e:
+        results.put(("failed", worker_id, repr(e), 0.0))
+        return
+    results.put(("ready", worker_id, None, 0.0))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, texts = task
+        started = time.perf_counter()
+        try:
+            vectors = np.asarray(embed_with_model(model, texts), dtype=np.float32)
+            results.put((task_id, worker_id, vectors, time.perf_counter() - started))
+        except Exception as e:
+            results.put((task_id, worker_id, RuntimeError(f"Embedding worker {worker_id} failed: {e!r}"),
+                         time.perf_counter() - started))
+
+
+class EmbeddingWorkerPool:
+    """
+    N processes that each load the GGUF model once (memory-mapped) and
+    embed chunks of texts pulled from a shared task queue.
+
+    ``submit`` splits a request into chunks so a large batch is spread
+    over every worker; a collector thread reassembles the results and
+    resolves the caller's future. ``embed`` has the same signature as
+    model_loader.embed_texts, so the pool can back an EmbeddingBatcher.
+    """
+
+    def __init__(self, n_workers: Optional[int] = None, n_threads: Optional[int] = None,
+                 n_batch: int = 512, chunk_size: int = 32):
+        """
+        Start the worker processes.
+
+        Args:
+            n_workers: Number of processes (default: one per 4 cores)
+            n_threads: llama.cpp threads per worker (default: cores / workers)
+            n_batch: llama.cpp token batch size per worker
+            chunk_size: Maximum number of texts sent to a worker at once
+        """
+        cpus = os.cpu_count() or 1
+        self.n_workers = n_workers or max(1, cpus // 4)
+        self.n_threads = n_threads or max(1, cpus // self.n_workers)
+        self.chunk_size = chunk_size
+
+        # spawn: forking a process that already runs threads is unsafe
+        context = multiprocessing.get_context("spawn")
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._processes = [
+            context.Process(target=_worker_main, name=f"rbd-embed-worker-{i}",
+                            args=(i, self._tasks, self._results, self.n_threads, n_batch), daemon=True)
+            for i in range(self.n_workers)
+        ]
+        for process in self._processes:
+            process.start()
+
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count()
+        # task id -> (request state, chunk position)
+        self._pending: Dict[int, tuple] = {}
+        self._stats = [{"texts": 0, "chunks": 0, "busy_seconds": 0.0} for _ in range(self.n_workers)]
+        self._ready = 0
+        self._error: Optional[Exception] = None
+        self._closed = False
+        self._collector = threading.Thread(target=self._collect, name="rbd-embed-collector", daemon=True)
+        self._collector.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """
+        Queue texts for embedding.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            Future resolving to a list of float32 vectors, in input order
+        """
+        future = Future()
+        if not texts:
+            future.set_result([])
+            return future
+        chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+        request = {"future": future, "parts": [None] * len(chunks), "remaining": len(chunks)}
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("EmbeddingWorkerPool is closed")
+            if self._error is not None:
+                raise self._error
+            for position, chunk in enumerate(chunks):
+                task_id = next(self._task_ids)
+                self._pending[task_id] = (request, position)
+                self._tasks.put((task_id, chunk))
+        return future
+
+    def embed(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed texts, blocking until every chunk is done."""
+        return self.submit(texts).result()
+
+    def _collect(self):
+        while True:
+            try:
+                task_id, worker_id, payload, elapsed = self._results.get(timeout=1.0)
+            except queue.Empty:
+                dead = [p.name for p in self._processes if not p.is_alive()]
+                if self._closed:
+                    if len(dead) == len(self._processes):
+                        return
+                elif dead and self._error is None:
+                    self._fail(RuntimeError(f"Embedding worker(s) exited: {', '.join(dead)}"))
+                continue
+
+            if task_id == "ready":
+                with self._lock:
+                    self._ready += 1
+                continue
+            if task_id == "failed":
+                self._fail(RuntimeError(f"Embedding worker {worker_id} could not load the model: {payload}"))
+                continue
+
+            with self._lock:
+                pending = self._pending.pop(task_id, None)
+                if pending is None:
+                    # Already failed by _fail
+                    continue
+                request, position = pending
+                if not isinstance(payload, Exception):
+                    stats = self._stats[worker_id]
+                    stats["texts"] += len(payload)
+                    stats["chunks"] += 1
+                    stats["busy_seconds"] += elapsed
+            future = request["future"]
+            if future.done():
+                continue
+            if isinstance(payload, Exception):
+                future.set_exception(payload)
+                continue
+            request["parts"][position] = payload
+            request["remaining"] -= 1
+            if request["remaining"] == 0:
+                future.set_result([vec for part in request["parts"] for vec in part])
+
+    def _fail(self, error: Exception):
+        """Fail every pending request and refuse new ones."""
+        with self._lock:
+            self._error = error
+            pending, self._pending = self._pending, {}
+        for request, _ in pending.values():
+            if not request["future"].done():
+                request["future"].set_exception(error)
+
+    @property
+    def ready(self) -> bool:
+        """True once every worker has loaded its model."""
+        with self._lock:
+            return self._ready == self.n_workers
+
+    def stats(self) -> List[Dict[str, float]]:
+        """
+        Per-worker throughput.
+
+        Returns:
+            One dict per worker with texts, chunks, busy_seconds and
+            texts_per_second (while busy)
+        """
+        with self._lock:
+            stats = [dict(worker, worker=i) for i, worker in enumerate(self._stats)]
+        for worker in stats:
+            busy = worker["busy_seconds"]
+            worker["texts_per_second"] = worker["texts"] / busy if busy else 0.0
+        return stats
+
+    def close(self):
+        """Let queued chunks finish, then stop the workers."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join()
+        self._collector.join()